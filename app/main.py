@@ -1,21 +1,56 @@
-from fastapi import FastAPI, Depends, HTTPException
+import os
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import List, Optional
+
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from app.services.columnar import ColumnarSnapshotStore
 from app.services.digest import RenewalDigestService
+from app.services.digest_cache import DigestCache
+from app.services.etags import etag_matches, make_etag
+from app.services.ingest_jobs import IngestJobQueue
 from app.services.ingestion import (
     IngestionService,
     StripeCredentialRepository,
+    StripeSubscriptionSnapshotFetcher,
     StripeSubscriptionSnapshotRepository,
 )
+from app.services.portfolio import PortfolioDigestService, PortfolioWorkerPool
+from app.services.rate_limit import StripeRateLimiter
+from app.services.records import serialize_snapshot
+from app.services.renewals import RenewalCursor
+from app.services.single_flight import SingleFlight
+from app.services.snapshot_pages import (
+    InvalidCursorError,
+    SnapshotCursor,
+    iter_ndjson,
+    parse_fields,
+    snapshot_page,
+)
 from app.services.slack import SlackWebhookClient, SlackWebhookRepository
 from app.services.slack_delivery import SlackDigestDeliveryService
 from app.services.slack_digest import SlackDigestFormatter
+from app.services.sqlite_storage import (
+    SQLiteDatabase,
+    SQLiteIngestJobStore,
+    SQLiteSlackWebhookRepository,
+    SQLiteStripeCredentialRepository,
+    SQLiteSubscriptionSnapshotRepository,
+)
+from app.services.stripe_async import AsyncStripeAPIClient
 
 # --- request models ---
 class IngestRequest(BaseModel):
     stripe_secret_key: str
 
 
+class BulkIngestRequest(BaseModel):
+    stripe_secret_keys: List[str]
+
+
 class ConfigureSlackWebhookRequest(BaseModel):
     stripe_secret_key: str
     webhook_url: str
@@ -26,23 +61,95 @@ class DeliverSlackDigestRequest(BaseModel):
     window_days: int = 7
 
 # --- DI / service stub ---
-credential_repository = StripeCredentialRepository()
-snapshot_repository = StripeSubscriptionSnapshotRepository()
-slack_webhook_repository = SlackWebhookRepository()
+# Set AUTOBOT_DATABASE_PATH to persist repositories in SQLite; unset keeps them in memory.
+DATABASE_PATH = os.environ.get("AUTOBOT_DATABASE_PATH")
+database = SQLiteDatabase(DATABASE_PATH) if DATABASE_PATH else None
+# Set AUTOBOT_COLUMNAR_DIR to also write memory-mapped columnar snapshots for digests.
+COLUMNAR_DIR = os.environ.get("AUTOBOT_COLUMNAR_DIR")
+columnar_store = ColumnarSnapshotStore(COLUMNAR_DIR) if COLUMNAR_DIR else None
+# Set AUTOBOT_SNAPSHOT_MEMORY_BUDGET_MB to compress cold snapshots beyond that budget.
+MEMORY_BUDGET_MB = os.environ.get("AUTOBOT_SNAPSHOT_MEMORY_BUDGET_MB")
+memory_budget_bytes = int(float(MEMORY_BUDGET_MB) * 1024 * 1024) if MEMORY_BUDGET_MB else None
+# Subscriptions are stored as compact records, and /snapshots returns them with
+# epoch-second timestamps ("record_format": "compact"). AUTOBOT_SNAPSHOT_RECORDS=raw also
+# keeps each raw Stripe payload and returns that instead ("record_format": "raw").
+SNAPSHOT_RECORD_FORMAT = os.environ.get("AUTOBOT_SNAPSHOT_RECORDS", "compact")
+keep_raw_payloads = SNAPSHOT_RECORD_FORMAT == "raw"
+# Digests anchor their window to the minute so polling clients can revalidate with ETags.
+DIGEST_WINDOW_GRANULARITY_SECONDS = 60
+# Portfolio digests decompress and summarize cold accounts on up to AUTOBOT_PORTFOLIO_WORKERS
+# processes (default: one per spare CPU, at most 4); 0 does it in the request thread.
+PORTFOLIO_WORKERS = int(
+    os.environ.get("AUTOBOT_PORTFOLIO_WORKERS", str(min(4, (os.cpu_count() or 1) - 1)))
+)
+# Built digests kept per (account, snapshot version, windows, anchor); 0 disables the cache.
+DIGEST_CACHE_SIZE = int(os.environ.get("AUTOBOT_DIGEST_CACHE_SIZE", "1024"))
+# Paginated snapshot reads return this many records unless `limit` says otherwise.
+DEFAULT_SNAPSHOT_PAGE_SIZE = 500
+MAX_SNAPSHOT_PAGE_SIZE = 5000
+# Digests list this many renewals per window unless `limit` says otherwise; the totals
+# and `upcoming_count` still cover the whole window.
+DEFAULT_DIGEST_PAGE_SIZE = 100
+MAX_DIGEST_PAGE_SIZE = 1000
+# Renewal calendars cover at most this many days per request.
+MAX_CALENDAR_DAYS = 366
+if database is not None:
+    credential_repository = SQLiteStripeCredentialRepository(database)
+    snapshot_repository = SQLiteSubscriptionSnapshotRepository(
+        database,
+        keep_raw_payloads=keep_raw_payloads,
+        columnar_store=columnar_store,
+        memory_budget_bytes=memory_budget_bytes,
+    )
+    slack_webhook_repository = SQLiteSlackWebhookRepository(database)
+else:
+    credential_repository = StripeCredentialRepository()
+    snapshot_repository = StripeSubscriptionSnapshotRepository(
+        keep_raw_payloads=keep_raw_payloads,
+        columnar_store=columnar_store,
+        memory_budget_bytes=memory_budget_bytes,
+    )
+    slack_webhook_repository = SlackWebhookRepository()
 slack_webhook_client = SlackWebhookClient()
 slack_digest_formatter = SlackDigestFormatter()
+# Kept in the database when there is one, so any pre-forked worker can report any job.
+ingest_job_queue = IngestJobQueue(
+    store=SQLiteIngestJobStore(database) if database is not None else None
+)
+ingest_single_flight = SingleFlight()
+digest_cache = DigestCache(max_entries=DIGEST_CACHE_SIZE)
+portfolio_worker_pool = PortfolioWorkerPool(PORTFOLIO_WORKERS) if PORTFOLIO_WORKERS > 0 else None
+stripe_rate_limiter = StripeRateLimiter()
+stripe_api_client = AsyncStripeAPIClient(rate_limiter=stripe_rate_limiter)
 
 
 def get_ingestion_service():
     return IngestionService(
         credential_repository=credential_repository,
+        metadata_fetcher=StripeSubscriptionSnapshotFetcher(client=stripe_api_client),
         snapshot_repository=snapshot_repository,
+        single_flight=ingest_single_flight,
+        digest_cache=digest_cache,
     )
 
 
+def get_ingest_job_queue():
+    return ingest_job_queue
+
+
 def get_digest_service():
     return RenewalDigestService(
         snapshot_repository=snapshot_repository,
+        columnar_store=columnar_store,
+        window_granularity_seconds=DIGEST_WINDOW_GRANULARITY_SECONDS,
+        digest_cache=digest_cache,
+    )
+
+
+def get_portfolio_digest_service():
+    return PortfolioDigestService(
+        snapshot_repository=snapshot_repository,
+        worker_pool=portfolio_worker_pool,
     )
 
 
@@ -52,14 +159,62 @@ def get_slack_digest_delivery_service():
         webhook_repository=slack_webhook_repository,
         slack_client=slack_webhook_client,
         formatter=slack_digest_formatter,
+        listed_renewals=slack_digest_formatter.max_subscription_lines,
     )
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    stripe_api_client.close()
+    if portfolio_worker_pool is not None:
+        portfolio_worker_pool.shutdown()
+    if database is not None:
+        database.close()
+    if columnar_store is not None:
+        columnar_store.close()
+
 
+app = FastAPI(lifespan=lifespan)
 
-@app.post("/ingest")
-def ingest(req: IngestRequest, svc: IngestionService = Depends(get_ingestion_service)):
-    return svc.ingest(stripe_secret_key=req.stripe_secret_key)
+
+@app.post("/ingest", status_code=202)
+def ingest(
+    req: IngestRequest,
+    svc: IngestionService = Depends(get_ingestion_service),
+    jobs: IngestJobQueue = Depends(get_ingest_job_queue),
+):
+    job, coalesced = jobs.submit(svc, stripe_secret_key=req.stripe_secret_key)
+    return {"job_id": job.id, "state": job.state, "coalesced": coalesced}
+
+
+@app.post("/ingest/bulk", status_code=202)
+def ingest_bulk(
+    req: BulkIngestRequest,
+    svc: IngestionService = Depends(get_ingestion_service),
+    jobs: IngestJobQueue = Depends(get_ingest_job_queue),
+):
+    batch = jobs.submit_batch(svc, req.stripe_secret_keys)
+    return {
+        "batch_id": batch.id,
+        "state": batch.as_dict()["state"],
+        "job_ids": [job.id for job in batch.jobs],
+    }
+
+
+@app.get("/ingest/bulk/{batch_id}")
+def get_bulk_ingest(batch_id: str, jobs: IngestJobQueue = Depends(get_ingest_job_queue)):
+    batch = jobs.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Bulk ingest not found")
+    return batch.as_dict()
+
+
+@app.get("/ingest/jobs/{job_id}")
+def get_ingest_job(job_id: str, jobs: IngestJobQueue = Depends(get_ingest_job_queue)):
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job.as_dict()
 
 
 @app.post("/slack/webhook")
@@ -88,26 +243,200 @@ def get_slack_webhook(stripe_secret_key: str):
 
 
 @app.get("/snapshots/{stripe_secret_key}")
-def get_snapshot(stripe_secret_key: str):
-    snapshot = snapshot_repository.get_snapshot(stripe_secret_key)
+def get_snapshot(
+    stripe_secret_key: str,
+    response: Response,
+    version: Optional[int] = None,
+    as_of: Optional[datetime] = None,
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_SNAPSHOT_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    response_format: str = Query(default="json", alias="format", pattern="^(json|ndjson)$"),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    page_cursor = None
+    if cursor is not None:
+        try:
+            page_cursor = SnapshotCursor.decode(cursor)
+        except InvalidCursorError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        if version is not None and version != page_cursor.version:
+            raise HTTPException(status_code=400, detail="Cursor belongs to another version")
+        version, as_of = page_cursor.version, None
+    projection = parse_fields(fields)
+
+    resolved_version = snapshot_repository.resolve_snapshot_version(
+        stripe_secret_key, version=version, as_of=as_of
+    )
+    if resolved_version is None:
+        if page_cursor is not None:
+            raise HTTPException(status_code=410, detail="Cursor version is no longer retained")
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    etag = make_etag(
+        "snapshot",
+        StripeCredentialRepository._fingerprint(stripe_secret_key),
+        resolved_version,
+        response_format,
+        limit,
+        cursor,
+        projection,
+    )
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    if limit is None and page_cursor is None:
+        snapshot = snapshot_repository.get_snapshot(stripe_secret_key, version=resolved_version)
+    else:
+        # A past version stays built while its pages are read, instead of once per page.
+        snapshot = snapshot_repository.get_paged_snapshot(stripe_secret_key, resolved_version)
     if snapshot is None:
         raise HTTPException(status_code=404, detail="Snapshot not found")
+    try:
+        if response_format == "ndjson":
+            return StreamingResponse(
+                iter_ndjson(snapshot, limit=limit, cursor=page_cursor, fields=projection),
+                media_type="application/x-ndjson",
+                headers={"ETag": etag},
+            )
+        if limit is None and page_cursor is None:
+            body = serialize_snapshot(snapshot, projection)
+            next_cursor = None
+        else:
+            body, next_cursor = snapshot_page(
+                snapshot, limit or DEFAULT_SNAPSHOT_PAGE_SIZE, page_cursor, projection
+            )
+    except InvalidCursorError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    response.headers["ETag"] = etag
+    result = {
+        "stripe_secret_key": stripe_secret_key,
+        "version": snapshot.version,
+        "record_format": snapshot_repository.record_format,
+        "subscription_snapshot": body,
+    }
+    if limit is not None or page_cursor is not None:
+        result["next_cursor"] = next_cursor
+    return result
+
+
+@app.get("/snapshots/{stripe_secret_key}/versions")
+def list_snapshot_versions(stripe_secret_key: str):
+    versions = snapshot_repository.list_snapshot_versions(stripe_secret_key)
+    if not versions:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
     return {
         "stripe_secret_key": stripe_secret_key,
-        "subscription_snapshot": snapshot,
+        "versions": [info.as_dict() for info in versions],
+    }
+
+
+@app.get("/snapshots/{stripe_secret_key}/diff")
+def diff_snapshot_versions(stripe_secret_key: str, from_version: int, to_version: int):
+    changes = snapshot_repository.diff_snapshot_versions(
+        stripe_secret_key, from_version=from_version, to_version=to_version
+    )
+    if changes is None:
+        raise HTTPException(status_code=404, detail="Snapshot version not found")
+    return {
+        "stripe_secret_key": stripe_secret_key,
+        "from_version": from_version,
+        "to_version": to_version,
+        "changes": {
+            resource: {
+                "added": list(resource_changes.added),
+                "updated": list(resource_changes.updated),
+                "removed": list(resource_changes.removed),
+                "unchanged": resource_changes.unchanged,
+            }
+            for resource, resource_changes in changes.items()
+        },
     }
 
 
 @app.get("/digest/{stripe_secret_key}")
 def get_digest(
     stripe_secret_key: str,
-    window_days: int = 7,
+    response: Response,
+    window_days: List[int] = Query(default=[7]),
+    version: Optional[int] = None,
+    as_of: Optional[datetime] = None,
+    limit: int = Query(default=DEFAULT_DIGEST_PAGE_SIZE, ge=1, le=MAX_DIGEST_PAGE_SIZE),
+    order: str = Query(default="period_end", pattern="^(period_end|amount_due)$"),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(default=None),
     svc: RenewalDigestService = Depends(get_digest_service),
 ):
-    return svc.build_digest(
+    # Repeat `window_days` (e.g. `?window_days=1&window_days=7`) for a multi-window digest.
+    try:
+        etag, digest = svc.build_digest_if_changed(
+            stripe_secret_key=stripe_secret_key,
+            window_days=window_days[0] if len(window_days) == 1 else window_days,
+            version=version,
+            as_of=as_of,
+            if_none_match=if_none_match,
+            limit=limit,
+            order=order,
+            cursor=RenewalCursor.decode(cursor) if cursor is not None else None,
+        )
+    except InvalidCursorError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if digest is None:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return digest
+
+
+@app.get("/customers/{stripe_secret_key}/{customer_id}")
+def get_customer(stripe_secret_key: str, customer_id: str):
+    customer = snapshot_repository.get_customer(stripe_secret_key, customer_id)
+    if customer is None:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    return {
+        "stripe_credential_fingerprint": StripeCredentialRepository._fingerprint(
+            stripe_secret_key
+        ),
+        "customer": customer.as_dict(),
+    }
+
+
+@app.get("/portfolio/digest")
+def get_portfolio_digest(
+    window_days: List[int] = Query(default=[7]),
+    svc: PortfolioDigestService = Depends(get_portfolio_digest_service),
+):
+    return svc.build_portfolio_digest(window_days=window_days)
+
+
+@app.get("/calendar/{stripe_secret_key}")
+def get_renewal_calendar(
+    stripe_secret_key: str,
+    response: Response,
+    days: int = Query(default=30, ge=1, le=MAX_CALENDAR_DAYS),
+    start: Optional[date] = None,
+    if_none_match: Optional[str] = Header(default=None),
+    svc: RenewalDigestService = Depends(get_digest_service),
+):
+    etag, calendar = svc.build_calendar_if_changed(
         stripe_secret_key=stripe_secret_key,
-        window_days=window_days,
+        days=days,
+        start=start,
+        if_none_match=if_none_match,
     )
+    if calendar is None:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return calendar
+
+
+@app.get("/memory/snapshots")
+def get_snapshot_memory_stats():
+    return snapshot_repository.memory_stats()
+
+
+@app.get("/memory/digests")
+def get_digest_cache_stats():
+    return digest_cache.stats()
 
 
 @app.get("/credentials")
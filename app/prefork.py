@@ -0,0 +1,140 @@
+"""Pre-fork production entry point.
+
+    AUTOBOT_DATABASE_PATH=/var/lib/autobot.db python -m app.prefork --workers 4 --port 8000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from types import FrameType
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+import uvicorn
+
+logger = logging.getLogger("app.prefork")
+
+# A worker that exits sooner than this after starting is restarted with a growing delay.
+STABLE_UPTIME_SECONDS = 10.0
+RESTART_BACKOFF_SECONDS = 0.5
+MAX_RESTART_BACKOFF_SECONDS = 30.0
+
+
+def warm_master(main_module: Any) -> int:
+    """Load shared state, drop connections that must not cross fork() and freeze the heap."""
+    warmed = 0
+    if main_module.database is not None:
+        warmed = main_module.snapshot_repository.warm()
+        # SQLite connections must not be used across fork(); workers open their own.
+        main_module.database.close()
+    gc.disable()
+    gc.collect()
+    gc.freeze()
+    return warmed
+
+
+def spawn_worker(target: Callable[[], None]) -> int:
+    """Fork a child that runs `target` with collection re-enabled; returns its pid."""
+    pid = os.fork()
+    if pid != 0:
+        return pid
+    exit_code = 0
+    try:
+        gc.enable()
+        target()
+    except BaseException:
+        logger.exception("autobot worker %s crashed", os.getpid())
+        exit_code = 1
+    finally:
+        os._exit(exit_code)
+
+
+def restart_delay(quick_exits: int) -> float:
+    """Seconds to wait before restarting a worker after `quick_exits` exits in a row."""
+    if quick_exits == 0:
+        return 0.0
+    return min(MAX_RESTART_BACKOFF_SECONDS, RESTART_BACKOFF_SECONDS * 2 ** (quick_exits - 1))
+
+
+def serve(workers: int, host: str, port: int, log_level: str = "info") -> None:
+    from app import main as main_module
+
+    if workers > 1 and main_module.database is None:
+        raise SystemExit(
+            "Running more than one worker needs AUTOBOT_DATABASE_PATH: in-memory "
+            "repositories are per process, so workers would not see each other's ingests."
+        )
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(2048)
+    listener.set_inheritable(True)
+
+    warmed = warm_master(main_module)
+    logger.info(
+        "autobot master %s: %s snapshots warmed, forking %s workers", os.getpid(), warmed, workers
+    )
+    config = uvicorn.Config(main_module.app, log_level=log_level)
+
+    def run_worker() -> None:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        uvicorn.Server(config).run(sockets=[listener])
+
+    children: Dict[int, Tuple[int, float]] = {}
+    quick_exits = [0] * workers
+    stopping = False
+
+    def stop(signum: int, frame: Optional[FrameType]) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(workers):
+        children[spawn_worker(run_worker)] = (index, time.monotonic())
+
+    while children:
+        pid, status = os.wait()
+        child = children.pop(pid, None)
+        if child is None or stopping:
+            continue
+        index, started_at = child
+        if time.monotonic() - started_at < STABLE_UPTIME_SECONDS:
+            quick_exits[index] += 1
+        else:
+            quick_exits[index] = 0
+        delay = restart_delay(quick_exits[index])
+        logger.warning(
+            "autobot worker %s exited with status %s; restarting in %.1fs", pid, status, delay
+        )
+        time.sleep(delay)
+        if stopping:
+            continue
+        children[spawn_worker(run_worker)] = (index, time.monotonic())
+    listener.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    serve(max(1, args.workers), args.host, args.port, args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.services.records import SubscriptionRecord
+
+MAGIC = b"ABSC"
+FORMAT_VERSION = 3
+MISSING_STATUS = -1
+
+# magic, format version, byte order, snapshot version, row count, scheduled row count,
+# customer count, then (offset, length) for each section in SECTIONS order. Rows are
+# sorted by period end; the scheduled rows come first and the rows without one last.
+SECTIONS = (
+    "period_ends",
+    "positions",
+    "amounts",
+    "status_codes",
+    "id_offsets",
+    "id_blob",
+    "customer_offsets",
+    "customer_blob",
+    "metadata",
+)
+_HEADER = struct.Struct("<4sHBxQQQQ" + "QQ" * len(SECTIONS))
+_BYTE_ORDERS = {"little": 0, "big": 1}
+_ALIGNMENT = 8
+
+
+class ColumnarFormatError(Exception):
+    """Raised when a columnar snapshot file is truncated or was written for another platform."""
+
+
+class StaleColumnarFormatError(ColumnarFormatError):
+    """Raised for a file written by an older format version, which the next ingest rewrites."""
+
+
+class ColumnarSubscriptions:
+    """Read-only, memory-mapped columns for one account's subscriptions."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if len(buffer) < _HEADER.size:
+            raise ColumnarFormatError(f"{path} is too short to be a columnar snapshot")
+        magic, format_version, byte_order, version, rows, scheduled, customers, *spans = (
+            _HEADER.unpack_from(buffer)
+        )
+        if magic == MAGIC and format_version < FORMAT_VERSION:
+            raise StaleColumnarFormatError(f"{path} is a version {format_version} columnar file")
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ColumnarFormatError(f"{path} is not a version {FORMAT_VERSION} columnar file")
+        if byte_order != _BYTE_ORDERS[sys.byteorder]:
+            raise ColumnarFormatError(f"{path} was written with a different byte order")
+
+        sections = {
+            name: buffer[spans[2 * index] : spans[2 * index] + spans[2 * index + 1]]
+            for index, name in enumerate(SECTIONS)
+        }
+        metadata = json.loads(bytes(sections["metadata"]).decode("utf-8"))
+
+        self.version: int = version
+        self.customer_count: int = customers
+        self.content_hash: Optional[str] = metadata.get("content_hash")
+        self.statuses: Tuple[Optional[str], ...] = tuple(metadata["statuses"])
+        self.period_ends = sections["period_ends"].cast("d")
+        self.positions = sections["positions"].cast("q")
+        self.amounts = sections["amounts"].cast("d")
+        self.status_codes = sections["status_codes"].cast("i")
+        self._id_offsets = sections["id_offsets"].cast("Q")
+        self._id_blob = sections["id_blob"]
+        self._customer_offsets = sections["customer_offsets"].cast("Q")
+        self._customer_blob = sections["customer_blob"]
+        self._rows = rows
+        self._scheduled = scheduled
+        if not (
+            len(self.period_ends)
+            == len(self.positions)
+            == len(self.amounts)
+            == len(self.status_codes)
+            == rows
+            >= scheduled
+            and len(self._id_offsets) == len(self._customer_offsets) == rows + 1
+        ):
+            raise ColumnarFormatError(f"{path} has inconsistent column lengths")
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def id_at(self, row: int) -> Optional[str]:
+        return _string_at(self._id_offsets, self._id_blob, row)
+
+    def customer_at(self, row: int) -> Optional[str]:
+        return _string_at(self._customer_offsets, self._customer_blob, row)
+
+    def status_at(self, row: int) -> Optional[str]:
+        code = self.status_codes[row]
+        return None if code == MISSING_STATUS else self.statuses[code]
+
+    def period_end_at(self, row: int) -> Optional[float]:
+        value = self.period_ends[row]
+        return None if math.isnan(value) else value
+
+    def amount_at(self, row: int) -> Optional[float]:
+        value = self.amounts[row]
+        return None if math.isnan(value) else value
+
+    def rows_between(self, start: float, end: float) -> List[int]:
+        """Rows whose period end lies within `[start, end]`, bisected, in snapshot order."""
+        low = bisect_left(self.period_ends, start, hi=self._scheduled)
+        high = bisect_right(self.period_ends, end, lo=low, hi=self._scheduled)
+        return sorted(range(low, high), key=self.positions.__getitem__)
+
+    def close(self) -> None:
+        """Release the mapping; views handed out earlier become invalid."""
+        for view in (
+            self.period_ends,
+            self.positions,
+            self.amounts,
+            self.status_codes,
+            self._id_offsets,
+            self._customer_offsets,
+        ):
+            view.release()
+        self._id_blob.release()
+        self._customer_blob.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Another view still points into the mapping; it is unmapped once collected.
+            pass
+
+
+def write_columnar_snapshot(
+    path: str,
+    subscriptions: Iterable[Any],
+    version: int = 0,
+    customer_count: int = 0,
+    content_hash: Optional[str] = None,
+) -> int:
+    """Write `subscriptions` as a columnar file, atomically replacing any previous one."""
+    records = [record for record in subscriptions if isinstance(record, SubscriptionRecord)]
+    period_ends_by_position = [record.current_period_end for record in records]
+    order = sorted(
+        (position for position, end in enumerate(period_ends_by_position) if end is not None),
+        key=period_ends_by_position.__getitem__,
+    )
+    scheduled = len(order)
+    order += (position for position, end in enumerate(period_ends_by_position) if end is None)
+
+    period_ends = array("d")
+    positions = array("q", order)
+    amounts = array("d")
+    status_codes = array("i")
+    id_offsets = array("Q", [0])
+    id_blob = bytearray()
+    customer_offsets = array("Q", [0])
+    customer_blob = bytearray()
+    statuses: List[Optional[str]] = []
+    status_index: Dict[Optional[str], int] = {}
+
+    for record in (records[position] for position in order):
+        period_ends.append(
+            math.nan if record.current_period_end is None else float(record.current_period_end)
+        )
+        amounts.append(math.nan if record.amount_due is None else record.amount_due)
+        if record.status is None:
+            status_codes.append(MISSING_STATUS)
+        else:
+            code = status_index.get(record.status)
+            if code is None:
+                code = status_index[record.status] = len(statuses)
+                statuses.append(record.status)
+            status_codes.append(code)
+        if record.id is not None:
+            id_blob += record.id.encode("utf-8")
+        id_offsets.append(len(id_blob))
+        if record.customer is not None:
+            customer_blob += record.customer.encode("utf-8")
+        customer_offsets.append(len(customer_blob))
+
+    metadata = json.dumps({"statuses": statuses, "content_hash": content_hash}).encode("utf-8")
+    payloads = {
+        "period_ends": period_ends.tobytes(),
+        "positions": positions.tobytes(),
+        "amounts": amounts.tobytes(),
+        "status_codes": status_codes.tobytes(),
+        "id_offsets": id_offsets.tobytes(),
+        "id_blob": bytes(id_blob),
+        "customer_offsets": customer_offsets.tobytes(),
+        "customer_blob": bytes(customer_blob),
+        "metadata": metadata,
+    }
+
+    spans: List[int] = []
+    offset = _align(_HEADER.size)
+    for name in SECTIONS:
+        spans.extend((offset, len(payloads[name])))
+        offset = _align(offset + len(payloads[name]))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as handle:
+            handle.write(
+                _HEADER.pack(
+                    MAGIC,
+                    FORMAT_VERSION,
+                    _BYTE_ORDERS[sys.byteorder],
+                    version,
+                    len(period_ends),
+                    scheduled,
+                    customer_count,
+                    *spans,
+                )
+            )
+            for index, name in enumerate(SECTIONS):
+                handle.seek(spans[2 * index])
+                handle.write(payloads[name])
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.unlink(temporary_path)
+        raise
+    return len(period_ends)
+
+
+class ColumnarSnapshotStore:
+    """One columnar file per credential fingerprint inside `directory`."""
+
+    def __init__(self, directory: str) -> None:
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._open: Dict[str, Tuple[Tuple[int, int], ColumnarSubscriptions]] = {}
+
+    def path_for(self, fingerprint: str) -> str:
+        return os.path.join(self._directory, f"{fingerprint}.columns")
+
+    def write(self, snapshot: Any) -> int:
+        """Write the `subscriptions` of a stored `SubscriptionSnapshot`."""
+        customers = snapshot.get("customers")
+        return write_columnar_snapshot(
+            self.path_for(snapshot.fingerprint),
+            snapshot.get("subscriptions") or (),
+            version=snapshot.version,
+            customer_count=len(customers) if isinstance(customers, (list, tuple)) else 0,
+            content_hash=snapshot.content_hash,
+        )
+
+    def open(self, fingerprint: str) -> Optional[ColumnarSubscriptions]:
+        path = self.path_for(fingerprint)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        identity = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._open.get(fingerprint)
+            if cached is not None and cached[0] == identity:
+                return cached[1]
+            try:
+                columns = ColumnarSubscriptions(path)
+            except StaleColumnarFormatError:
+                return None
+            # Replaced mappings are not closed here: in-flight readers may still use them.
+            self._open[fingerprint] = (identity, columns)
+            return columns
+
+    def close(self) -> None:
+        with self._lock:
+            opened, self._open = self._open, {}
+        for _, columns in opened.values():
+            columns.close()
+
+
+def _string_at(offsets: memoryview, blob: memoryview, row: int) -> Optional[str]:
+    start, end = offsets[row], offsets[row + 1]
+    if start == end:
+        return None
+    return bytes(blob[start:end]).decode("utf-8")
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
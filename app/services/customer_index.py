@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import sys
+from typing import Any, Dict, Iterable, Optional
+
+from app.services.records import CustomerRecord
+
+
+class CustomerIndex:
+    """One snapshot's customers as compact records keyed by customer id."""
+
+    __slots__ = ("_customers",)
+
+    def __init__(self, customers: Dict[str, CustomerRecord]) -> None:
+        self._customers = customers
+
+    @classmethod
+    def build(cls, customers: Iterable[Any]) -> "CustomerIndex":
+        index: Dict[str, CustomerRecord] = {}
+        for customer in customers:
+            record = (
+                customer
+                if isinstance(customer, CustomerRecord)
+                else CustomerRecord.from_stripe(customer)
+                if isinstance(customer, dict)
+                else None
+            )
+            if record is not None:
+                index[record.id] = record
+        return cls(index)
+
+    def get(self, customer_id: Optional[str]) -> Optional[CustomerRecord]:
+        if customer_id is None:
+            return None
+        return self._customers.get(customer_id)
+
+    def __contains__(self, customer_id: object) -> bool:
+        return customer_id in self._customers
+
+    def __len__(self) -> int:
+        return len(self._customers)
+
+    def size_bytes(self) -> int:
+        return sys.getsizeof(self._customers) + sum(
+            sys.getsizeof(record)
+            + sum(sys.getsizeof(value) for value in (record.name, record.email) if value)
+            for record in self._customers.values()
+        )
@@ -1,12 +1,21 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from datetime import date, datetime, timezone
+from functools import partial
+from typing import Any, Callable, Dict, Mapping, Optional, Sequence, Tuple, Union
 
+from app.services.columnar import ColumnarSnapshotStore
+from app.services.digest_cache import DigestCache
+from app.services.etags import etag_matches, make_etag
 from app.services.ingestion import (
     StripeCredentialRepository,
     StripeSubscriptionSnapshotRepository,
 )
-from app.services.renewals import SubscriptionRenewalAnalyzer
+from app.services.records import CustomerRecord, ensure_utc
+from app.services.renewal_index import epoch_day
+from app.services.renewals import RenewalCursor, SubscriptionRenewalAnalyzer
+
+WindowDays = Union[int, Sequence[int]]
 
 
 class RenewalDigestService:
@@ -16,35 +25,320 @@ class RenewalDigestService:
         self,
         snapshot_repository: StripeSubscriptionSnapshotRepository,
         analyzer: Optional[SubscriptionRenewalAnalyzer] = None,
+        columnar_store: Optional[ColumnarSnapshotStore] = None,
+        window_granularity_seconds: Optional[int] = None,
+        digest_cache: Optional[DigestCache] = None,
     ) -> None:
         self._snapshot_repository = snapshot_repository
         self._analyzer = analyzer or SubscriptionRenewalAnalyzer()
+        self._columnar_store = columnar_store
+        self._window_granularity_seconds = window_granularity_seconds
+        self._digest_cache = digest_cache
 
-    def build_digest(self, stripe_secret_key: str, window_days: int = 7) -> Dict[str, Any]:
-        snapshot = self._snapshot_repository.get_snapshot(stripe_secret_key)
-        subscriptions = self._extract_list(snapshot, "subscriptions")
-        customers = self._extract_list(snapshot, "customers")
+    def build_digest(
+        self,
+        stripe_secret_key: str,
+        window_days: WindowDays = 7,
+        version: Optional[int] = None,
+        as_of: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        order: str = "period_end",
+        cursor: Optional[RenewalCursor] = None,
+    ) -> Dict[str, Any]:
+        """Digest of the current snapshot, or of a past one when `version`/`as_of` is given."""
+        anchor = self.window_anchor(as_of)
+        paging = {"limit": limit, "order": order, "cursor": cursor}
+        if not self._caches(as_of):
+            return self._build(stripe_secret_key, window_days, version, as_of, anchor, paging)
+        snapshot_version = self._snapshot_repository.resolve_snapshot_version(
+            stripe_secret_key, version=version, as_of=as_of
+        )
+        return self._cached_build(
+            stripe_secret_key, window_days, version, as_of, anchor, paging, snapshot_version
+        )
+
+    def build_digest_if_changed(
+        self,
+        stripe_secret_key: str,
+        window_days: WindowDays = 7,
+        version: Optional[int] = None,
+        as_of: Optional[datetime] = None,
+        if_none_match: Optional[str] = None,
+        limit: Optional[int] = None,
+        order: str = "period_end",
+        cursor: Optional[RenewalCursor] = None,
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Return `(etag, digest)`, with `digest=None` when `if_none_match` already matches."""
+        fingerprint = StripeCredentialRepository._fingerprint(stripe_secret_key)
+        anchor = self.window_anchor(as_of)
+        paging = {"limit": limit, "order": order, "cursor": cursor}
+        snapshot_version = self._snapshot_repository.resolve_snapshot_version(
+            stripe_secret_key, version=version, as_of=as_of
+        )
+        etag = self._etag(fingerprint, snapshot_version, window_days, anchor, paging)
+        if etag_matches(if_none_match, etag):
+            return etag, None
 
-        upcoming = self._analyzer.find_upcoming(subscriptions, window_days=window_days)
+        digest = self._cached_build(
+            stripe_secret_key, window_days, version, as_of, anchor, paging, snapshot_version
+        )
+        if digest["snapshot_version"] != snapshot_version:
+            # A new version landed in between; tag the body that is actually returned.
+            etag = self._etag(
+                fingerprint, digest["snapshot_version"], window_days, anchor, paging
+            )
+        return etag, digest
 
+    def build_calendar(
+        self, stripe_secret_key: str, days: int = 30, start: Optional[date] = None
+    ) -> Dict[str, Any]:
+        """Per-day renewal counts and amounts for `days` UTC days from `start` (default today)."""
+        fingerprint = StripeCredentialRepository._fingerprint(stripe_secret_key)
+        start = start or self._analyzer.now().astimezone(timezone.utc).date()
+        snapshot = self._snapshot_repository.get_snapshot(stripe_secret_key)
+        buckets = (
+            snapshot.renewal_index().daily_totals(epoch_day(start), days)
+            if snapshot is not None
+            else []
+        )
         return {
-            "stripe_credential_fingerprint": StripeCredentialRepository._fingerprint(
-                stripe_secret_key
-            ),
+            "stripe_credential_fingerprint": fingerprint,
             "found_snapshot": snapshot is not None,
-            "subscription_count": len(subscriptions),
-            "customer_count": len(customers),
-            "upcoming": upcoming,
+            "snapshot_version": getattr(snapshot, "version", None),
+            "start": start.isoformat(),
+            "days": days,
+            "total_renewals": buckets[-1].cumulative_count if buckets else 0,
+            "total_amount_due": buckets[-1].cumulative_amount_due if buckets else 0.0,
+            "buckets": [bucket.as_dict() for bucket in buckets],
+        }
+
+    def build_calendar_if_changed(
+        self,
+        stripe_secret_key: str,
+        days: int = 30,
+        start: Optional[date] = None,
+        if_none_match: Optional[str] = None,
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Return `(etag, calendar)`, with `calendar=None` when `if_none_match` already matches."""
+        fingerprint = StripeCredentialRepository._fingerprint(stripe_secret_key)
+        start = start or self._analyzer.now().astimezone(timezone.utc).date()
+        snapshot_version = self._snapshot_repository.get_snapshot_version(stripe_secret_key)
+        etag = make_etag("calendar", fingerprint, snapshot_version, days, start.isoformat())
+        if etag_matches(if_none_match, etag):
+            return etag, None
+        calendar = self.build_calendar(stripe_secret_key, days=days, start=start)
+        if calendar["snapshot_version"] != snapshot_version:
+            etag = make_etag(
+                "calendar", fingerprint, calendar["snapshot_version"], days, start.isoformat()
+            )
+        return etag, calendar
+
+    def window_anchor(self, as_of: Optional[datetime] = None) -> datetime:
+        if as_of is not None:
+            return ensure_utc(as_of)
+        now = self._analyzer.now()
+        if not self._window_granularity_seconds:
+            return now
+        epoch = now.timestamp()
+        return datetime.fromtimestamp(
+            epoch - epoch % self._window_granularity_seconds, tz=timezone.utc
+        )
+
+    def _caches(self, as_of: Optional[datetime]) -> bool:
+        """Only fixed anchors repeat; an unrounded "now" would never be looked up again."""
+        return self._digest_cache is not None and (
+            as_of is not None or bool(self._window_granularity_seconds)
+        )
+
+    def _cached_build(
+        self,
+        stripe_secret_key: str,
+        window_days: WindowDays,
+        version: Optional[int],
+        as_of: Optional[datetime],
+        anchor: datetime,
+        paging: Dict[str, Any],
+        snapshot_version: Optional[int],
+    ) -> Dict[str, Any]:
+        def build() -> Dict[str, Any]:
+            return self._build(stripe_secret_key, window_days, version, as_of, anchor, paging)
+
+        if not self._caches(as_of):
+            return build()
+        assert self._digest_cache is not None
+        fingerprint = StripeCredentialRepository._fingerprint(stripe_secret_key)
+        return self._digest_cache.get_or_build(
+            (
+                fingerprint,
+                snapshot_version,
+                (_normalized_windows(window_days), _paging_key(paging)),
+                anchor.isoformat(),
+            ),
+            build,
+        )
+
+    @staticmethod
+    def _etag(
+        fingerprint: str,
+        snapshot_version: Optional[int],
+        window_days: WindowDays,
+        anchor: datetime,
+        paging: Dict[str, Any],
+    ) -> str:
+        return make_etag(
+            "digest",
+            fingerprint,
+            snapshot_version,
+            _normalized_windows(window_days),
+            anchor.isoformat(),
+            _paging_key(paging),
+        )
+
+    def _build(
+        self,
+        stripe_secret_key: str,
+        window_days: WindowDays,
+        version: Optional[int],
+        as_of: Optional[datetime],
+        anchor: datetime,
+        paging: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        fingerprint = StripeCredentialRepository._fingerprint(stripe_secret_key)
+        windows = (window_days,) if isinstance(window_days, int) else tuple(window_days)
+        if not windows:
+            raise ValueError("At least one window is required")
+        window_start, window_end = self._analyzer.window(max(windows), as_of=anchor)
+        if version is None and as_of is None:
+            unloaded = self._current_without_loading(
+                stripe_secret_key, fingerprint, window_start, window_end
+            )
+            if unloaded is not None:
+                subscriptions, snapshot_version, subscription_count, customer_count = unloaded
+                results = self._analyzer.find_upcoming_windows(
+                    subscriptions, windows, as_of=anchor, **paging
+                )
+                self._attach_customers(
+                    results, partial(self._snapshot_repository.get_customer, stripe_secret_key)
+                )
+                return self._digest(
+                    fingerprint,
+                    snapshot_version,
+                    subscription_count,
+                    customer_count,
+                    self._upcoming(window_days, results),
+                )
+
+        snapshot = self._snapshot_repository.get_snapshot(
+            stripe_secret_key, version=version, as_of=as_of
+        )
+        index = None
+        if snapshot is not None and (
+            snapshot.has_renewal_index or (version is None and as_of is None)
+        ):
+            index = snapshot.renewal_index()
+            subscriptions = index.between(window_start.timestamp(), window_end.timestamp())
+        else:
+            # Past versions are rebuilt per read; one scan is cheaper than sorting them.
+            subscriptions = self._extract_list(snapshot, "subscriptions")
+        results = self._analyzer.find_upcoming_windows(
+            subscriptions, windows, as_of=anchor, **paging
+        )
+        if index is not None:
+            for days, result in results.items():
+                # The index's exact running sums, which the calendar and portfolio also use.
+                _, result["total_amount_due"] = index.totals_between(
+                    window_start.timestamp(),
+                    self._analyzer.window(days, as_of=anchor)[1].timestamp(),
+                )
+        if snapshot is None:
+            return self._digest(fingerprint, None, 0, 0, self._upcoming(window_days, results))
+        self._attach_customers(results, snapshot.customer_index().get)
+        return self._digest(
+            fingerprint,
+            snapshot.version,
+            len(self._extract_list(snapshot, "subscriptions")),
+            len(self._extract_list(snapshot, "customers")),
+            self._upcoming(window_days, results),
+        )
+
+    def _current_without_loading(
+        self, stripe_secret_key: str, fingerprint: str, start: datetime, end: datetime
+    ) -> Optional[Tuple[Any, int, int, int]]:
+        """Subscriptions, version and counts from current columns or a stored window, if any."""
+        if self._columnar_store is not None:
+            columns = self._columnar_store.open(fingerprint)
+            if columns is not None and columns.version == (
+                self._snapshot_repository.get_snapshot_version(stripe_secret_key)
+            ):
+                return columns, columns.version, len(columns), columns.customer_count
+        window = self._snapshot_repository.renewal_window(
+            stripe_secret_key, start.timestamp(), end.timestamp()
+        )
+        if window is None:
+            return None
+        return (
+            window.subscriptions,
+            window.version,
+            window.subscription_count,
+            window.customer_count,
+        )
+
+    @staticmethod
+    def _attach_customers(
+        results: Dict[int, Dict[str, Any]],
+        customer_of: Callable[[str], Optional[CustomerRecord]],
+    ) -> None:
+        """Join each listed renewal to its customer with one lookup per renewal."""
+        for result in results.values():
+            for item in result["upcoming_subscriptions"]:
+                customer_id = item.get("customer_id")
+                # Windows share item dicts, so an item may already have been joined.
+                if customer_id is None or "customer" in item:
+                    continue
+                customer = customer_of(customer_id)
+                item["customer"] = customer.as_dict() if customer is not None else None
+
+    @staticmethod
+    def _upcoming(
+        window_days: WindowDays, results: Dict[int, Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        if isinstance(window_days, int):
+            return {"upcoming": results[window_days]}
+        return {"upcoming_windows": [results[days] for days in sorted(results)]}
+
+    @staticmethod
+    def _digest(
+        fingerprint: str,
+        snapshot_version: Optional[int],
+        subscription_count: int,
+        customer_count: int,
+        upcoming: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        return {
+            "stripe_credential_fingerprint": fingerprint,
+            "found_snapshot": snapshot_version is not None,
+            "snapshot_version": snapshot_version,
+            "subscription_count": subscription_count,
+            "customer_count": customer_count,
+            **upcoming,
         }
 
     @staticmethod
-    def _extract_list(snapshot: Optional[Dict[str, Any]], key: str) -> List[Any]:
+    def _extract_list(snapshot: Optional[Mapping[str, Any]], key: str) -> Sequence[Any]:
+        """The stored records by reference; snapshots are immutable, so no copy is needed."""
         if not snapshot:
-            return []
+            return ()
 
         value = snapshot.get(key)
-        if isinstance(value, list):
-            return list(value)
-        if isinstance(value, tuple):
-            return list(value)
-        return []
+        if isinstance(value, (list, tuple)):
+            return value
+        return ()
+
+
+def _normalized_windows(window_days: WindowDays) -> Any:
+    return window_days if isinstance(window_days, int) else tuple(sorted(set(window_days)))
+
+
+def _paging_key(paging: Dict[str, Any]) -> Tuple[Any, ...]:
+    cursor = paging["cursor"]
+    return paging["limit"], paging["order"], cursor.encode() if cursor is not None else None
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from app.services.single_flight import SingleFlight
+
+DigestCacheKey = Tuple[str, Optional[int], Hashable, str]
+
+
+class DigestCache:
+    """Bounded LRU of built digests keyed by `(fingerprint, snapshot version, windows, anchor)`."""
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[DigestCacheKey, Dict[str, Any]]" = OrderedDict()
+        self._single_flight: SingleFlight[Dict[str, Any]] = SingleFlight()
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get_or_build(
+        self, key: DigestCacheKey, build: Callable[[], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        with self._lock:
+            digest = self._entries.get(key)
+            if digest is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return digest
+
+        digest, shared = self._single_flight.do(key, lambda: self._build(key, build))
+        with self._lock:
+            if shared:
+                self._coalesced += 1
+            else:
+                self._misses += 1
+        return digest
+
+    def invalidate(self, fingerprint: str) -> int:
+        """Drop every cached digest of one account; returns how many were dropped."""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == fingerprint]
+            for key in stale:
+                del self._entries[key]
+            self._invalidations += len(stale)
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses + self._coalesced
+            return {
+                "max_entries": self._max_entries,
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+                "hit_rate": (self._hits + self._coalesced) / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "in_flight": self._single_flight.in_flight(),
+            }
+
+    def _build(self, key: DigestCacheKey, build: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        digest = build()
+        # A newer version may have landed while building; only the requested one is cached.
+        if digest.get("snapshot_version") != key[1] or self._max_entries <= 0:
+            return digest
+        with self._lock:
+            self._entries[key] = digest
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+        return digest
@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Protocol, Sequence, Tuple, Union
+
+from app.services.ingestion import (
+    IngestionService,
+    IngestProgress,
+    StripeCredentialRepository,
+)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_STATES_ACTIVE = (JOB_QUEUED, JOB_RUNNING)
+# How often `IngestJobQueue.wait` rereads a job that another process is running.
+JOB_POLL_SECONDS = 0.05
+
+
+@dataclass(frozen=True)
+class RecordedProgress:
+    """An ingest's progress as its process last wrote it to the shared job store."""
+
+    counters: Dict[str, Any]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return self.counters
+
+
+@dataclass
+class IngestJob:
+    """Tracks one queued ingest; holds the credential fingerprint, never the raw key."""
+
+    id: str
+    stripe_credential_fingerprint: str
+    queued_at: datetime
+    state: str = JOB_QUEUED
+    progress: Union[IngestProgress, RecordedProgress] = field(default_factory=IngestProgress)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    coalesced_requests: int = 0
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.state in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "stripe_credential_fingerprint": self.stripe_credential_fingerprint,
+            "state": self.state,
+            "progress": self.progress.as_dict(),
+            "timings": {
+                "queued_at": self.queued_at.isoformat(),
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+                "queue_seconds": _seconds_between(self.queued_at, self.started_at),
+                "run_seconds": _seconds_between(self.started_at, self.finished_at),
+            },
+            "coalesced_requests": self.coalesced_requests,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+@dataclass
+class IngestBatch:
+    """A bulk ingest: one queued job per distinct account, summarized as they finish."""
+
+    id: str
+    queued_at: datetime
+    jobs: List[IngestJob]
+
+    @property
+    def is_finished(self) -> bool:
+        return all(job.is_finished for job in self.jobs)
+
+    def as_dict(self) -> Dict[str, Any]:
+        failed = sum(1 for job in self.jobs if job.state == JOB_FAILED)
+        succeeded = sum(1 for job in self.jobs if job.state == JOB_SUCCEEDED)
+        finished = self.is_finished
+        if not finished:
+            state = JOB_RUNNING
+        else:
+            state = JOB_FAILED if failed else JOB_SUCCEEDED
+        return {
+            "batch_id": self.id,
+            "state": state,
+            "ok": failed == 0 if finished else None,
+            "queued_at": self.queued_at.isoformat(),
+            "account_count": len(self.jobs),
+            "succeeded": succeeded,
+            "failed": failed,
+            "pending": len(self.jobs) - succeeded - failed,
+            "accounts": [_account_summary(job) for job in self.jobs],
+        }
+
+
+def _account_summary(job: IngestJob) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {
+        "job_id": job.id,
+        "stripe_credential_fingerprint": job.stripe_credential_fingerprint,
+        "state": job.state,
+        "elapsed_seconds": _seconds_between(job.started_at, job.finished_at),
+    }
+    if job.state == JOB_SUCCEEDED and job.result is not None:
+        summary["changes"] = job.result.get("changes")
+    elif job.state == JOB_FAILED:
+        summary["error"] = job.error
+    return summary
+
+
+def _seconds_between(start: Optional[datetime], end: Optional[datetime]) -> Optional[float]:
+    if start is None or end is None:
+        return None
+    return (end - start).total_seconds()
+
+
+class IngestJobStore(Protocol):
+    """Job and batch state shared by every server process, so any of them answers reads."""
+
+    def claim_job(self, job: IngestJob, owner: str) -> Optional[IngestJob]:
+        """Record `job`, or join and return another owner's active job for the account."""
+
+    def update_job(self, job: IngestJob) -> None: ...
+
+    def load_job(self, job_id: str) -> Optional[IngestJob]: ...
+
+    def add_coalesced_request(self, job_id: str) -> None: ...
+
+    def save_batch(self, batch: IngestBatch) -> None: ...
+
+    def load_batch(self, batch_id: str) -> Optional[Tuple[datetime, List[str]]]: ...
+
+    def prune(self, max_finished_jobs: int, max_batches: int) -> None: ...
+
+
+class IngestJobQueue:
+    """Runs ingests on a bounded in-process worker pool and keeps their status around.
+
+    With a `store`, job and batch state is also written there, so a server process that
+    did not run a job still reports it, and an account already being ingested by another
+    process is joined rather than ingested twice.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_finished_jobs: int = 1000,
+        max_batches: int = 100,
+        clock: Optional[Callable[[], datetime]] = None,
+        store: Optional[IngestJobStore] = None,
+    ) -> None:
+        self._clock = clock or (lambda: datetime.now(tz=timezone.utc))
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ingest-worker"
+        )
+        self._max_finished_jobs = max_finished_jobs
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._active_jobs: Dict[str, IngestJob] = {}
+        self._max_batches = max_batches
+        self._batches: "OrderedDict[str, IngestBatch]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._store = store
+        self._owner = uuid.uuid4().hex
+
+    def submit(
+        self, service: IngestionService, stripe_secret_key: str
+    ) -> Tuple[IngestJob, bool]:
+        """Queue an ingest and return `(job, coalesced)`."""
+        fingerprint = StripeCredentialRepository._fingerprint(stripe_secret_key)
+        with self._lock:
+            active = self._active_jobs.get(fingerprint)
+            if active is not None:
+                active.coalesced_requests += 1
+                if self._store is not None:
+                    self._store.add_coalesced_request(active.id)
+                return active, True
+            job = IngestJob(
+                id=uuid.uuid4().hex,
+                stripe_credential_fingerprint=fingerprint,
+                queued_at=self._clock(),
+            )
+            if self._store is not None:
+                elsewhere = self._store.claim_job(job, self._owner)
+                if elsewhere is not None:
+                    return elsewhere, True
+                self._store.prune(self._max_finished_jobs, self._max_batches)
+            self._jobs[job.id] = job
+            self._active_jobs[fingerprint] = job
+            self._evict_finished_jobs()
+        self._executor.submit(self._run, job, service, stripe_secret_key)
+        return job, False
+
+    def submit_batch(
+        self, service: IngestionService, stripe_secret_keys: Sequence[str]
+    ) -> IngestBatch:
+        """Queue one job per distinct key and track them together as a batch."""
+        jobs = [
+            self.submit(service, stripe_secret_key)[0]
+            for stripe_secret_key in dict.fromkeys(stripe_secret_keys)
+        ]
+        batch = IngestBatch(id=uuid.uuid4().hex, queued_at=self._clock(), jobs=jobs)
+        with self._lock:
+            self._batches[batch.id] = batch
+            self._evict_batches()
+        if self._store is not None:
+            self._store.save_batch(batch)
+        return batch
+
+    def get_batch(self, batch_id: str) -> Optional[IngestBatch]:
+        if self._store is None:
+            with self._lock:
+                return self._batches.get(batch_id)
+        stored = self._store.load_batch(batch_id)
+        if stored is None:
+            return None
+        queued_at, job_ids = stored
+        jobs = [self.get_job(job_id) for job_id in job_ids]
+        return IngestBatch(
+            id=batch_id, queued_at=queued_at, jobs=[job for job in jobs if job is not None]
+        )
+
+    def get_job(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            local = self._jobs.get(job_id)
+        if self._store is None:
+            return local
+        stored = self._store.load_job(job_id)
+        if stored is None:
+            return local
+        if local is not None:
+            # The store has the shared counters; this process still has the live progress.
+            stored.progress = local.progress
+        return stored
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[IngestJob]:
+        """Block until the job finishes or `timeout` elapses; returns None for unknown ids."""
+        with self._lock:
+            local = self._jobs.get(job_id)
+        if local is not None:
+            local.done.wait(timeout)
+            return self.get_job(job_id)
+        # Run by another process: poll the shared store.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        job = self.get_job(job_id)
+        while job is not None and not job.is_finished:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            time.sleep(JOB_POLL_SECONDS if remaining is None else min(JOB_POLL_SECONDS, remaining))
+            job = self.get_job(job_id)
+        return job
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job: IngestJob, service: IngestionService, stripe_secret_key: str) -> None:
+        job.started_at = self._clock()
+        job.state = JOB_RUNNING
+        if self._store is not None:
+            self._store.update_job(job)
+        try:
+            job.result = service.ingest(stripe_secret_key, progress=job.progress)
+        except Exception as exc:
+            job.error = str(exc)
+            final_state = JOB_FAILED
+        else:
+            final_state = JOB_SUCCEEDED
+        job.finished_at = self._clock()
+        with self._lock:
+            self._active_jobs.pop(job.stripe_credential_fingerprint, None)
+            job.state = final_state
+            if self._store is not None:
+                self._store.update_job(job)
+        job.done.set()
+
+    def _evict_batches(self) -> None:
+        # Finished batches go first, then the oldest running ones; their jobs stay listed.
+        excess = len(self._batches) - self._max_batches
+        if excess <= 0:
+            return
+        finished = [batch_id for batch_id, batch in self._batches.items() if batch.is_finished]
+        running = [batch_id for batch_id in self._batches if batch_id not in finished]
+        for batch_id in (finished + running)[:excess]:
+            del self._batches[batch_id]
+
+    def _evict_finished_jobs(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.is_finished]
+        for job_id in finished[: max(0, len(finished) - self._max_finished_jobs)]:
+            del self._jobs[job_id]
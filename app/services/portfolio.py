@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from fractions import Fraction
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from app.services.ingestion import StripeSubscriptionSnapshotRepository
+from app.services.renewals import SubscriptionRenewalAnalyzer
+from app.services.snapshot_cache import decompress_snapshot
+from app.services.snapshots import SubscriptionSnapshot
+
+WindowBounds = Tuple[Tuple[float, float], ...]
+
+
+@dataclass(frozen=True)
+class AccountRenewals:
+    """One account's partial aggregate: renewal count and exact amount for each window."""
+
+    fingerprint: str
+    snapshot_version: int
+    subscription_count: int
+    counts: Tuple[int, ...]
+    totals: Tuple[Fraction, ...]
+
+
+class PortfolioDigestService:
+    """Upcoming renewals summed across every stored account, with a per-account breakdown."""
+
+    def __init__(
+        self,
+        snapshot_repository: StripeSubscriptionSnapshotRepository,
+        analyzer: Optional[SubscriptionRenewalAnalyzer] = None,
+        worker_pool: Optional[PortfolioWorkerPool] = None,
+    ) -> None:
+        self._snapshot_repository = snapshot_repository
+        self._analyzer = analyzer or SubscriptionRenewalAnalyzer()
+        self._worker_pool = worker_pool
+
+    def build_portfolio_digest(
+        self, window_days: Union[int, Sequence[int]] = 7, as_of: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        windows = tuple(sorted({window_days} if isinstance(window_days, int) else {*window_days}))
+        if not windows:
+            raise ValueError("At least one window is required")
+        as_of = as_of or self._analyzer.now()
+        bounds = tuple(
+            tuple(bound.timestamp() for bound in self._analyzer.window(days, as_of=as_of))
+            for days in windows
+        )
+        accounts = self._summarize(bounds)
+        return {
+            "as_of": as_of.isoformat(),
+            "account_count": len(accounts),
+            "subscription_count": sum(account.subscription_count for account in accounts),
+            "windows": _window_totals(windows, accounts),
+            "accounts": [
+                {
+                    "stripe_credential_fingerprint": account.fingerprint,
+                    "snapshot_version": account.snapshot_version,
+                    "subscription_count": account.subscription_count,
+                    "windows": _window_totals(windows, [account]),
+                }
+                for account in accounts
+            ],
+        }
+
+    def _summarize(self, bounds: WindowBounds) -> List[AccountRenewals]:
+        """Resident accounts in this thread; cold ones on the worker pool when there is one."""
+        summaries: List[Union[AccountRenewals, "Future[AccountRenewals]"]] = []
+        for stored in self._snapshot_repository.iter_stored_snapshots():
+            if not isinstance(stored, bytes):
+                summaries.append(summarize_account(stored, bounds))
+            elif self._worker_pool is not None:
+                summaries.append(self._worker_pool.submit(stored, bounds))
+            else:
+                summaries.append(summarize_compressed_account(stored, bounds))
+        return [
+            summary.result() if isinstance(summary, Future) else summary
+            for summary in summaries
+        ]
+
+
+class PortfolioWorkerPool:
+    """Up to `workers` processes that decompress and summarize cold accounts."""
+
+    def __init__(self, workers: int) -> None:
+        self._workers = workers
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def submit(self, compressed: bytes, bounds: WindowBounds) -> "Future[AccountRenewals]":
+        with self._lock:
+            if self._executor is None:
+                # Started on first use, so each pre-forked server worker gets its own pool.
+                # Spawned rather than forked: this process runs threads that may hold locks.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            executor = self._executor
+        return executor.submit(summarize_compressed_account, compressed, bounds)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+def summarize_compressed_account(compressed: bytes, bounds: WindowBounds) -> AccountRenewals:
+    return summarize_account(decompress_snapshot(compressed), bounds)
+
+
+def summarize_account(snapshot: SubscriptionSnapshot, bounds: WindowBounds) -> AccountRenewals:
+    index = snapshot.renewal_index()
+    totals = [index.exact_totals_between(start, end) for start, end in bounds]
+    return AccountRenewals(
+        fingerprint=snapshot.fingerprint,
+        snapshot_version=snapshot.version,
+        subscription_count=len(snapshot.get("subscriptions", ())),
+        counts=tuple(count for count, _ in totals),
+        totals=tuple(total for _, total in totals),
+    )
+
+
+def _window_totals(
+    windows: Tuple[int, ...], accounts: Sequence[AccountRenewals]
+) -> List[Dict[str, Any]]:
+    totals = []
+    for position, days in enumerate(windows):
+        totals.append(
+            {
+                "window_days": days,
+                "upcoming_count": sum(account.counts[position] for account in accounts),
+                # Rounded once, after adding every account's exact total.
+                "total_amount_due": float(sum(account.totals[position] for account in accounts)),
+            }
+        )
+    return totals
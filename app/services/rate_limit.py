@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from app.services.ingestion import StripeCredentialRepository
+
+
+class TokenBucket:
+    """Thread-safe token bucket that hands out reservations instead of blocking itself."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self._rate = rate
+        self._capacity = capacity if capacity is not None else rate
+        self._clock = clock
+        self._tokens = self._capacity
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Take `tokens` now and return how many seconds the caller must wait before using them."""
+        with self._lock:
+            now = self._clock()
+            elapsed = max(0.0, now - self._updated_at)
+            self._tokens = min(self._capacity, self._tokens + elapsed * self._rate)
+            self._updated_at = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self._rate
+
+
+class StripeRateLimiter:
+    """Combines one global bucket with one bucket per Stripe account fingerprint."""
+
+    def __init__(
+        self,
+        global_rate: float = 100.0,
+        per_account_rate: float = 25.0,
+        global_burst: Optional[float] = None,
+        per_account_burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._per_account_rate = per_account_rate
+        self._per_account_burst = per_account_burst
+        self._clock = clock
+        self._sleep = sleep
+        self._global_bucket = TokenBucket(global_rate, global_burst, clock=clock)
+        self._account_buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, stripe_secret_key: str) -> float:
+        """Reserve one request against both buckets and return the delay before sending it."""
+        account_wait = self._account_bucket(stripe_secret_key).reserve()
+        global_wait = self._global_bucket.reserve()
+        return max(account_wait, global_wait)
+
+    def acquire(self, stripe_secret_key: str) -> float:
+        wait = self.reserve(stripe_secret_key)
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    async def acquire_async(self, stripe_secret_key: str) -> float:
+        wait = self.reserve(stripe_secret_key)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def _account_bucket(self, stripe_secret_key: str) -> TokenBucket:
+        fingerprint = StripeCredentialRepository._fingerprint(stripe_secret_key)
+        with self._lock:
+            bucket = self._account_buckets.get(fingerprint)
+            if bucket is None:
+                bucket = TokenBucket(
+                    self._per_account_rate,
+                    self._per_account_burst,
+                    clock=self._clock,
+                )
+                self._account_buckets[fingerprint] = bucket
+            return bucket
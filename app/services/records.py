@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Any, Dict, Mapping, Optional, Sequence, Union
+
+EpochSeconds = Union[int, float]
+
+COMPACT_FIELDS = ("id", "status", "current_period_end", "amount_due", "customer")
+
+
+class SubscriptionRecord:
+    """Compact projection of a Stripe subscription holding only what digests read."""
+
+    __slots__ = ("id", "status", "current_period_end", "amount_due", "customer", "raw")
+
+    def __init__(
+        self,
+        id: Optional[str],
+        status: Optional[str] = None,
+        current_period_end: Optional[EpochSeconds] = None,
+        amount_due: Optional[float] = None,
+        raw: Optional[Dict[str, Any]] = None,
+        customer: Optional[str] = None,
+    ) -> None:
+        self.id = id
+        self.status = status
+        self.current_period_end = current_period_end
+        self.amount_due = amount_due
+        self.customer = customer
+        self.raw = raw
+
+    @classmethod
+    def from_stripe(
+        cls, payload: Mapping[str, Any], keep_raw: bool = False
+    ) -> "SubscriptionRecord":
+        record_id = payload.get("id")
+        status = payload.get("status")
+        return cls(
+            id=None if record_id is None else str(record_id),
+            status=None if status is None else str(status),
+            current_period_end=to_epoch_seconds(payload.get("current_period_end")),
+            amount_due=to_amount(payload.get("amount_due")),
+            raw=dict(payload) if keep_raw else None,
+            customer=to_object_id(payload.get("customer")),
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        """The raw payload when kept, otherwise the compact fields that are set."""
+        if self.raw is not None:
+            return dict(self.raw)
+        compact = {
+            "id": self.id,
+            "status": self.status,
+            "current_period_end": self.current_period_end,
+            "amount_due": self.amount_due,
+            "customer": self.customer,
+        }
+        return {key: value for key, value in compact.items() if value is not None}
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, SubscriptionRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return (
+            f"SubscriptionRecord(id={self.id!r}, status={self.status!r}, "
+            f"current_period_end={self.current_period_end!r}, amount_due={self.amount_due!r}, "
+            f"customer={self.customer!r})"
+        )
+
+
+class CustomerRecord:
+    """Compact projection of a Stripe customer: the details digests show next to renewals."""
+
+    __slots__ = ("id", "name", "email")
+
+    def __init__(
+        self, id: str, name: Optional[str] = None, email: Optional[str] = None
+    ) -> None:
+        self.id = id
+        self.name = name
+        self.email = email
+
+    @classmethod
+    def from_stripe(cls, payload: Mapping[str, Any]) -> Optional["CustomerRecord"]:
+        """The compact record, or None for payloads without an id."""
+        customer_id = to_object_id(payload)
+        if customer_id is None:
+            return None
+        name, email = payload.get("name"), payload.get("email")
+        return cls(
+            id=customer_id,
+            name=None if name is None else str(name),
+            email=None if email is None else str(email),
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "name": self.name, "email": self.email}
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, CustomerRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"CustomerRecord(id={self.id!r}, name={self.name!r}, email={self.email!r})"
+
+
+def to_object_id(value: Any) -> Optional[str]:
+    """The id of a Stripe reference, which is either the id itself or an expanded object."""
+    if isinstance(value, Mapping):
+        value = value.get("id")
+    if value is None or isinstance(value, bool):
+        return None
+    return str(value)
+
+
+def to_epoch_seconds(value: Any) -> Optional[EpochSeconds]:
+    """Normalize datetimes, ISO-8601 strings and numbers to UTC epoch seconds."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str):
+        iso_value = value.replace("Z", "+00:00") if value.endswith("Z") else value
+        try:
+            parsed = datetime.fromisoformat(iso_value)
+        except ValueError:
+            return None
+    else:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    epoch = parsed.timestamp()
+    return int(epoch) if epoch.is_integer() else epoch
+
+
+def ensure_utc(value: datetime) -> datetime:
+    """Treat naive datetimes as UTC and convert aware ones to UTC."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def to_amount(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def serialize_record(record: Any, fields: Optional[Sequence[str]] = None) -> Any:
+    """JSON-ready record, limited to `fields` (those that are set) when given."""
+    if fields is None:
+        return record.as_dict() if isinstance(record, SubscriptionRecord) else record
+    if isinstance(record, SubscriptionRecord) and record.raw is None:
+        # Read the projected slots directly instead of expanding the whole record first.
+        values = {
+            field: getattr(record, field) for field in fields if field in COMPACT_FIELDS
+        }
+        return {key: value for key, value in values.items() if value is not None}
+    expanded = serialize_record(record)
+    if not isinstance(expanded, Mapping):
+        return expanded
+    return {field: expanded[field] for field in fields if field in expanded}
+
+
+def serialize_snapshot(
+    snapshot: Mapping[str, Any], fields: Optional[Sequence[str]] = None
+) -> Dict[str, Any]:
+    """JSON-ready copy of a stored snapshot with compact records expanded to dicts."""
+    return {
+        key: [serialize_record(record, fields) for record in value]
+        if isinstance(value, (list, tuple))
+        else value
+        for key, value in snapshot.items()
+    }
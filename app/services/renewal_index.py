@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import date, timedelta
+from fractions import Fraction
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from app.services.records import SubscriptionRecord
+
+SECONDS_PER_DAY = 86_400
+EPOCH_DATE = date(1970, 1, 1)
+
+AmountPrefix = Union[array, List[int]]
+
+
+@dataclass(frozen=True)
+class RenewalDay:
+    """One UTC day of a renewal calendar; `day` counts days since the Unix epoch."""
+
+    day: int
+    count: int
+    total_amount_due: float
+    cumulative_count: int
+    cumulative_amount_due: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "date": (EPOCH_DATE + timedelta(days=self.day)).isoformat(),
+            "count": self.count,
+            "total_amount_due": self.total_amount_due,
+            "cumulative_count": self.cumulative_count,
+            "cumulative_amount_due": self.cumulative_amount_due,
+        }
+
+
+def epoch_day(value: date) -> int:
+    return (value - EPOCH_DATE).days
+
+
+class RenewalIndex:
+    """One snapshot's subscriptions sorted by `current_period_end`, with exact running totals."""
+
+    __slots__ = (
+        "_records",
+        "_period_ends",
+        "_positions",
+        "_amount_prefix",
+        "_amount_denominator",
+    )
+
+    def __init__(
+        self,
+        records: Sequence[SubscriptionRecord],
+        period_ends: array,
+        positions: array,
+        amount_prefix: Optional[AmountPrefix] = None,
+        amount_denominator: int = 1,
+    ) -> None:
+        self._records = records
+        self._period_ends = period_ends
+        self._positions = positions
+        if amount_prefix is None:
+            amount_prefix, amount_denominator = _prefix_sums(
+                records[position].amount_due for position in positions
+            )
+        self._amount_prefix = amount_prefix
+        self._amount_denominator = amount_denominator
+
+    @classmethod
+    def build(cls, subscriptions: Iterable[Any]) -> "RenewalIndex":
+        records = tuple(subscriptions)
+        entries = sorted(
+            (record.current_period_end, position)
+            for position, record in enumerate(records)
+            if isinstance(record, SubscriptionRecord) and record.current_period_end is not None
+        )
+        return cls(
+            records,
+            array("d", (period_end for period_end, _ in entries)),
+            array("q", (position for _, position in entries)),
+        )
+
+    def between(self, start: float, end: float) -> Tuple[SubscriptionRecord, ...]:
+        """Subscriptions whose `current_period_end` falls within `[start, end]` epoch seconds."""
+        low, high = self._bounds(start, end)
+        return tuple(self._records[position] for position in sorted(self._positions[low:high]))
+
+    def totals_between(self, start: float, end: float) -> Tuple[int, float]:
+        """`(count, total_amount_due)` of renewals within `[start, end]`, in O(log n)."""
+        count, total = self.exact_totals_between(start, end)
+        return count, float(total)
+
+    def exact_totals_between(self, start: float, end: float) -> Tuple[int, Fraction]:
+        """`totals_between` with the unrounded total, for adding up several indexes."""
+        low, high = self._bounds(start, end)
+        return high - low, self._amount(low, high)
+
+    def daily_totals(self, first_day: int, days: int) -> List["RenewalDay"]:
+        """Renewal count and amount per UTC day for `days` days from epoch day `first_day`."""
+        boundaries = [
+            bisect_left(self._period_ends, (first_day + offset) * SECONDS_PER_DAY)
+            for offset in range(days + 1)
+        ]
+        start = boundaries[0]
+        return [
+            RenewalDay(
+                day=first_day + offset,
+                count=high - low,
+                total_amount_due=float(self._amount(low, high)),
+                cumulative_count=high - start,
+                cumulative_amount_due=float(self._amount(start, high)),
+            )
+            for offset, (low, high) in enumerate(zip(boundaries, boundaries[1:]))
+        ]
+
+    @property
+    def arrays(self) -> Tuple[array, array, AmountPrefix, int]:
+        """The sorted arrays and amount denominator; with the records they rebuild the index."""
+        return self._period_ends, self._positions, self._amount_prefix, self._amount_denominator
+
+    def __len__(self) -> int:
+        return len(self._period_ends)
+
+    def size_bytes(self) -> int:
+        return (
+            sys.getsizeof(self._period_ends)
+            + sys.getsizeof(self._positions)
+            + sys.getsizeof(self._amount_prefix)
+        )
+
+    def _amount(self, low: int, high: int) -> Fraction:
+        prefix = self._amount_prefix
+        return Fraction(prefix[high] - prefix[low], self._amount_denominator)
+
+    def _bounds(self, start: float, end: float) -> Tuple[int, int]:
+        low = bisect_left(self._period_ends, start)
+        return low, bisect_right(self._period_ends, end, lo=low)
+
+
+def _prefix_sums(amounts: Iterable[Optional[float]]) -> Tuple[AmountPrefix, int]:
+    """Exact running totals with a leading zero, as integer multiples of 1/denominator."""
+    # Float denominators are powers of two, so the largest one is a common denominator.
+    ratios = [(0, 1) if amount is None else amount.as_integer_ratio() for amount in amounts]
+    denominator = max((ratio[1] for ratio in ratios), default=1)
+    prefix = [0]
+    for numerator, amount_denominator in ratios:
+        prefix.append(prefix[-1] + numerator * (denominator // amount_denominator))
+    try:
+        return array("q", prefix), denominator
+    except OverflowError:
+        # Fractional amounts of very different magnitudes outgrow 64 bits.
+        return prefix, denominator
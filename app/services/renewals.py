@@ -1,8 +1,21 @@
 from __future__ import annotations
 
+import base64
+import binascii
+import heapq
+import json
+import math
+from bisect import bisect_left
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Any, Callable, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.services.columnar import ColumnarSubscriptions
+from app.services.records import SubscriptionRecord, to_object_id
+from app.services.snapshot_pages import InvalidCursorError
+
+# "period_end" lists the soonest renewals first, "amount_due" the largest amounts first.
+RENEWAL_ORDERS = ("period_end", "amount_due")
 
 
 @dataclass
@@ -13,14 +26,99 @@ class UpcomingRenewal:
     current_period_end: datetime
     status: Optional[str]
     amount_due: Optional[float]
+    customer_id: Optional[str] = None
 
     def as_dict(self) -> Dict[str, Any]:
-        return {
+        item = {
             "id": self.id,
             "current_period_end": self.current_period_end.isoformat(),
             "status": self.status,
             "amount_due": self.amount_due,
         }
+        if self.customer_id is not None:
+            item["customer_id"] = self.customer_id
+        return item
+
+
+@dataclass(frozen=True)
+class RenewalCursor:
+    """Where the next page of renewals starts: the sort key of the last one returned."""
+
+    order: str
+    key: Tuple[Any, ...]
+
+    def encode(self) -> str:
+        payload = json.dumps([self.order, list(self.key)], separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "RenewalCursor":
+        try:
+            payload = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            order, key = json.loads(payload)
+        except (ValueError, TypeError, binascii.Error) as exc:
+            raise InvalidCursorError("Malformed cursor") from exc
+        if (
+            order not in RENEWAL_ORDERS
+            or not isinstance(key, list)
+            or len(key) != (2 if order == "period_end" else 4)
+            or not isinstance(key[-1], str)
+            or not all(isinstance(value, (int, float)) for value in key[:-1])
+        ):
+            raise InvalidCursorError("Malformed cursor")
+        return cls(order=order, key=tuple(key))
+
+
+def renewal_sort_key(order: str, period_end_epoch: float, renewal: UpcomingRenewal) -> tuple:
+    """Total ordering for `order`; ties are broken by period end and then subscription id."""
+    renewal_id = renewal.id or ""
+    if order == "amount_due":
+        amount = renewal.amount_due
+        # Renewals without an amount sort after every renewal that has one.
+        return (amount is None, -(amount or 0.0), period_end_epoch, renewal_id)
+    return (period_end_epoch, renewal_id)
+
+
+class _Descending:
+    """Heap entry with inverted ordering, so `heapq`'s min-heap evicts the largest key."""
+
+    __slots__ = ("key", "renewal")
+
+    def __init__(self, key: tuple, renewal: UpcomingRenewal) -> None:
+        self.key = key
+        self.renewal = renewal
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return self.key > other.key
+
+
+class _RenewalPage:
+    """The `limit` smallest keys after `cursor`, kept in a bounded heap in O(n log limit)."""
+
+    def __init__(self, order: str, limit: Optional[int], cursor: Optional[RenewalCursor]) -> None:
+        self._order = order
+        self._limit = limit
+        self._after = cursor.key if cursor is not None else None
+        self._heap: List[_Descending] = []
+        self._remaining = 0
+
+    def offer(self, key: tuple, renewal: UpcomingRenewal) -> None:
+        if self._after is not None and key <= self._after:
+            return
+        self._remaining += 1
+        if self._limit is None or len(self._heap) < self._limit:
+            heapq.heappush(self._heap, _Descending(key, renewal))
+        elif key < self._heap[0].key:
+            heapq.heapreplace(self._heap, _Descending(key, renewal))
+
+    def fill(self, result: Dict[str, Any]) -> None:
+        entries = sorted(self._heap, key=lambda entry: entry.key)
+        result["upcoming_subscriptions"] = [entry.renewal.as_dict() for entry in entries]
+        result["next_cursor"] = (
+            RenewalCursor(self._order, entries[-1].key).encode()
+            if entries and self._remaining > len(entries)
+            else None
+        )
 
 
 class SubscriptionRenewalAnalyzer:
@@ -29,41 +127,146 @@ class SubscriptionRenewalAnalyzer:
     def __init__(self, clock: Optional[Callable[[], datetime]] = None) -> None:
         self._clock = clock or (lambda: datetime.now(tz=timezone.utc))
 
+    def now(self) -> datetime:
+        return self._clock()
+
+    def window(
+        self, window_days: int = 7, as_of: Optional[datetime] = None
+    ) -> Tuple[datetime, datetime]:
+        """The `(as_of, window_end)` bounds used by `find_upcoming`."""
+        as_of = as_of or self.now()
+        return as_of, as_of + timedelta(days=window_days)
+
     def find_upcoming(
-        self, subscriptions: Iterable[Dict[str, Any]], window_days: int = 7
+        self,
+        subscriptions: Iterable[Any],
+        window_days: int = 7,
+        as_of: Optional[datetime] = None,
     ) -> Dict[str, Any]:
         """Return renewals that fall within the upcoming window along with aggregate totals."""
-        as_of = self._clock()
-        window_end = as_of + timedelta(days=window_days)
-
-        upcoming: List[UpcomingRenewal] = []
-        total_amount_due = 0.0
+        return self.find_upcoming_windows(subscriptions, (window_days,), as_of=as_of)[
+            window_days
+        ]
 
-        for subscription in subscriptions:
-            period_end = self._parse_period_end(subscription.get("current_period_end"))
-            if period_end is None or not (as_of <= period_end <= window_end):
-                continue
+    def find_upcoming_windows(
+        self,
+        subscriptions: Iterable[Any],
+        windows_days: Sequence[int],
+        as_of: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        order: str = "period_end",
+        cursor: Optional[RenewalCursor] = None,
+    ) -> Dict[int, Dict[str, Any]]:
+        """`find_upcoming` for several windows, keyed by day count, in one pass."""
+        if order not in RENEWAL_ORDERS:
+            raise ValueError(f"Unknown renewal order {order!r}")
+        if cursor is not None and cursor.order != order:
+            raise InvalidCursorError("Cursor belongs to another sort order")
+        paged = limit is not None or cursor is not None
+        windows = sorted(set(windows_days))
+        as_of, widest_end = self.window(windows[-1], as_of=as_of)
+        # The widest window's own bound already filtered the renewals, so only the
+        # narrower bounds take part in bucketing.
+        narrower_ends = [self.window(days, as_of=as_of)[1].timestamp() for days in windows[:-1]]
 
-            amount_due = self._coerce_amount(subscription.get("amount_due"))
+        results = {
+            days: {
+                "as_of": as_of.isoformat(),
+                "window_days": days,
+                "total_amount_due": 0.0,
+                "upcoming_count": 0,
+                "upcoming_subscriptions": [],
+                "next_cursor": None,
+            }
+            for days in windows
+        }
+        buckets = [results[days] for days in windows]
+        # Amounts grouped by the narrowest window they fall in; each window's total is an
+        # exact sum over its own group and every narrower one.
+        bands: List[List[float]] = [[] for _ in windows]
+        if paged:
+            pages = [_RenewalPage(order, limit, cursor) for _ in windows]
+            for period_end_epoch, renewal in self._renewals_between(
+                subscriptions, as_of, widest_end
+            ):
+                key = renewal_sort_key(order, period_end_epoch, renewal)
+                first = bisect_left(narrower_ends, period_end_epoch)
+                if renewal.amount_due is not None:
+                    bands[first].append(renewal.amount_due)
+                for result, page in zip(buckets[first:], pages[first:]):
+                    result["upcoming_count"] += 1
+                    page.offer(key, renewal)
+            for result, page in zip(buckets, pages):
+                page.fill(result)
+        else:
+            for period_end_epoch, renewal in self._renewals_between(
+                subscriptions, as_of, widest_end
+            ):
+                item = renewal.as_dict()
+                first = bisect_left(narrower_ends, period_end_epoch)
+                if renewal.amount_due is not None:
+                    bands[first].append(renewal.amount_due)
+                for result in buckets[first:]:
+                    result["upcoming_count"] += 1
+                    result["upcoming_subscriptions"].append(item)
+        for position, result in enumerate(buckets):
+            result["total_amount_due"] = math.fsum(
+                amount for band in bands[: position + 1] for amount in band
+            )
+        return results
 
-            if amount_due is not None:
-                total_amount_due += amount_due
+    def _renewals_between(
+        self, subscriptions: Iterable[Any], as_of: datetime, window_end: datetime
+    ) -> Iterator[Tuple[float, UpcomingRenewal]]:
+        """`(period_end_epoch, renewal)` for every renewal inside the window, in input order."""
+        if isinstance(subscriptions, ColumnarSubscriptions):
+            yield from self._renewals_in_columns(subscriptions, as_of, window_end)
+            return
+        as_of_epoch = as_of.timestamp()
+        window_end_epoch = window_end.timestamp()
 
-            upcoming.append(
-                UpcomingRenewal(
+        for subscription in subscriptions:
+            if isinstance(subscription, SubscriptionRecord):
+                period_end_epoch = subscription.current_period_end
+                if period_end_epoch is None or not (
+                    as_of_epoch <= period_end_epoch <= window_end_epoch
+                ):
+                    continue
+                renewal = UpcomingRenewal(
+                    id=subscription.id,
+                    current_period_end=datetime.fromtimestamp(period_end_epoch, tz=timezone.utc),
+                    status=subscription.status,
+                    amount_due=subscription.amount_due,
+                    customer_id=subscription.customer,
+                )
+            else:
+                period_end = self._parse_period_end(subscription.get("current_period_end"))
+                if period_end is None or not (as_of <= period_end <= window_end):
+                    continue
+                period_end_epoch = period_end.timestamp()
+                renewal = UpcomingRenewal(
                     id=subscription.get("id"),
                     current_period_end=period_end,
                     status=subscription.get("status"),
-                    amount_due=amount_due,
+                    amount_due=self._coerce_amount(subscription.get("amount_due")),
+                    customer_id=to_object_id(subscription.get("customer")),
                 )
-            )
+            yield period_end_epoch, renewal
 
-        return {
-            "as_of": as_of.isoformat(),
-            "window_days": window_days,
-            "total_amount_due": total_amount_due,
-            "upcoming_subscriptions": [item.as_dict() for item in upcoming],
-        }
+    @staticmethod
+    def _renewals_in_columns(
+        columns: ColumnarSubscriptions, as_of: datetime, window_end: datetime
+    ) -> Iterator[Tuple[float, UpcomingRenewal]]:
+        """Bisect the memory-mapped period-end column; only matching rows are materialized."""
+        for row in columns.rows_between(as_of.timestamp(), window_end.timestamp()):
+            period_end_epoch = columns.period_ends[row]
+            yield period_end_epoch, UpcomingRenewal(
+                id=columns.id_at(row),
+                current_period_end=datetime.fromtimestamp(period_end_epoch, tz=timezone.utc),
+                status=columns.status_at(row),
+                amount_due=columns.amount_at(row),
+                customer_id=columns.customer_at(row),
+            )
 
     @staticmethod
     def _parse_period_end(value: Any) -> Optional[datetime]:
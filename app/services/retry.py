@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, FrozenSet, Optional
+
+import httpx
+
+RETRYABLE_STATUS_CODES = frozenset({409, 429, 500, 502, 503, 504})
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Capped exponential backoff with full jitter for idempotent Stripe list calls."""
+
+    max_attempts: int = 5
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    max_retry_after: float = 600.0
+    retryable_status_codes: FrozenSet[int] = RETRYABLE_STATUS_CODES
+    jitter: Callable[[float, float], float] = field(default=random.uniform, compare=False)
+
+    def delay_after_response(self, response: httpx.Response, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying `response`, or None if it should not be retried."""
+        if response.status_code < 400 or not self._has_attempts_left(attempt):
+            return None
+        should_retry = response.headers.get("Stripe-Should-Retry")
+        if should_retry == "false":
+            return None
+        if should_retry != "true" and response.status_code not in self.retryable_status_codes:
+            return None
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return self.backoff(attempt)
+
+    def delay_after_error(self, attempt: int) -> Optional[float]:
+        """Seconds to wait after a transport error, or None once attempts are exhausted."""
+        if not self._has_attempts_left(attempt):
+            return None
+        return self.backoff(attempt)
+
+    def backoff(self, attempt: int) -> float:
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return self.jitter(0.0, ceiling)
+
+    def _has_attempts_left(self, attempt: int) -> bool:
+        return attempt + 1 < self.max_attempts
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a `Retry-After` header given either as delta-seconds or as an HTTP date."""
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(tz=timezone.utc)).total_seconds())
@@ -21,11 +21,13 @@ class SlackDigestDeliveryService:
         webhook_repository: SlackWebhookRepository,
         slack_client: SlackWebhookClient,
         formatter: Optional[SlackDigestFormatter] = None,
+        listed_renewals: Optional[int] = None,
     ) -> None:
         self._digest_service = digest_service
         self._webhook_repository = webhook_repository
         self._slack_client = slack_client
         self._formatter = formatter or SlackDigestFormatter()
+        self._listed_renewals = listed_renewals
 
     def deliver_digest(self, stripe_secret_key: str, window_days: int = 7) -> Dict[str, Any]:
         fingerprint = StripeCredentialRepository._fingerprint(stripe_secret_key)
@@ -41,6 +43,7 @@ class SlackDigestDeliveryService:
         digest = self._digest_service.build_digest(
             stripe_secret_key=stripe_secret_key,
             window_days=window_days,
+            limit=self._listed_renewals,
         )
         payload = self._formatter.format_digest(digest)
         try:
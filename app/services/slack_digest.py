@@ -9,6 +9,10 @@ class SlackDigestFormatter:
     def __init__(self, max_subscription_lines: int = 5) -> None:
         self._max_subscription_lines = max_subscription_lines
 
+    @property
+    def max_subscription_lines(self) -> int:
+        return self._max_subscription_lines
+
     def format_digest(self, digest: Dict[str, Any]) -> Dict[str, Any]:
         fingerprint = self._as_string(digest.get("stripe_credential_fingerprint"), fallback="unknown")
         upcoming = digest.get("upcoming") or {}
@@ -16,7 +20,10 @@ class SlackDigestFormatter:
 
         window_days = self._as_int(upcoming.get("window_days"), default=7)
         total_amount_due = self._coerce_float(upcoming.get("total_amount_due"), default=0.0)
-        subscription_count = len(subscriptions)
+        # Paged digests list only the first renewals; `upcoming_count` covers the window.
+        subscription_count = self._as_int(
+            upcoming.get("upcoming_count"), default=len(subscriptions)
+        )
 
         summary_text = self._build_summary_text(
             fingerprint=fingerprint,
@@ -25,7 +32,7 @@ class SlackDigestFormatter:
             total_amount_due=total_amount_due,
         )
 
-        detail_lines = self._build_detail_lines(subscriptions)
+        detail_lines = self._build_detail_lines(subscriptions, subscription_count)
         blocks = [{"type": "section", "text": {"type": "mrkdwn", "text": summary_text}}]
         if detail_lines:
             blocks.append(
@@ -53,7 +60,9 @@ class SlackDigestFormatter:
             f"Projected total: {amount_text}"
         )
 
-    def _build_detail_lines(self, subscriptions: Sequence[Dict[str, Any]]) -> List[str]:
+    def _build_detail_lines(
+        self, subscriptions: Sequence[Dict[str, Any]], subscription_count: int
+    ) -> List[str]:
         lines: List[str] = []
         max_lines = min(len(subscriptions), self._max_subscription_lines)
 
@@ -76,7 +85,7 @@ class SlackDigestFormatter:
 
             lines.append(line)
 
-        remaining = len(subscriptions) - max_lines
+        remaining = max(subscription_count, len(subscriptions)) - max_lines
         if remaining > 0:
             lines.append(f"- ...and {remaining} more subscription{'s' if remaining != 1 else ''}")
 
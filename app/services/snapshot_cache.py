@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import pickle
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from app.services.renewal_index import RenewalIndex
+from app.services.snapshots import SubscriptionSnapshot
+
+
+@dataclass
+class _CacheEntry:
+    snapshot: Optional[SubscriptionSnapshot]
+    version: int
+    resident_bytes: int
+    compressed: Optional[bytes] = None
+    hits: int = 0
+    misses: int = 0
+    last_access: float = 0.0
+
+    @property
+    def compressed_bytes(self) -> int:
+        return 0 if self.compressed is None else len(self.compressed)
+
+
+_Victim = Tuple[str, _CacheEntry, SubscriptionSnapshot]
+
+
+class SnapshotCache:
+    """Holds snapshot versions under a memory budget, compressing the coldest ones."""
+
+    def __init__(
+        self,
+        budget_bytes: Optional[int] = None,
+        compression_level: int = 6,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._budget_bytes = budget_bytes
+        self._compression_level = compression_level
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _CacheEntry] = {}
+        self._hot: "OrderedDict[str, None]" = OrderedDict()
+        self._resident_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, fingerprint: str) -> Optional[SubscriptionSnapshot]:
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                return None
+            entry.last_access = self._clock()
+            snapshot = entry.snapshot
+            if snapshot is not None:
+                entry.hits += 1
+                self._hits += 1
+                victims = self._touch(fingerprint, entry)
+            else:
+                entry.misses += 1
+                self._misses += 1
+                compressed = entry.compressed
+        if snapshot is None:
+            snapshot = decompress_snapshot(compressed)  # type: ignore[arg-type]
+            with self._lock:
+                if self._entries.get(fingerprint) is not entry:
+                    # Replaced while decompressing; this read still saw the older version.
+                    return snapshot
+                if entry.snapshot is None:
+                    entry.snapshot = snapshot
+                    entry.compressed = None
+                else:
+                    snapshot = entry.snapshot
+                victims = self._touch(fingerprint, entry)
+        self._compress_victims(victims)
+        return snapshot
+
+    def peek(self, fingerprint: str) -> Optional[SubscriptionSnapshot]:
+        """Read without changing LRU order; a cold account is decompressed into an uncached copy."""
+        stored = self.peek_stored(fingerprint)
+        return decompress_snapshot(stored) if isinstance(stored, bytes) else stored
+
+    def peek_stored(self, fingerprint: str) -> Union[SubscriptionSnapshot, bytes, None]:
+        """Like `peek`, but a cold account is returned still compressed."""
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                return None
+            return entry.snapshot if entry.snapshot is not None else entry.compressed
+
+    def put(self, fingerprint: str, snapshot: SubscriptionSnapshot) -> None:
+        with self._lock:
+            previous = self._entries.get(fingerprint)
+            entry = _CacheEntry(
+                snapshot=snapshot,
+                version=snapshot.version,
+                resident_bytes=estimate_snapshot_size(snapshot),
+                hits=previous.hits if previous else 0,
+                misses=previous.misses if previous else 0,
+                last_access=self._clock(),
+            )
+            if fingerprint in self._hot:
+                assert previous is not None
+                self._resident_bytes -= previous.resident_bytes
+                del self._hot[fingerprint]
+            self._entries[fingerprint] = entry
+            victims = self._make_resident(fingerprint, entry)
+        self._compress_victims(victims)
+
+    def version_of(self, fingerprint: str) -> Optional[int]:
+        """The cached version without touching LRU order, counters or compressed data."""
+        entry = self._entries.get(fingerprint)
+        return None if entry is None else entry.version
+
+    def fingerprints(self) -> List[str]:
+        with self._lock:
+            return list(self._entries)
+
+    def __contains__(self, fingerprint: object) -> bool:
+        return fingerprint in self._entries
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget_bytes": self._budget_bytes,
+                "resident_bytes": self._resident_bytes,
+                "compressed_bytes": sum(
+                    entry.compressed_bytes for entry in self._entries.values()
+                ),
+                "resident_accounts": len(self._hot),
+                "compressed_accounts": len(self._entries) - len(self._hot),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "accounts": {
+                    fingerprint: {
+                        "resident": fingerprint in self._hot,
+                        "resident_bytes": entry.resident_bytes,
+                        "compressed_bytes": entry.compressed_bytes,
+                        "hits": entry.hits,
+                        "misses": entry.misses,
+                        "last_access": entry.last_access,
+                    }
+                    for fingerprint, entry in self._entries.items()
+                },
+            }
+
+    def _touch(self, fingerprint: str, entry: _CacheEntry) -> List[_Victim]:
+        if fingerprint in self._hot:
+            self._hot.move_to_end(fingerprint)
+            return []
+        # Picked for eviction but not compressed yet, or just rehydrated.
+        return self._make_resident(fingerprint, entry)
+
+    def _make_resident(self, fingerprint: str, entry: _CacheEntry) -> List[_Victim]:
+        self._hot[fingerprint] = None
+        self._resident_bytes += entry.resident_bytes
+        victims: List[_Victim] = []
+        if self._budget_bytes is None:
+            return victims
+        while self._resident_bytes > self._budget_bytes and len(self._hot) > 1:
+            victim, _ = self._hot.popitem(last=False)
+            victim_entry = self._entries[victim]
+            assert victim_entry.snapshot is not None
+            victims.append((victim, victim_entry, victim_entry.snapshot))
+            self._resident_bytes -= victim_entry.resident_bytes
+            self._evictions += 1
+        return victims
+
+    def _compress_victims(self, victims: List[_Victim]) -> None:
+        """Compress evicted snapshots outside the lock, dropping any read back in meanwhile."""
+        for fingerprint, entry, snapshot in victims:
+            compressed = _compress(snapshot, self._compression_level)
+            with self._lock:
+                if self._entries.get(fingerprint) is entry and fingerprint not in self._hot:
+                    entry.compressed = compressed
+                    entry.snapshot = None
+
+
+def _compress(snapshot: SubscriptionSnapshot, level: int) -> bytes:
+    """Pickle the snapshot with its renewal index arrays, so rehydrating skips the sort."""
+    arrays = snapshot.renewal_index().arrays if snapshot.has_renewal_index else None
+    payload = (snapshot, arrays, snapshot.has_customer_index)
+    return zlib.compress(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL), level)
+
+
+def decompress_snapshot(compressed: bytes) -> SubscriptionSnapshot:
+    snapshot, arrays, has_customer_index = pickle.loads(zlib.decompress(compressed))
+    if arrays is not None:
+        snapshot.adopt_renewal_index(RenewalIndex(snapshot.get("subscriptions") or (), *arrays))
+    if has_customer_index:
+        snapshot.customer_index()
+    return snapshot
+
+
+def estimate_snapshot_size(snapshot: SubscriptionSnapshot) -> int:
+    """Approximate resident bytes: containers, records and their field values."""
+    size = sys.getsizeof(snapshot)
+    for key, value in snapshot.items():
+        size += sys.getsizeof(key) + _estimate_value_size(value)
+    for state in snapshot.states.values():
+        size += sys.getsizeof(state.digests) + sys.getsizeof(state.positions)
+        size += sum(sys.getsizeof(key) for key in state.positions)
+    if snapshot.has_renewal_index:
+        size += snapshot.renewal_index().size_bytes()
+    if snapshot.has_customer_index:
+        size += snapshot.customer_index().size_bytes()
+    return size
+
+
+def _estimate_value_size(value: Any) -> int:
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(_estimate_record_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    return size
+
+
+def _estimate_record_size(record: Any) -> int:
+    size = sys.getsizeof(record)
+    slots = getattr(type(record), "__slots__", None)
+    if slots:
+        for name in slots:
+            field_value = getattr(record, name, None)
+            if field_value is not None:
+                size += _estimate_value_size(field_value)
+    elif isinstance(record, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in record.items())
+    return size
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+# Every record digest has this many bytes, so a resource stores them back to back.
+RECORD_DIGEST_SIZE = 16
+
+
+@dataclass(frozen=True)
+class RecordChanges:
+    """Per-record delta for one snapshot resource, keyed by record id."""
+
+    added: Tuple[str, ...] = ()
+    updated: Tuple[str, ...] = ()
+    removed: Tuple[str, ...] = ()
+    unchanged: int = 0
+
+    @property
+    def changed(self) -> Tuple[str, ...]:
+        return self.added + self.updated + self.removed
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "added": len(self.added),
+            "updated": len(self.updated),
+            "removed": len(self.removed),
+            "unchanged": self.unchanged,
+        }
+
+
+@dataclass(frozen=True)
+class SnapshotChangeSet:
+    """Outcome of applying an ingested snapshot on top of the stored one."""
+
+    content_hash: str
+    skipped: bool = False
+    resources: Dict[str, RecordChanges] = field(default_factory=dict)
+
+    def for_resource(self, resource: str) -> RecordChanges:
+        return self.resources.get(resource) or RecordChanges()
+
+    def as_dict(self) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {
+            "skipped": self.skipped,
+            "content_hash": self.content_hash,
+        }
+        for resource, changes in self.resources.items():
+            summary[resource] = changes.as_dict()
+        return summary
+
+
+@dataclass(frozen=True)
+class ResourceState:
+    """Immutable stored form of one resource: records in order plus their digests by id."""
+
+    records: Tuple[Any, ...] = ()
+    digests: bytes = b""
+    positions: Dict[str, int] = field(default_factory=dict)
+
+    def digest_at(self, position: int) -> bytes:
+        start = position * RECORD_DIGEST_SIZE
+        return self.digests[start : start + RECORD_DIGEST_SIZE]
+
+    def digest_for(self, key: str) -> Optional[bytes]:
+        position = self.positions.get(key)
+        return None if position is None else self.digest_at(position)
+
+    def record_for(self, key: str) -> Any:
+        return self.records[self.positions[key]]
+
+    def keys(self) -> Iterable[str]:
+        return self.positions.keys()
+
+
+@dataclass
+class DiffedRecords:
+    """Records of one resource after diffing, sharing unchanged objects with the previous state."""
+
+    state: ResourceState
+    changes: RecordChanges
+    content_digest: bytes = b""
+
+
+def record_key(record: Any, position: int) -> str:
+    """Records are keyed by their Stripe id; records without one fall back to their position."""
+    if isinstance(record, dict):
+        record_id = record.get("id")
+    else:
+        record_id = getattr(record, "id", None)
+    if record_id is not None:
+        return str(record_id)
+    return f"#{position}"
+
+
+def record_digest(record: Any) -> bytes:
+    encoded = json.dumps(record, sort_keys=True, separators=(",", ":"), default=_encode_value)
+    return hashlib.blake2b(encoded.encode("utf-8"), digest_size=RECORD_DIGEST_SIZE).digest()
+
+
+def _encode_value(value: Any) -> Any:
+    as_dict = getattr(value, "as_dict", None)
+    if callable(as_dict):
+        return as_dict()
+    return str(value)
+
+
+def diff_records(
+    records: Iterable[Any],
+    previous: Optional[ResourceState] = None,
+    content_hash: Optional["hashlib._Hash"] = None,
+) -> DiffedRecords:
+    """Consume `records` once, keep the last record per id, then classify ids against `previous`."""
+    previous = previous or ResourceState()
+
+    merged: List[Any] = []
+    digests: List[bytes] = []
+    positions: Dict[str, int] = {}
+    for index, record in enumerate(records):
+        key = record_key(record, index)
+        digest = record_digest(record)
+        existing = positions.get(key)
+        if existing is None:
+            positions[key] = len(merged)
+            merged.append(record)
+            digests.append(digest)
+        else:
+            merged[existing] = record
+            digests[existing] = digest
+
+    added: List[str] = []
+    updated: List[str] = []
+    unchanged = 0
+    for key, position in positions.items():
+        digest = digests[position]
+        if content_hash is not None:
+            content_hash.update(digest)
+        previous_digest = previous.digest_for(key)
+        if previous_digest is None:
+            added.append(key)
+        elif previous_digest == digest:
+            unchanged += 1
+            if previous.records:
+                merged[position] = previous.record_for(key)
+        else:
+            updated.append(key)
+
+    removed = tuple(key for key in previous.keys() if key not in positions)
+    return DiffedRecords(
+        state=ResourceState(
+            records=tuple(merged),
+            digests=b"".join(digests),
+            positions=positions,
+        ),
+        changes=RecordChanges(
+            added=tuple(added),
+            updated=tuple(updated),
+            removed=removed,
+            unchanged=unchanged,
+        ),
+    )
+
+
+def diff_resources(
+    resources: Mapping[str, Iterable[Any]],
+    previous: Optional[Mapping[str, ResourceState]] = None,
+    concurrent: bool = False,
+    on_failure: Optional[Callable[[], None]] = None,
+) -> Dict[str, DiffedRecords]:
+    """Diff several resources, each with its own content digest."""
+    previous = previous or {}
+
+    def diff_one(resource: str) -> DiffedRecords:
+        resource_hash = hashlib.sha256()
+        diffed = diff_records(
+            resources[resource],
+            previous=previous.get(resource),
+            content_hash=resource_hash,
+        )
+        diffed.content_digest = resource_hash.digest()
+        return diffed
+
+    names = list(resources)
+    if concurrent and len(names) > 1:
+        with ThreadPoolExecutor(
+            max_workers=len(names), thread_name_prefix="snapshot-diff"
+        ) as executor:
+            futures = {name: executor.submit(diff_one, name) for name in names}
+            done, _ = wait(futures.values(), return_when=FIRST_EXCEPTION)
+            failed = next((future for future in done if future.exception() is not None), None)
+            if failed is not None:
+                if on_failure is not None:
+                    on_failure()
+                failed.result()
+            return {name: future.result() for name, future in futures.items()}
+    return {name: diff_one(name) for name in names}
+
+
+def snapshot_content_hash(
+    snapshot: Mapping[str, Any], diffed: Mapping[str, DiffedRecords]
+) -> str:
+    """Hash of the whole snapshot, combining per-resource digests in key order."""
+    content_hash = hashlib.sha256()
+    for key, value in snapshot.items():
+        content_hash.update(key.encode("utf-8"))
+        if key in diffed:
+            content_hash.update(diffed[key].content_digest)
+        else:
+            content_hash.update(record_digest(value))
+    return content_hash.hexdigest()
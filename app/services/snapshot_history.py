@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, FrozenSet, List, Optional, Tuple
+
+from app.services.records import ensure_utc
+from app.services.snapshot_diff import RecordChanges, ResourceState
+from app.services.snapshots import SubscriptionSnapshot
+
+RestoredRecord = Tuple[int, str, Any, bytes]
+
+
+@dataclass(frozen=True)
+class ResourceDelta:
+    """How to rebuild one resource of an older version from the next newer version."""
+
+    dropped: FrozenSet[str] = frozenset()
+    restored: Tuple[RestoredRecord, ...] = ()
+    order: Optional[Tuple[str, ...]] = None
+    full: Optional[ResourceState] = None
+
+    @classmethod
+    def between(cls, older: ResourceState, newer: Optional[ResourceState]) -> "ResourceDelta":
+        if newer is None:
+            return cls(full=older)
+        dropped = frozenset(key for key in newer.keys() if key not in older.positions)
+        restored = tuple(
+            (position, key, older.records[position], older.digest_at(position))
+            for key, position in older.positions.items()
+            if newer.digest_for(key) != older.digest_at(position)
+        )
+        survivors_before = [key for key in older.keys() if key in newer.positions]
+        survivors_after = [key for key in newer.keys() if key in older.positions]
+        order = tuple(older.keys()) if survivors_before != survivors_after else None
+        return cls(dropped=dropped, restored=restored, order=order)
+
+    def apply(self, newer: Optional[ResourceState]) -> ResourceState:
+        if self.full is not None:
+            return self.full
+        newer = newer or ResourceState()
+        replaced = {key: (record, digest) for _, key, record, digest in self.restored}
+
+        if self.order is not None:
+            keys = list(self.order)
+        else:
+            keys = [key for key in newer.keys() if key not in self.dropped]
+            for position, key, _, _ in sorted(self.restored, key=lambda item: item[0]):
+                if key not in newer.positions:
+                    keys.insert(position, key)
+
+        records: List[Any] = []
+        digests: List[bytes] = []
+        for key in keys:
+            if key in replaced:
+                record, digest = replaced[key]
+            else:
+                position = newer.positions[key]
+                record, digest = newer.records[position], newer.digest_at(position)
+            records.append(record)
+            digests.append(digest)
+        return ResourceState(
+            records=tuple(records),
+            digests=b"".join(digests),
+            positions={key: index for index, key in enumerate(keys)},
+        )
+
+
+@dataclass(frozen=True)
+class SnapshotVersionInfo:
+    version: int
+    content_hash: str
+    saved_at: Optional[datetime] = None
+
+    @classmethod
+    def of(cls, snapshot: SubscriptionSnapshot) -> "SnapshotVersionInfo":
+        return cls(snapshot.version, snapshot.content_hash, snapshot.saved_at)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "content_hash": self.content_hash,
+            "saved_at": self.saved_at.isoformat() if self.saved_at else None,
+        }
+
+
+@dataclass(frozen=True)
+class _ReverseDelta:
+    info: SnapshotVersionInfo
+    keys: Tuple[str, ...]
+    values: Dict[str, Any]
+    resources: Dict[str, ResourceDelta] = field(default_factory=dict)
+
+    @classmethod
+    def between(cls, older: SubscriptionSnapshot, newer: SubscriptionSnapshot) -> "_ReverseDelta":
+        return cls(
+            info=SnapshotVersionInfo.of(older),
+            keys=tuple(older),
+            values={key: older[key] for key in older if key not in older.states},
+            resources={
+                resource: ResourceDelta.between(state, newer.states.get(resource))
+                for resource, state in older.states.items()
+            },
+        )
+
+    def apply(self, newer: SubscriptionSnapshot) -> SubscriptionSnapshot:
+        states = {
+            resource: delta.apply(newer.states.get(resource))
+            for resource, delta in self.resources.items()
+        }
+        values = {
+            key: states[key].records if key in states else self.values[key] for key in self.keys
+        }
+        return SubscriptionSnapshot(
+            newer.fingerprint,
+            self.info.version,
+            self.info.content_hash,
+            values,
+            states,
+            self.info.saved_at,
+        )
+
+
+class SnapshotHistory:
+    """Bounded history of one account's snapshot versions, stored as reverse deltas."""
+
+    def __init__(self, max_versions: int = 10) -> None:
+        self._max_versions = max(1, max_versions)
+        self._lock = threading.Lock()
+        self._deltas: Deque[_ReverseDelta] = deque()
+        self._current: Optional[SnapshotVersionInfo] = None
+
+    def record(
+        self, previous: Optional[SubscriptionSnapshot], current: SubscriptionSnapshot
+    ) -> None:
+        """Make `current` the newest version, keeping `previous` as a reverse delta."""
+        with self._lock:
+            if (
+                previous is not None
+                and self._current is not None
+                and previous.version == self._current.version
+            ):
+                self._deltas.appendleft(_ReverseDelta.between(previous, current))
+            else:
+                self._deltas.clear()
+            while len(self._deltas) > self._max_versions - 1:
+                self._deltas.pop()
+            self._current = SnapshotVersionInfo.of(current)
+
+    @property
+    def current_version(self) -> Optional[int]:
+        return None if self._current is None else self._current.version
+
+    def versions(self) -> List[SnapshotVersionInfo]:
+        """Known versions, newest first."""
+        with self._lock:
+            current = [self._current] if self._current is not None else []
+            return current + [delta.info for delta in self._deltas]
+
+    def resolve(
+        self, version: Optional[int] = None, as_of: Optional[datetime] = None
+    ) -> Optional[int]:
+        """The version asked for, or the newest one saved at or before `as_of`."""
+        if as_of is not None:
+            as_of = ensure_utc(as_of)
+        for info in self.versions():
+            if version is not None and info.version != version:
+                continue
+            if as_of is not None and (info.saved_at is None or info.saved_at > as_of):
+                continue
+            return info.version
+        return None
+
+    def reconstruct(
+        self, current: SubscriptionSnapshot, version: int
+    ) -> Optional[SubscriptionSnapshot]:
+        if version == current.version:
+            return current
+        with self._lock:
+            if self._current is None or self._current.version != current.version:
+                return None
+            steps: List[_ReverseDelta] = []
+            for delta in self._deltas:
+                steps.append(delta)
+                if delta.info.version == version:
+                    break
+            else:
+                return None
+        snapshot = current
+        for delta in steps:
+            snapshot = delta.apply(snapshot)
+        return snapshot
+
+
+def diff_snapshots(
+    older: SubscriptionSnapshot, newer: SubscriptionSnapshot
+) -> Dict[str, RecordChanges]:
+    """Per-resource record changes from `older` to `newer`, compared by stored digests."""
+    changes: Dict[str, RecordChanges] = {}
+    for resource in dict.fromkeys([*older.states, *newer.states]):
+        before = older.states.get(resource) or ResourceState()
+        after = newer.states.get(resource) or ResourceState()
+        added: List[str] = []
+        updated: List[str] = []
+        unchanged = 0
+        for key, position in after.positions.items():
+            digest = before.digest_for(key)
+            if digest is None:
+                added.append(key)
+            elif digest == after.digest_at(position):
+                unchanged += 1
+            else:
+                updated.append(key)
+        changes[resource] = RecordChanges(
+            added=tuple(added),
+            updated=tuple(updated),
+            removed=tuple(key for key in before.keys() if key not in after.positions),
+            unchanged=unchanged,
+        )
+    return changes
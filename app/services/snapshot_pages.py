@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from app.services.records import serialize_record
+from app.services.snapshots import SubscriptionSnapshot
+
+NDJSON_BATCH_SIZE = 256
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor is malformed or does not belong to the snapshot."""
+
+
+@dataclass(frozen=True)
+class SnapshotCursor:
+    """Where the next page starts: record `offset` of `resource` in snapshot `version`."""
+
+    version: int
+    resource: str
+    offset: int
+
+    def encode(self) -> str:
+        payload = json.dumps([self.version, self.resource, self.offset], separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "SnapshotCursor":
+        try:
+            payload = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            version, resource, offset = json.loads(payload)
+        except (ValueError, TypeError, binascii.Error) as exc:
+            raise InvalidCursorError("Malformed cursor") from exc
+        if (
+            not isinstance(version, int)
+            or not isinstance(resource, str)
+            or not isinstance(offset, int)
+            or offset < 0
+        ):
+            raise InvalidCursorError("Malformed cursor")
+        return cls(version=version, resource=resource, offset=offset)
+
+
+class PagedVersionCache:
+    """Past versions rebuilt for cursor paging, per `(fingerprint, version)`, until left idle."""
+
+    def __init__(
+        self,
+        max_entries: int = 8,
+        idle_seconds: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._max_entries = max_entries
+        self._idle_seconds = idle_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[float, SubscriptionSnapshot]]" = (
+            OrderedDict()
+        )
+
+    def get_or_build(
+        self,
+        key: Tuple[str, int],
+        build: Callable[[], Optional[SubscriptionSnapshot]],
+    ) -> Optional[SubscriptionSnapshot]:
+        with self._lock:
+            self._expire(self._clock())
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (self._clock(), entry[1])
+                self._entries.move_to_end(key)
+                return entry[1]
+        snapshot = build()
+        if snapshot is None or self._max_entries <= 0:
+            return snapshot
+        with self._lock:
+            self._entries[key] = (self._clock(), snapshot)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expire(self, now: float) -> None:
+        # Entries are kept in read order, so the idle ones are at the front.
+        while self._entries:
+            key, (last_read, _) = next(iter(self._entries.items()))
+            if now - last_read < self._idle_seconds:
+                return
+            del self._entries[key]
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """`"id,current_period_end"` -> `("id", "current_period_end")`; blank means every field."""
+    if fields is None:
+        return None
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    return names or None
+
+
+def snapshot_page(
+    snapshot: SubscriptionSnapshot,
+    limit: int,
+    cursor: Optional[SnapshotCursor] = None,
+    fields: Optional[Sequence[str]] = None,
+) -> Tuple[Dict[str, List[Any]], Optional[str]]:
+    """Up to `limit` records grouped by resource, and the cursor of the next page if any."""
+    records: Dict[str, List[Any]] = {}
+    for resource, offset, record in _records_from(snapshot, cursor):
+        if limit == 0:
+            return records, SnapshotCursor(snapshot.version, resource, offset).encode()
+        records.setdefault(resource, []).append(serialize_record(record, fields))
+        limit -= 1
+    return records, None
+
+
+def iter_ndjson(
+    snapshot: SubscriptionSnapshot,
+    limit: Optional[int] = None,
+    cursor: Optional[SnapshotCursor] = None,
+    fields: Optional[Sequence[str]] = None,
+    batch_size: int = NDJSON_BATCH_SIZE,
+) -> Iterator[bytes]:
+    """One `{"resource": ..., "record": ...}` line per record, plus `next_cursor` if cut."""
+    records = _records_from(snapshot, cursor)
+
+    def lines() -> Iterator[bytes]:
+        remaining = limit
+        batch: List[str] = []
+        for resource, offset, record in records:
+            if remaining == 0:
+                next_cursor = SnapshotCursor(snapshot.version, resource, offset).encode()
+                batch.append(json.dumps({"next_cursor": next_cursor}))
+                break
+            batch.append(
+                json.dumps({"resource": resource, "record": serialize_record(record, fields)})
+            )
+            if remaining is not None:
+                remaining -= 1
+            if len(batch) >= batch_size:
+                yield _ndjson_chunk(batch)
+                batch = []
+        if batch:
+            yield _ndjson_chunk(batch)
+
+    return lines()
+
+
+def _records_from(
+    snapshot: Mapping[str, Any], cursor: Optional[SnapshotCursor]
+) -> Iterator[Tuple[str, int, Any]]:
+    resources = [key for key, value in snapshot.items() if isinstance(value, (list, tuple))]
+    start, offset = 0, 0
+    if cursor is not None:
+        if cursor.resource not in resources:
+            raise InvalidCursorError("Cursor does not match this snapshot")
+        start, offset = resources.index(cursor.resource), cursor.offset
+
+    def walk() -> Iterator[Tuple[str, int, Any]]:
+        first = offset
+        for resource in resources[start:]:
+            values = snapshot[resource]
+            for index in range(first, len(values)):
+                yield resource, index, values[index]
+            first = 0
+
+    return walk()
+
+
+def _ndjson_chunk(lines: List[str]) -> bytes:
+    return ("\n".join(lines) + "\n").encode("utf-8")
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+from app.services.customer_index import CustomerIndex
+from app.services.renewal_index import RenewalIndex
+from app.services.snapshot_diff import ResourceState
+
+
+class SubscriptionSnapshot(Mapping):
+    """Immutable, versioned view of one account's stored snapshot."""
+
+    __slots__ = (
+        "fingerprint",
+        "version",
+        "content_hash",
+        "saved_at",
+        "_values",
+        "_states",
+        "_renewal_index",
+        "_customer_index",
+    )
+
+    def __init__(
+        self,
+        fingerprint: str,
+        version: int,
+        content_hash: str,
+        values: Mapping[str, Any],
+        states: Optional[Mapping[str, ResourceState]] = None,
+        saved_at: Optional[datetime] = None,
+    ) -> None:
+        self.fingerprint = fingerprint
+        self.version = version
+        self.content_hash = content_hash
+        self.saved_at = saved_at
+        self._values: Mapping[str, Any] = MappingProxyType(dict(values))
+        self._states: Mapping[str, ResourceState] = MappingProxyType(dict(states or {}))
+        self._renewal_index: Optional[RenewalIndex] = None
+        self._customer_index: Optional[CustomerIndex] = None
+
+    @classmethod
+    def from_states(
+        cls,
+        fingerprint: str,
+        version: int,
+        content_hash: str,
+        snapshot: Mapping[str, Any],
+        states: Mapping[str, ResourceState],
+        saved_at: Optional[datetime] = None,
+    ) -> "SubscriptionSnapshot":
+        """Build a snapshot whose record resources point straight at the diffed states."""
+        values: Dict[str, Any] = {
+            key: states[key].records if key in states else value
+            for key, value in snapshot.items()
+        }
+        return cls(fingerprint, version, content_hash, values, states, saved_at)
+
+    def as_version(self, version: int) -> "SubscriptionSnapshot":
+        """The same records and content hash saved under another version number."""
+        return SubscriptionSnapshot(
+            self.fingerprint,
+            version,
+            self.content_hash,
+            self._values,
+            self._states,
+            self.saved_at,
+        )
+
+    def __reduce__(self) -> Any:
+        return (
+            SubscriptionSnapshot,
+            (
+                self.fingerprint,
+                self.version,
+                self.content_hash,
+                dict(self._values),
+                dict(self._states),
+                self.saved_at,
+            ),
+        )
+
+    @property
+    def states(self) -> Mapping[str, ResourceState]:
+        return self._states
+
+    @property
+    def has_renewal_index(self) -> bool:
+        return self._renewal_index is not None
+
+    def adopt_renewal_index(self, index: RenewalIndex) -> None:
+        """Install an index rebuilt from saved arrays, such as a decompressed cache entry's."""
+        if self._renewal_index is None:
+            self._renewal_index = index
+
+    def renewal_index(self) -> RenewalIndex:
+        """Subscriptions sorted by period end, built once per version and never pickled."""
+        index = self._renewal_index
+        if index is None:
+            index = self._renewal_index = RenewalIndex.build(self._values.get("subscriptions", ()))
+        return index
+
+    @property
+    def has_customer_index(self) -> bool:
+        return self._customer_index is not None
+
+    def customer_index(self) -> CustomerIndex:
+        """Customers keyed by id, built once per version and never pickled."""
+        index = self._customer_index
+        if index is None:
+            index = self._customer_index = CustomerIndex.build(self._values.get("customers", ()))
+        return index
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __repr__(self) -> str:
+        sizes = ", ".join(
+            f"{key}={len(value)}" if isinstance(value, tuple) else key
+            for key, value in self._values.items()
+        )
+        return (
+            f"SubscriptionSnapshot(fingerprint={self.fingerprint[:12]!r}, "
+            f"version={self.version}, {sizes})"
+        )
@@ -0,0 +1,794 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from app.services.columnar import ColumnarSnapshotStore
+from app.services.ingest_jobs import (
+    JOB_FAILED,
+    JOB_STATES_ACTIVE,
+    IngestBatch,
+    IngestJob,
+    RecordedProgress,
+)
+from app.services.ingestion import (
+    RenewalWindow,
+    StoredStripeCredential,
+    StripeCredentialRepository,
+    StripeSubscriptionSnapshotRepository,
+)
+from app.services.records import CustomerRecord, SubscriptionRecord
+from app.services.slack import SlackWebhookRepository, StoredSlackWebhook
+from app.services.snapshot_diff import ResourceState
+from app.services.snapshots import SubscriptionSnapshot
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stripe_credentials (
+    fingerprint TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    last_ingested_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS slack_webhooks (
+    fingerprint TEXT PRIMARY KEY,
+    webhook_url TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    last_configured_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS snapshots (
+    fingerprint TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    layout TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS snapshot_records (
+    fingerprint TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    record_key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    digest BLOB NOT NULL,
+    kind TEXT NOT NULL,
+    id TEXT,
+    status TEXT,
+    current_period_end REAL,
+    amount_due REAL,
+    payload TEXT,
+    customer TEXT,
+    PRIMARY KEY (fingerprint, resource, record_key)
+) WITHOUT ROWID;
+
+-- Bumped by every write transaction, so a process can tell its own commits from others'.
+CREATE TABLE IF NOT EXISTS commit_sequence (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    sequence INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO commit_sequence (id, sequence) VALUES (1, 0);
+
+-- Renewal windows of accounts that are not loaded are range scans over this index.
+CREATE INDEX IF NOT EXISTS snapshot_records_by_period_end
+    ON snapshot_records (fingerprint, resource, current_period_end);
+
+-- Ingest jobs and batches, so every pre-forked server process can report them.
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    state TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    owner_pid INTEGER NOT NULL,
+    queued_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    coalesced_requests INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ingest_jobs_by_fingerprint ON ingest_jobs (fingerprint, state);
+
+CREATE TABLE IF NOT EXISTS ingest_batches (
+    id TEXT PRIMARY KEY,
+    queued_at TEXT NOT NULL,
+    job_ids TEXT NOT NULL
+);
+"""
+
+# Reported for a job whose process died before finishing it.
+ORPHANED_JOB_ERROR = "worker process exited"
+_JOB_COLUMNS = (
+    "id, fingerprint, state, owner_pid, queued_at, started_at, finished_at, "
+    "progress, result, error, coalesced_requests"
+)
+
+RECORD_KIND_SUBSCRIPTION = "subscription"
+RECORD_KIND_JSON = "json"
+
+# The columns `_decode_record` takes, in order, and the full stored row around them.
+_DECODED_COLUMNS = "kind, id, status, current_period_end, amount_due, payload, customer"
+_RECORD_COLUMNS = f"record_key, position, digest, {_DECODED_COLUMNS}"
+
+# Columns added after the first release, created on databases that predate them.
+_ADDED_COLUMNS = {"snapshot_records": (("customer", "TEXT"),)}
+
+
+class SQLiteDatabase:
+    """Shared SQLite file opened in WAL mode, with one connection per thread."""
+
+    def __init__(self, path: str, busy_timeout: float = 5.0) -> None:
+        self.path = path
+        self._busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            self.connection().executescript(SCHEMA)
+            self._add_missing_columns()
+        self._sequence_lock = threading.Lock()
+        self._seen_sequence = self._commit_sequence(self.connection())
+
+    def _add_missing_columns(self) -> None:
+        connection = self.connection()
+        for table, columns in _ADDED_COLUMNS.items():
+            existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+            for name, declaration in columns:
+                if name not in existing:
+                    connection.execute(f"ALTER TABLE {table} ADD COLUMN {name} {declaration}")
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        connection = self.connection()
+        with self._write_lock:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+                sequence = self._commit_sequence(connection)
+                connection.execute("UPDATE commit_sequence SET sequence = ?", (sequence + 1,))
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        with self._sequence_lock:
+            if self._seen_sequence == sequence:
+                # Nothing from another process landed in between.
+                self._seen_sequence = sequence + 1
+
+    @contextmanager
+    def read_transaction(self) -> Iterator[sqlite3.Connection]:
+        """Several reads that all see the same committed state."""
+        connection = self.connection()
+        connection.execute("BEGIN")
+        try:
+            yield connection
+        finally:
+            connection.execute("COMMIT")
+
+    def changed_since_last_check(self) -> bool:
+        """Whether another process committed since this process last asked."""
+        connection = self.connection()
+        (data_version,) = connection.execute("PRAGMA data_version").fetchone()
+        if getattr(self._local, "data_version", None) == data_version:
+            return False
+        self._local.data_version = data_version
+        sequence = self._commit_sequence(connection)
+        with self._sequence_lock:
+            if sequence <= self._seen_sequence:
+                return False
+            self._seen_sequence = sequence
+        return True
+
+    @staticmethod
+    def _commit_sequence(connection: sqlite3.Connection) -> int:
+        (sequence,) = connection.execute("SELECT sequence FROM commit_sequence").fetchone()
+        return sequence
+
+    def close(self) -> None:
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+
+class SQLiteStripeCredentialRepository(StripeCredentialRepository):
+    """Stripe credential fingerprints persisted in SQLite."""
+
+    def __init__(
+        self, database: SQLiteDatabase, clock: Optional[Callable[[], datetime]] = None
+    ) -> None:
+        super().__init__(clock=clock)
+        self._database = database
+
+    def save_stripe_secret_key(self, stripe_secret_key: str) -> None:
+        now = self._clock().isoformat()
+        with self._database.transaction() as connection:
+            connection.execute(
+                "INSERT INTO stripe_credentials (fingerprint, created_at, last_ingested_at) "
+                "VALUES (?, ?, ?) "
+                "ON CONFLICT (fingerprint) DO UPDATE SET "
+                "last_ingested_at = excluded.last_ingested_at",
+                (self._fingerprint(stripe_secret_key), now, now),
+            )
+
+    def list_credentials(self) -> List[StoredStripeCredential]:
+        rows = self._database.connection().execute(
+            "SELECT fingerprint, created_at, last_ingested_at FROM stripe_credentials "
+            "ORDER BY rowid"
+        )
+        return [
+            StoredStripeCredential(
+                stripe_secret_key=fingerprint,
+                created_at=_parse_timestamp(created_at),
+                last_ingested_at=_parse_timestamp(last_ingested_at),
+            )
+            for fingerprint, created_at, last_ingested_at in rows
+        ]
+
+
+class SQLiteSlackWebhookRepository(SlackWebhookRepository):
+    """Slack webhooks persisted in SQLite, keyed by Stripe credential fingerprint."""
+
+    def __init__(
+        self, database: SQLiteDatabase, clock: Optional[Callable[[], datetime]] = None
+    ) -> None:
+        super().__init__(clock=clock)
+        self._database = database
+
+    def configure_webhook(self, stripe_secret_key: str, webhook_url: str) -> None:
+        now = self._clock().isoformat()
+        with self._database.transaction() as connection:
+            connection.execute(
+                "INSERT INTO slack_webhooks "
+                "(fingerprint, webhook_url, created_at, last_configured_at) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (fingerprint) DO UPDATE SET "
+                "webhook_url = excluded.webhook_url, "
+                "last_configured_at = excluded.last_configured_at",
+                (
+                    StripeCredentialRepository._fingerprint(stripe_secret_key),
+                    webhook_url,
+                    now,
+                    now,
+                ),
+            )
+
+    def get_webhook(self, stripe_secret_key: str) -> Optional[StoredSlackWebhook]:
+        row = self._database.connection().execute(
+            "SELECT fingerprint, webhook_url, created_at, last_configured_at "
+            "FROM slack_webhooks WHERE fingerprint = ?",
+            (StripeCredentialRepository._fingerprint(stripe_secret_key),),
+        ).fetchone()
+        return None if row is None else _webhook_from_row(row)
+
+    def list_webhooks(self) -> List[StoredSlackWebhook]:
+        rows = self._database.connection().execute(
+            "SELECT fingerprint, webhook_url, created_at, last_configured_at "
+            "FROM slack_webhooks ORDER BY rowid"
+        )
+        return [_webhook_from_row(row) for row in rows]
+
+
+class SQLiteSubscriptionSnapshotRepository(StripeSubscriptionSnapshotRepository):
+    """Snapshots persisted in SQLite with one row per record, shared by worker processes."""
+
+    def __init__(
+        self,
+        database: SQLiteDatabase,
+        keep_raw_payloads: bool = False,
+        columnar_store: Optional[ColumnarSnapshotStore] = None,
+        memory_budget_bytes: Optional[int] = None,
+    ) -> None:
+        super().__init__(
+            keep_raw_payloads=keep_raw_payloads,
+            columnar_store=columnar_store,
+            memory_budget_bytes=memory_budget_bytes,
+        )
+        self._database = database
+        self._load_lock = threading.Lock()
+
+    def warm(self) -> int:
+        """Load every stored account into memory, e.g. before forking workers; returns the count."""
+        return len(self.list_snapshots())
+
+    def _current(self, fingerprint: str) -> Optional[SubscriptionSnapshot]:
+        self._adopt_external_writes()
+        snapshot = self._snapshots.get(fingerprint)
+        if snapshot is not None:
+            return snapshot
+        with self._load_lock:
+            snapshot = self._snapshots.get(fingerprint)
+            if snapshot is None:
+                snapshot = self._load(fingerprint)
+                if snapshot is not None:
+                    self._snapshots.put(fingerprint, snapshot)
+        return snapshot
+
+    def _current_version(self, fingerprint: str) -> Optional[int]:
+        self._adopt_external_writes()
+        version = super()._current_version(fingerprint)
+        if version is not None:
+            return version
+        row = self._database.connection().execute(
+            "SELECT version FROM snapshots WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _store(
+        self, snapshot: SubscriptionSnapshot, previous: Optional[SubscriptionSnapshot]
+    ) -> Tuple[SubscriptionSnapshot, Optional[SubscriptionSnapshot]]:
+        fingerprint = snapshot.fingerprint
+        with self._database.transaction() as connection:
+            row = connection.execute(
+                "SELECT version FROM snapshots WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+            stored_version = None if row is None else row[0]
+            if stored_version != (previous.version if previous is not None else None):
+                # Another process saved this account after `previous` was read: write the
+                # delta against what is actually stored, as the version after it.
+                previous = self._load(fingerprint)
+                snapshot = snapshot.as_version(previous.version + 1 if previous is not None else 1)
+            self._write_delta(connection, snapshot, previous)
+        self._install(snapshot)
+        return snapshot, previous
+
+    def _write_delta(
+        self,
+        connection: sqlite3.Connection,
+        snapshot: SubscriptionSnapshot,
+        previous: Optional[SubscriptionSnapshot],
+    ) -> None:
+        previous_states = previous.states if previous is not None else {}
+        upserts: List[Tuple[Any, ...]] = []
+        deletes: List[Tuple[str, str, str]] = []
+        fingerprint = snapshot.fingerprint
+
+        for resource, state in snapshot.states.items():
+            before = previous_states.get(resource) or ResourceState()
+            for key, position in state.positions.items():
+                digest = state.digest_at(position)
+                if before.positions.get(key) == position and before.digest_for(key) == digest:
+                    continue
+                upserts.append(
+                    (fingerprint, resource, key, position, digest)
+                    + _encode_record(state.records[position])
+                )
+            deletes.extend(
+                (fingerprint, resource, key) for key in before.keys() if key not in state.positions
+            )
+        for resource, before in previous_states.items():
+            if resource not in snapshot.states:
+                deletes.extend((fingerprint, resource, key) for key in before.keys())
+
+        layout = {
+            "saved_at": snapshot.saved_at.isoformat() if snapshot.saved_at else None,
+            "counts": {
+                resource: len(state.positions) for resource, state in snapshot.states.items()
+            },
+            "keys": list(snapshot),
+            "values": {
+                key: value for key, value in snapshot.items() if key not in snapshot.states
+            },
+        }
+        connection.executemany(
+            "DELETE FROM snapshot_records "
+            "WHERE fingerprint = ? AND resource = ? AND record_key = ?",
+            deletes,
+        )
+        connection.executemany(
+            f"INSERT OR REPLACE INTO snapshot_records "
+            f"(fingerprint, resource, {_RECORD_COLUMNS}) "
+            f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            upserts,
+        )
+        connection.execute(
+            "INSERT OR REPLACE INTO snapshots (fingerprint, version, content_hash, layout) "
+            "VALUES (?, ?, ?, ?)",
+            (
+                fingerprint,
+                snapshot.version,
+                snapshot.content_hash,
+                json.dumps(layout, default=str),
+            ),
+        )
+
+    def _adopt_external_writes(self) -> None:
+        """Replace cached snapshots that another process has since saved a newer version of."""
+        if not self._database.changed_since_last_check():
+            return
+        stored_versions = dict(
+            self._database.connection().execute("SELECT fingerprint, version FROM snapshots")
+        )
+        for fingerprint in self._snapshots.fingerprints():
+            stored_version = stored_versions.get(fingerprint)
+            if stored_version is None or stored_version == self._snapshots.version_of(fingerprint):
+                continue
+            with self._versions_lock:
+                cached_version = self._snapshots.version_of(fingerprint)
+                if cached_version is not None and cached_version >= stored_version:
+                    continue
+                previous = self._snapshots.get(fingerprint)
+                loaded = self._load(fingerprint)
+                if loaded is None:
+                    continue
+                self._snapshots.put(fingerprint, loaded)
+                self._record_version(previous, loaded)
+
+    def _load(self, fingerprint: str) -> Optional[SubscriptionSnapshot]:
+        connection = self._database.connection()
+        row = connection.execute(
+            "SELECT version, content_hash, layout FROM snapshots WHERE fingerprint = ?",
+            (fingerprint,),
+        ).fetchone()
+        if row is None:
+            return None
+        version, content_hash, layout_json = row
+        layout = json.loads(layout_json)
+
+        grouped: Dict[str, Tuple[List[Any], List[bytes], Dict[str, int]]] = {}
+        for resource, key, _, digest, *columns in connection.execute(
+            f"SELECT resource, {_RECORD_COLUMNS} FROM snapshot_records "
+            f"WHERE fingerprint = ? ORDER BY resource, position",
+            (fingerprint,),
+        ):
+            records, digests, positions = grouped.setdefault(resource, ([], [], {}))
+            positions[key] = len(records)
+            records.append(_decode_record(*columns))
+            digests.append(digest)
+
+        states = {
+            resource: ResourceState(
+                records=tuple(grouped[resource][0]),
+                digests=b"".join(grouped[resource][1]),
+                positions=grouped[resource][2],
+            )
+            if resource in grouped
+            else ResourceState()
+            for resource in layout["keys"]
+            if resource not in layout["values"]
+        }
+        values = {
+            key: states[key].records if key in states else layout["values"][key]
+            for key in layout["keys"]
+        }
+        saved_at = layout.get("saved_at")
+        return SubscriptionSnapshot(
+            fingerprint,
+            version,
+            content_hash,
+            values,
+            states,
+            _parse_timestamp(saved_at) if saved_at else None,
+        )
+
+    def list_snapshots(self) -> Dict[str, SubscriptionSnapshot]:
+        snapshots: Dict[str, SubscriptionSnapshot] = {}
+        for fingerprint in self._stored_fingerprints():
+            snapshot = self._current(fingerprint)
+            if snapshot is not None:
+                snapshots[fingerprint] = snapshot
+        return snapshots
+
+    def iter_stored_snapshots(self) -> Iterator[Union[SubscriptionSnapshot, bytes]]:
+        self._adopt_external_writes()
+        for fingerprint in self._stored_fingerprints():
+            stored = self._snapshots.peek_stored(fingerprint) or self._current(fingerprint)
+            if stored is not None:
+                yield stored
+
+    def subscriptions_renewing_between(
+        self, stripe_secret_key: str, start: float, end: float
+    ) -> Sequence[SubscriptionRecord]:
+        """Bisect the in-memory index when the account is loaded, else an index range scan."""
+        window = self.renewal_window(stripe_secret_key, start, end)
+        if window is None:
+            return super().subscriptions_renewing_between(stripe_secret_key, start, end)
+        return window.subscriptions
+
+    def renewal_window(
+        self, stripe_secret_key: str, start: float, end: float
+    ) -> Optional[RenewalWindow]:
+        fingerprint = StripeCredentialRepository._fingerprint(stripe_secret_key)
+        self._adopt_external_writes()
+        if fingerprint in self._snapshots:
+            return None
+        with self._database.read_transaction() as connection:
+            row = connection.execute(
+                "SELECT version, layout FROM snapshots WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+            if row is None:
+                return None
+            version, layout_json = row
+            counts = self._record_counts(connection, fingerprint, json.loads(layout_json))
+            rows = connection.execute(
+                f"SELECT {_DECODED_COLUMNS} FROM snapshot_records "
+                "WHERE fingerprint = ? AND resource = 'subscriptions' "
+                "AND current_period_end BETWEEN ? AND ? "
+                "ORDER BY position",
+                (fingerprint, start, end),
+            )
+            subscriptions = tuple(_decode_record(*columns) for columns in rows)
+        return RenewalWindow(
+            version=version,
+            subscription_count=counts.get("subscriptions", 0),
+            customer_count=counts.get("customers", 0),
+            subscriptions=subscriptions,
+        )
+
+    def get_customer(
+        self, stripe_secret_key: str, customer_id: str
+    ) -> Optional[CustomerRecord]:
+        """From the customer index when the account is loaded, else one primary-key lookup."""
+        fingerprint = StripeCredentialRepository._fingerprint(stripe_secret_key)
+        if fingerprint in self._snapshots:
+            return super().get_customer(stripe_secret_key, customer_id)
+        row = self._database.connection().execute(
+            f"SELECT {_DECODED_COLUMNS} FROM snapshot_records "
+            "WHERE fingerprint = ? AND resource = 'customers' AND record_key = ?",
+            (fingerprint, customer_id),
+        ).fetchone()
+        customer = None if row is None else _decode_record(*row)
+        if isinstance(customer, dict):
+            return CustomerRecord.from_stripe(customer)
+        return customer if isinstance(customer, CustomerRecord) else None
+
+    @staticmethod
+    def _record_counts(
+        connection: sqlite3.Connection, fingerprint: str, layout: Mapping[str, Any]
+    ) -> Dict[str, int]:
+        counts = layout.get("counts")
+        if counts is not None:
+            return counts
+        # Written before layouts carried their counts.
+        return dict(
+            connection.execute(
+                "SELECT resource, COUNT(*) FROM snapshot_records "
+                "WHERE fingerprint = ? GROUP BY resource",
+                (fingerprint,),
+            )
+        )
+
+    def _stored_fingerprints(self) -> List[str]:
+        return [
+            fingerprint
+            for (fingerprint,) in self._database.connection().execute(
+                "SELECT fingerprint FROM snapshots ORDER BY rowid"
+            )
+        ]
+
+
+class SQLiteIngestJobStore:
+    """Ingest job and batch state shared by every server process through SQLite."""
+
+    def __init__(self, database: SQLiteDatabase) -> None:
+        self._database = database
+
+    def claim_job(self, job: IngestJob, owner: str) -> Optional[IngestJob]:
+        placeholders = ", ".join("?" for _ in JOB_STATES_ACTIVE)
+        with self._database.transaction() as connection:
+            rows = connection.execute(
+                f"SELECT {_JOB_COLUMNS} FROM ingest_jobs "
+                f"WHERE fingerprint = ? AND state IN ({placeholders})",
+                (job.stripe_credential_fingerprint, *JOB_STATES_ACTIVE),
+            ).fetchall()
+            for row in rows:
+                active = _job_from_row(row)
+                if active.state == JOB_FAILED:
+                    # Its process died; record that instead of waiting on it forever.
+                    connection.execute(
+                        "UPDATE ingest_jobs SET state = ?, error = ? WHERE id = ?",
+                        (active.state, active.error, active.id),
+                    )
+                    continue
+                connection.execute(
+                    "UPDATE ingest_jobs SET coalesced_requests = coalesced_requests + 1 "
+                    "WHERE id = ?",
+                    (active.id,),
+                )
+                active.coalesced_requests += 1
+                return active
+            connection.execute(
+                "INSERT INTO ingest_jobs "
+                "(id, fingerprint, state, owner, owner_pid, queued_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    job.id,
+                    job.stripe_credential_fingerprint,
+                    job.state,
+                    owner,
+                    os.getpid(),
+                    job.queued_at.isoformat(),
+                ),
+            )
+        return None
+
+    def update_job(self, job: IngestJob) -> None:
+        with self._database.transaction() as connection:
+            connection.execute(
+                "UPDATE ingest_jobs SET state = ?, started_at = ?, finished_at = ?, "
+                "progress = ?, result = ?, error = ? WHERE id = ?",
+                (
+                    job.state,
+                    job.started_at.isoformat() if job.started_at else None,
+                    job.finished_at.isoformat() if job.finished_at else None,
+                    json.dumps(job.progress.as_dict()),
+                    None if job.result is None else json.dumps(job.result),
+                    job.error,
+                    job.id,
+                ),
+            )
+
+    def load_job(self, job_id: str) -> Optional[IngestJob]:
+        row = self._database.connection().execute(
+            f"SELECT {_JOB_COLUMNS} FROM ingest_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return None if row is None else _job_from_row(row)
+
+    def add_coalesced_request(self, job_id: str) -> None:
+        with self._database.transaction() as connection:
+            connection.execute(
+                "UPDATE ingest_jobs SET coalesced_requests = coalesced_requests + 1 "
+                "WHERE id = ?",
+                (job_id,),
+            )
+
+    def save_batch(self, batch: IngestBatch) -> None:
+        with self._database.transaction() as connection:
+            connection.execute(
+                "INSERT INTO ingest_batches (id, queued_at, job_ids) VALUES (?, ?, ?)",
+                (batch.id, batch.queued_at.isoformat(), json.dumps([job.id for job in batch.jobs])),
+            )
+
+    def load_batch(self, batch_id: str) -> Optional[Tuple[datetime, List[str]]]:
+        row = self._database.connection().execute(
+            "SELECT queued_at, job_ids FROM ingest_batches WHERE id = ?", (batch_id,)
+        ).fetchone()
+        return None if row is None else (_parse_timestamp(row[0]), json.loads(row[1]))
+
+    def prune(self, max_finished_jobs: int, max_batches: int) -> None:
+        placeholders = ", ".join("?" for _ in JOB_STATES_ACTIVE)
+        with self._database.transaction() as connection:
+            connection.execute(
+                "DELETE FROM ingest_jobs WHERE id IN ("
+                f"SELECT id FROM ingest_jobs WHERE state NOT IN ({placeholders}) "
+                "ORDER BY finished_at DESC LIMIT -1 OFFSET ?)",
+                (*JOB_STATES_ACTIVE, max_finished_jobs),
+            )
+            connection.execute(
+                "DELETE FROM ingest_batches WHERE rowid IN ("
+                "SELECT rowid FROM ingest_batches ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+                (max_batches,),
+            )
+
+
+def _job_from_row(row: Tuple[Any, ...]) -> IngestJob:
+    (
+        job_id,
+        fingerprint,
+        state,
+        owner_pid,
+        queued_at,
+        started_at,
+        finished_at,
+        progress,
+        result,
+        error,
+        coalesced_requests,
+    ) = row
+    job = IngestJob(
+        id=job_id,
+        stripe_credential_fingerprint=fingerprint,
+        queued_at=_parse_timestamp(queued_at),
+        state=state,
+        progress=RecordedProgress(json.loads(progress) if progress else {}),
+        started_at=_parse_timestamp(started_at) if started_at else None,
+        finished_at=_parse_timestamp(finished_at) if finished_at else None,
+        result=json.loads(result) if result else None,
+        error=error,
+        coalesced_requests=coalesced_requests,
+    )
+    if not job.is_finished and not _process_alive(owner_pid):
+        job.state = JOB_FAILED
+        job.error = ORPHANED_JOB_ERROR
+    if job.is_finished:
+        job.done.set()
+    return job
+
+
+def _process_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _encode_record(record: Any) -> Tuple[Any, ...]:
+    """Row columns `(kind, id, status, current_period_end, amount_due, payload, customer)`."""
+    if isinstance(record, SubscriptionRecord):
+        return (
+            RECORD_KIND_SUBSCRIPTION,
+            record.id,
+            record.status,
+            record.current_period_end,
+            record.amount_due,
+            None if record.raw is None else json.dumps(record.raw, default=str),
+            record.customer,
+        )
+    return (RECORD_KIND_JSON, None, None, None, None, json.dumps(record, default=str), None)
+
+
+def _decode_record(
+    kind: str,
+    record_id: Optional[str],
+    status: Optional[str],
+    current_period_end: Optional[float],
+    amount_due: Optional[float],
+    payload: Optional[str],
+    customer: Optional[str] = None,
+) -> Any:
+    if kind == RECORD_KIND_SUBSCRIPTION:
+        if current_period_end is not None and float(current_period_end).is_integer():
+            current_period_end = int(current_period_end)
+        return SubscriptionRecord(
+            id=record_id,
+            status=status,
+            current_period_end=current_period_end,
+            amount_due=amount_due,
+            raw=None if payload is None else json.loads(payload),
+            customer=customer,
+        )
+    return json.loads(payload) if payload is not None else None
+
+
+def _webhook_from_row(row: Tuple[str, str, str, str]) -> StoredSlackWebhook:
+    fingerprint, webhook_url, created_at, last_configured_at = row
+    return StoredSlackWebhook(
+        stripe_credential_fingerprint=fingerprint,
+        webhook_url=webhook_url,
+        created_at=_parse_timestamp(created_at),
+        last_configured_at=_parse_timestamp(last_configured_at),
+    )
+
+
+def _parse_timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
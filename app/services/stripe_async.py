@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+)
+
+import httpx
+
+from app.services.ingestion import (
+    STRIPE_API_BASE_URL,
+    FetchStats,
+    PagedRecordStream,
+    fetch_page_with_retries,
+    next_starting_after,
+    stripe_auth_headers,
+    stripe_list_params,
+)
+from app.services.retry import RetryPolicy
+
+if TYPE_CHECKING:
+    from app.services.rate_limit import StripeRateLimiter
+
+SNAPSHOT_RESOURCES = ("customers", "subscriptions")
+
+
+class AsyncStripeAPIClient:
+    """Stripe list client built on one long-lived `httpx.AsyncClient` connection pool."""
+
+    def __init__(
+        self,
+        base_url: str = STRIPE_API_BASE_URL,
+        page_size: int = 100,
+        timeout: float = 10.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        max_buffered_pages: int = 32,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        rate_limiter: Optional["StripeRateLimiter"] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+    ) -> None:
+        self._base_url = base_url.rstrip("/")
+        self._page_size = page_size
+        self._timeout = timeout
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._max_buffered_pages = max_buffered_pages
+        self._transport = transport
+        self._rate_limiter = rate_limiter
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._lock = threading.Lock()
+        self._event_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def http_client(self) -> Optional[httpx.AsyncClient]:
+        """The shared pooled client, or None until the first request is made."""
+        return self._client
+
+    async def iter_pages(
+        self,
+        stripe_secret_key: str,
+        resource: str,
+        stats: Optional[FetchStats] = None,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        stats = stats or FetchStats()
+        starting_after: Optional[str] = None
+        while True:
+            payload = await self._fetch_page(stripe_secret_key, resource, starting_after, stats)
+            records = payload.get("data") or []
+            if records:
+                yield records
+            starting_after = next_starting_after(payload)
+            if starting_after is None:
+                return
+
+    def fetch_customer_and_subscription_data(
+        self, stripe_secret_key: str
+    ) -> Dict[str, PagedRecordStream]:
+        """Start both listings at once and expose them as blocking record streams."""
+        loop = self._loop()
+        streams: Dict[str, PagedRecordStream] = {}
+        for resource in SNAPSHOT_RESOURCES:
+            stats = FetchStats()
+            feed = _PageFeed(
+                loop,
+                self.iter_pages(stripe_secret_key, resource, stats),
+                self._max_buffered_pages,
+            )
+            streams[resource] = PagedRecordStream(feed, fetch_stats=stats)
+        return streams
+
+    def close(self) -> None:
+        """Close the pool and stop the loop thread; the next request starts them again."""
+        with self._lock:
+            loop, thread, client = self._event_loop, self._loop_thread, self._client
+            self._event_loop = self._loop_thread = self._client = None
+        if loop is None:
+            return
+        if client is not None:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join()
+        loop.close()
+
+    async def _fetch_page(
+        self,
+        stripe_secret_key: str,
+        resource: str,
+        starting_after: Optional[str],
+        stats: FetchStats,
+    ) -> Dict[str, Any]:
+        client = self._http_client()
+        rate_limiter = self._rate_limiter
+
+        def send() -> Awaitable[httpx.Response]:
+            return client.get(
+                f"{self._base_url}/v1/{resource}",
+                params=stripe_list_params(self._page_size, starting_after),
+                headers=stripe_auth_headers(stripe_secret_key),
+            )
+
+        def acquire() -> Awaitable[float]:
+            return rate_limiter.acquire_async(stripe_secret_key)
+
+        return await fetch_page_with_retries(
+            resource,
+            send,
+            asyncio.sleep,
+            acquire if rate_limiter is not None else None,
+            self._retry_policy,
+            stats,
+        )
+
+    def _http_client(self) -> httpx.AsyncClient:
+        # Only ever called on the loop thread, so creation needs no extra locking.
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=self._limits,
+                timeout=self._timeout,
+                transport=self._transport,
+            )
+        return self._client
+
+    def _loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._event_loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever,
+                    name="stripe-async-client",
+                    daemon=True,
+                )
+                thread.start()
+                self._event_loop, self._loop_thread = loop, thread
+            return self._event_loop
+
+
+class _FeedFailure:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+_FEED_END = object()
+
+
+class _PageFeed(Iterator[List[Dict[str, Any]]]):
+    """Pumps pages from an async generator on the client loop into a bounded queue."""
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        pages: AsyncGenerator[List[Dict[str, Any]], None],
+        max_buffered_pages: int,
+    ) -> None:
+        self._loop = loop
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max_buffered_pages)
+        self._finished = False
+        self._pending: Optional[concurrent.futures.Future] = None
+        self._task = asyncio.run_coroutine_threadsafe(self._pump(pages), loop)
+
+    async def _pump(self, pages: AsyncGenerator[List[Dict[str, Any]], None]) -> None:
+        try:
+            async for page in pages:
+                await self._queue.put(page)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            await self._queue.put(_FeedFailure(exc))
+        else:
+            await self._queue.put(_FEED_END)
+        finally:
+            await pages.aclose()
+
+    def __next__(self) -> List[Dict[str, Any]]:
+        if self._finished:
+            raise StopIteration
+        pending = self._pending = asyncio.run_coroutine_threadsafe(
+            self._queue.get(), self._loop
+        )
+        if self._finished:
+            pending.cancel()
+        try:
+            item = pending.result()
+        except concurrent.futures.CancelledError:
+            # Closed from another thread while waiting for the next page.
+            raise StopIteration
+        if item is _FEED_END:
+            self._finished = True
+            raise StopIteration
+        if isinstance(item, _FeedFailure):
+            self._finished = True
+            raise item.error
+        return item
+
+    def close(self) -> None:
+        """Stop the pump and wake a consumer waiting for a page; buffered pages are dropped."""
+        if not self._finished:
+            self._finished = True
+            self._task.cancel()
+            if self._pending is not None:
+                self._pending.cancel()
@@ -0,0 +1 @@
+# offline performance tooling: fake Stripe server and ingestion benchmarks
@@ -0,0 +1,242 @@
+"""Local stand-in for Stripe's customer/subscription list endpoints.
+
+Records are generated on the fly from their index, so the server serves accounts of any
+size (1k to 1M+) deterministically without holding them in memory. It can also inject
+latency and periodic 429 responses to exercise the client's retry path.
+
+Run standalone with:
+
+    python -m benchmarks.fake_stripe_server --port 12111 --subscriptions 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+SECONDS_PER_DAY = 24 * 60 * 60
+SUBSCRIPTION_STATUSES = ("active", "active", "trialing", "past_due")
+MAX_PAGE_SIZE = 100
+
+
+@dataclass
+class FakeStripeConfig:
+    customers: int = 1_000
+    subscriptions: int = 1_000
+    latency_ms: float = 0.0
+    throttle_every: int = 0
+    retry_after_seconds: float = 0.0
+    period_anchor: int = 1_717_200_000
+    period_spread_days: int = 365
+
+
+def build_customer(index: int, config: FakeStripeConfig) -> Dict[str, Any]:
+    return {
+        "id": f"cus_{index:08d}",
+        "object": "customer",
+        "name": f"Customer {index}",
+        "email": f"customer{index}@example.com",
+        "created": config.period_anchor - index,
+    }
+
+
+def build_subscription(index: int, config: FakeStripeConfig) -> Dict[str, Any]:
+    spread = config.period_spread_days * SECONDS_PER_DAY
+    return {
+        "id": f"sub_{index:08d}",
+        "object": "subscription",
+        "customer": f"cus_{index % max(1, config.customers):08d}",
+        "status": SUBSCRIPTION_STATUSES[index % len(SUBSCRIPTION_STATUSES)],
+        "current_period_end": config.period_anchor + (index * 7919) % spread,
+        "amount_due": ((index * 37) % 50_000) / 100,
+        "cancel_at_period_end": index % 11 == 0,
+    }
+
+
+RESOURCES: Dict[str, Callable[[FakeStripeConfig], int]] = {
+    "customers": lambda config: config.customers,
+    "subscriptions": lambda config: config.subscriptions,
+}
+BUILDERS: Dict[str, Callable[[int, FakeStripeConfig], Dict[str, Any]]] = {
+    "customers": build_customer,
+    "subscriptions": build_subscription,
+}
+
+
+def list_page(
+    resource: str,
+    config: FakeStripeConfig,
+    limit: int,
+    starting_after: Optional[str],
+) -> Dict[str, Any]:
+    total = RESOURCES[resource](config)
+    start = 0 if starting_after is None else int(starting_after.rsplit("_", 1)[-1]) + 1
+    end = min(total, start + limit)
+    data: List[Dict[str, Any]] = [BUILDERS[resource](index, config) for index in range(start, end)]
+    return {
+        "object": "list",
+        "url": f"/v1/{resource}",
+        "has_more": end < total,
+        "data": data,
+    }
+
+
+class FakeStripeServer:
+    """Threaded HTTP server that mimics Stripe's paginated list API."""
+
+    def __init__(
+        self,
+        config: Optional[FakeStripeConfig] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.config = config or FakeStripeConfig()
+        self.requests_served = 0
+        self.throttled_requests = 0
+        self._request_counter = itertools.count(1)
+        self._stats_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeStripeServer":
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="fake-stripe", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def __enter__(self) -> "FakeStripeServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self) -> None:  # noqa: N802 - http.server naming
+                server._handle(self)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                return
+
+        return Handler
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        config = self.config
+        request_number = next(self._request_counter)
+        if config.latency_ms:
+            time.sleep(config.latency_ms / 1000)
+
+        parsed = urlparse(handler.path)
+        resource = parsed.path.rstrip("/").rsplit("/", 1)[-1]
+        if not handler.headers.get("Authorization", "").startswith("Bearer "):
+            self._respond(handler, 401, {"error": {"message": "Missing API key"}})
+            return
+        if resource not in RESOURCES:
+            self._respond(handler, 404, {"error": {"message": f"Unknown resource {resource}"}})
+            return
+        if config.throttle_every and request_number % config.throttle_every == 0:
+            with self._stats_lock:
+                self.throttled_requests += 1
+            self._respond(
+                handler,
+                429,
+                {"error": {"type": "rate_limit_error", "message": "Too many requests"}},
+                headers={"Retry-After": str(config.retry_after_seconds)},
+            )
+            return
+
+        query = parse_qs(parsed.query)
+        limit = min(MAX_PAGE_SIZE, max(1, int(query.get("limit", ["10"])[0])))
+        starting_after = query.get("starting_after", [None])[0]
+        with self._stats_lock:
+            self.requests_served += 1
+        self._respond(handler, 200, list_page(resource, config, limit, starting_after))
+
+    @staticmethod
+    def _respond(
+        handler: BaseHTTPRequestHandler,
+        status: int,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_config_arguments(parser)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12111)
+    return parser
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--customers", type=int, default=1_000)
+    parser.add_argument("--subscriptions", type=int, default=1_000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--throttle-every",
+        type=int,
+        default=0,
+        help="answer every Nth request with 429 (0 disables throttling)",
+    )
+    parser.add_argument("--retry-after-seconds", type=float, default=0.0)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeStripeConfig:
+    return FakeStripeConfig(
+        customers=args.customers,
+        subscriptions=args.subscriptions,
+        latency_ms=args.latency_ms,
+        throttle_every=args.throttle_every,
+        retry_after_seconds=args.retry_after_seconds,
+    )
+
+
+def main() -> None:
+    args = build_arg_parser().parse_args()
+    server = FakeStripeServer(config_from_args(args), host=args.host, port=args.port)
+    print(f"Fake Stripe listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Drive IngestionService against the fake Stripe server and report throughput.
+
+Example:
+
+    python -m benchmarks.ingest_throughput --subscriptions 100000 --customers 10000 \
+        --latency-ms 20 --client async
+
+Reports records/sec, peak RSS and per-page latency percentiles. The fake server runs in a
+child process by default so the RSS figure reflects the ingest side only.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, List, Optional
+
+import httpx
+
+from app.services.ingestion import (
+    IngestionService,
+    StripeAPIClient,
+    StripeCredentialRepository,
+    StripeSubscriptionSnapshotFetcher,
+    StripeSubscriptionSnapshotRepository,
+)
+from app.services.retry import RetryPolicy
+from app.services.stripe_async import AsyncStripeAPIClient
+from benchmarks.fake_stripe_server import (
+    FakeStripeConfig,
+    FakeStripeServer,
+    add_config_arguments,
+    config_from_args,
+)
+
+BENCHMARK_SECRET_KEY = "sk_test_benchmark"
+
+
+@dataclass
+class IngestBenchmarkResult:
+    client: str
+    records: int
+    pages: int
+    elapsed_seconds: float
+    records_per_second: float
+    peak_rss_mb: float
+    page_latency_ms_p50: float
+    page_latency_ms_p95: float
+    page_latency_ms_max: float
+    retries: int
+    retry_wait_seconds: float
+
+
+class _PageTimer:
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+
+    def record(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+
+
+class TimingTransport(httpx.BaseTransport):
+    """Measures each page round trip including reading the response body."""
+
+    def __init__(self, timer: _PageTimer) -> None:
+        self._inner = httpx.HTTPTransport()
+        self._timer = timer
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        response = self._inner.handle_request(request)
+        response.read()
+        self._timer.record(time.perf_counter() - started)
+        return response
+
+    def close(self) -> None:
+        self._inner.close()
+
+
+class AsyncTimingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, timer: _PageTimer, limits: httpx.Limits) -> None:
+        self._inner = httpx.AsyncHTTPTransport(limits=limits)
+        self._timer = timer
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self._inner.handle_async_request(request)
+        await response.aread()
+        self._timer.record(time.perf_counter() - started)
+        return response
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+def run_ingest_benchmark(
+    base_url: str,
+    client: str = "sync",
+    page_size: int = 100,
+    keep_raw_payloads: bool = False,
+) -> IngestBenchmarkResult:
+    timer = _PageTimer()
+    snapshot_repository = StripeSubscriptionSnapshotRepository(
+        keep_raw_payloads=keep_raw_payloads
+    )
+    retry_policy = RetryPolicy(max_attempts=10)
+
+    http_client: Optional[httpx.Client] = None
+    async_client: Optional[AsyncStripeAPIClient] = None
+    if client == "async":
+        async_client = AsyncStripeAPIClient(
+            base_url=base_url,
+            page_size=page_size,
+            retry_policy=retry_policy,
+            transport=AsyncTimingTransport(timer, httpx.Limits(max_connections=20)),
+        )
+        listing_client: Any = async_client
+    else:
+        http_client = httpx.Client(transport=TimingTransport(timer))
+        listing_client = StripeAPIClient(
+            client=http_client,
+            base_url=base_url,
+            page_size=page_size,
+            retry_policy=retry_policy,
+        )
+
+    service = IngestionService(
+        credential_repository=StripeCredentialRepository(),
+        metadata_fetcher=StripeSubscriptionSnapshotFetcher(client=listing_client),
+        snapshot_repository=snapshot_repository,
+    )
+    try:
+        started = time.perf_counter()
+        result = service.ingest(BENCHMARK_SECRET_KEY)
+        elapsed = time.perf_counter() - started
+    finally:
+        if http_client is not None:
+            http_client.close()
+        if async_client is not None:
+            async_client.close()
+
+    changes = result["changes"]
+    records = sum(
+        counts["added"] + counts["updated"] + counts["unchanged"]
+        for name, counts in changes.items()
+        if isinstance(counts, dict)
+    )
+    latencies_ms = sorted(seconds * 1000 for seconds in timer.latencies)
+    return IngestBenchmarkResult(
+        client=client,
+        records=records,
+        pages=len(latencies_ms),
+        elapsed_seconds=round(elapsed, 4),
+        records_per_second=round(records / elapsed, 1) if elapsed else 0.0,
+        peak_rss_mb=round(peak_rss_mb(), 1),
+        page_latency_ms_p50=round(percentile(latencies_ms, 50), 3),
+        page_latency_ms_p95=round(percentile(latencies_ms, 95), 3),
+        page_latency_ms_max=round(latencies_ms[-1], 3) if latencies_ms else 0.0,
+        retries=result["fetch"]["retries"],
+        retry_wait_seconds=result["fetch"]["retry_wait_seconds"],
+    )
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process; ru_maxrss is KiB on Linux and bytes on macOS."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def _serve(config: FakeStripeConfig, port: int) -> None:
+    FakeStripeServer(config, port=port).serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_config_arguments(parser)
+    parser.add_argument("--client", choices=("sync", "async"), default="sync")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--keep-raw-payloads", action="store_true")
+    parser.add_argument("--port", type=int, default=12112)
+    parser.add_argument(
+        "--server-url",
+        help="benchmark an already running fake server instead of spawning one",
+    )
+    args = parser.parse_args()
+
+    server_process: Optional[multiprocessing.Process] = None
+    base_url = args.server_url
+    if base_url is None:
+        server_process = multiprocessing.Process(
+            target=_serve, args=(config_from_args(args), args.port), daemon=True
+        )
+        server_process.start()
+        base_url = f"http://127.0.0.1:{args.port}"
+        _wait_until_ready(base_url)
+
+    try:
+        result = run_ingest_benchmark(
+            base_url,
+            client=args.client,
+            page_size=args.page_size,
+            keep_raw_payloads=args.keep_raw_payloads,
+        )
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.join()
+
+    print(json.dumps(asdict(result), indent=2))
+
+
+def _wait_until_ready(base_url: str, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            httpx.get(f"{base_url}/v1/customers", params={"limit": 1}, timeout=1.0)
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+if __name__ == "__main__":
+    main()
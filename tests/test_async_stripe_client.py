@@ -0,0 +1,188 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.services.ingestion import (
+    IngestionService,
+    StripeAPIError,
+    StripeCredentialRepository,
+    StripeSubscriptionSnapshotFetcher,
+    StripeSubscriptionSnapshotRepository,
+)
+from app.services.records import serialize_snapshot
+from app.services.retry import RetryPolicy
+from app.services.stripe_async import AsyncStripeAPIClient
+
+PAGE_LATENCY_SECONDS = 0.15
+
+
+def build_fake_stripe_transport(records_by_resource, requests):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        resource = request.url.path.rsplit("/", 1)[-1]
+        requests.append((resource, request.url.params.get("starting_after")))
+        await asyncio.sleep(PAGE_LATENCY_SECONDS)
+        records = records_by_resource[resource]
+        limit = int(request.url.params["limit"])
+        starting_after = request.url.params.get("starting_after")
+        start = 0
+        if starting_after is not None:
+            start = next(i for i, item in enumerate(records) if item["id"] == starting_after) + 1
+        return httpx.Response(
+            status_code=200,
+            json={
+                "object": "list",
+                "data": records[start : start + limit],
+                "has_more": start + limit < len(records),
+            },
+        )
+
+    return httpx.MockTransport(handler)
+
+
+RECORDS = {
+    "customers": [{"id": f"cus_{index}"} for index in range(4)],
+    "subscriptions": [{"id": f"sub_{index}"} for index in range(4)],
+}
+
+
+def test_listings_are_fetched_concurrently():
+    requests = []
+    client = AsyncStripeAPIClient(
+        page_size=2, transport=build_fake_stripe_transport(RECORDS, requests)
+    )
+    try:
+        started = time.perf_counter()
+        streams = client.fetch_customer_and_subscription_data("sk_test_concurrent")
+        listings = {resource: list(stream) for resource, stream in streams.items()}
+        elapsed = time.perf_counter() - started
+    finally:
+        client.close()
+
+    assert listings == RECORDS
+    assert len(requests) == 4
+    # Two pages per listing: sequential fetching would need four round trips.
+    assert elapsed < 3.5 * PAGE_LATENCY_SECONDS
+
+
+def test_ingest_through_sync_adapter_reuses_one_pool_across_accounts():
+    requests = []
+    client = AsyncStripeAPIClient(
+        page_size=3,
+        max_buffered_pages=1,
+        transport=build_fake_stripe_transport(RECORDS, requests),
+    )
+    snapshot_repository = StripeSubscriptionSnapshotRepository()
+    service = IngestionService(
+        credential_repository=StripeCredentialRepository(),
+        metadata_fetcher=StripeSubscriptionSnapshotFetcher(client=client),
+        snapshot_repository=snapshot_repository,
+    )
+    try:
+        service.ingest("sk_test_first")
+        pooled_client = client.http_client
+        service.ingest("sk_test_second")
+
+        assert client.http_client is pooled_client
+    finally:
+        client.close()
+
+    assert serialize_snapshot(snapshot_repository.get_snapshot("sk_test_first")) == RECORDS
+    assert serialize_snapshot(snapshot_repository.get_snapshot("sk_test_second")) == RECORDS
+    assert len(requests) == 8
+
+
+def test_error_response_propagates_to_consumer():
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(status_code=500, json={"error": "boom"})
+    )
+    client = AsyncStripeAPIClient(transport=transport, retry_policy=RetryPolicy(max_attempts=1))
+    try:
+        streams = client.fetch_customer_and_subscription_data("sk_test_error")
+        with pytest.raises(StripeAPIError):
+            list(streams["customers"])
+        streams["subscriptions"].close()
+    finally:
+        client.close()
+
+
+def paged_transport(failing_resource, requests, pages=50):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        resource = request.url.path.rsplit("/", 1)[-1]
+        requests.append(resource)
+        if resource == failing_resource:
+            return httpx.Response(status_code=500, json={"error": "boom"})
+        await asyncio.sleep(0.01)
+        page = int(request.url.params.get("starting_after") or 0) + 1
+        return httpx.Response(
+            status_code=200,
+            json={"data": [{"id": str(page)}], "has_more": page < pages},
+        )
+
+    return httpx.MockTransport(handler)
+
+
+def run_on_client_loop(client, coroutine):
+    return asyncio.run_coroutine_threadsafe(coroutine, client._loop()).result()
+
+
+def wait_for_idle_loop(client, timeout=5.0):
+    async def pending_tasks():
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    deadline = time.monotonic() + timeout
+    while run_on_client_loop(client, pending_tasks()):
+        assert time.monotonic() < deadline, "page feeds are still running"
+        time.sleep(0.01)
+
+
+class FailingRepository(StripeSubscriptionSnapshotRepository):
+    def save_snapshot(self, stripe_secret_key, snapshot):
+        next(snapshot["customers"])
+        raise RuntimeError("storage unavailable")
+
+
+def test_failed_listing_stops_the_sibling_listing():
+    requests = []
+    client = AsyncStripeAPIClient(
+        max_buffered_pages=2,
+        transport=paged_transport("customers", requests),
+        retry_policy=RetryPolicy(max_attempts=1),
+    )
+    service = IngestionService(
+        credential_repository=StripeCredentialRepository(),
+        metadata_fetcher=StripeSubscriptionSnapshotFetcher(client=client),
+        snapshot_repository=StripeSubscriptionSnapshotRepository(),
+    )
+    try:
+        with pytest.raises(StripeAPIError):
+            service.ingest("sk_test_sibling")
+        wait_for_idle_loop(client)
+        fetched = requests.count("subscriptions")
+        time.sleep(0.1)
+    finally:
+        client.close()
+
+    assert fetched < 50
+    assert requests.count("subscriptions") == fetched
+
+
+def test_failed_save_releases_the_page_feeds():
+    requests = []
+    client = AsyncStripeAPIClient(
+        max_buffered_pages=1, transport=paged_transport(None, requests)
+    )
+    service = IngestionService(
+        credential_repository=StripeCredentialRepository(),
+        metadata_fetcher=StripeSubscriptionSnapshotFetcher(client=client),
+        snapshot_repository=FailingRepository(),
+    )
+    try:
+        with pytest.raises(RuntimeError):
+            service.ingest("sk_test_failed_save")
+        wait_for_idle_loop(client)
+    finally:
+        client.close()
+
+    assert len(requests) < 100
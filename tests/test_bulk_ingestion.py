@@ -0,0 +1,93 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app import main as main_module
+from app.services.ingest_jobs import IngestJobQueue
+from app.services.ingestion import StripeCredentialRepository
+
+
+class ConcurrencyTrackingIngestionService:
+    def __init__(self, failing_keys=()):
+        self.failing_keys = set(failing_keys)
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def ingest(self, stripe_secret_key: str, progress=None):
+        with self._lock:
+            self.calls.append(stripe_secret_key)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(0.02)
+            if stripe_secret_key in self.failing_keys:
+                raise RuntimeError("invalid api key")
+            return {"ok": True, "changes": {"skipped": False}}
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def test_bulk_ingest_endpoint_queues_jobs_and_reports_the_batch():
+    ingestion_service = ConcurrencyTrackingIngestionService(failing_keys={"sk_test_b"})
+    queue = IngestJobQueue(max_workers=2)
+    overrides = {
+        main_module.get_ingestion_service: lambda: ingestion_service,
+        main_module.get_ingest_job_queue: lambda: queue,
+    }
+    main_module.app.dependency_overrides.update(overrides)
+    try:
+        client = TestClient(main_module.app)
+        submitted = client.post(
+            "/ingest/bulk", json={"stripe_secret_keys": ["sk_test_a", "sk_test_b", "sk_test_a"]}
+        )
+        body = submitted.json()
+        for job_id in body["job_ids"]:
+            assert queue.wait(job_id, timeout=5).is_finished
+        status = client.get(f"/ingest/bulk/{body['batch_id']}")
+        missing = client.get("/ingest/bulk/unknown")
+    finally:
+        for dependency in overrides:
+            main_module.app.dependency_overrides.pop(dependency, None)
+        queue.shutdown()
+
+    assert submitted.status_code == 202
+    assert len(body["job_ids"]) == 2
+    summary = status.json()
+    assert (summary["state"], summary["ok"]) == ("failed", False)
+    assert (summary["succeeded"], summary["failed"], summary["pending"]) == (1, 1, 0)
+    by_fingerprint = {
+        account["stripe_credential_fingerprint"]: account for account in summary["accounts"]
+    }
+    assert by_fingerprint[StripeCredentialRepository._fingerprint("sk_test_a")]["changes"] == {
+        "skipped": False
+    }
+    assert by_fingerprint[StripeCredentialRepository._fingerprint("sk_test_b")]["error"] == (
+        "invalid api key"
+    )
+    assert missing.status_code == 404
+
+
+def test_batch_registry_stays_bounded_while_batches_run():
+    release = threading.Event()
+
+    class BlockingIngestionService:
+        def ingest(self, stripe_secret_key, progress=None):
+            assert release.wait(timeout=5)
+            return {"ok": True, "changes": {"skipped": False}}
+
+    queue = IngestJobQueue(max_workers=1, max_batches=2)
+    try:
+        batches = [
+            queue.submit_batch(BlockingIngestionService(), [f"sk_test_{index}"])
+            for index in range(4)
+        ]
+        assert not any(batch.is_finished for batch in batches)
+        assert [queue.get_batch(batch.id) for batch in batches] == [None, None, *batches[2:]]
+        assert queue.get_job(batches[0].jobs[0].id) is batches[0].jobs[0]
+    finally:
+        release.set()
+        queue.shutdown()
@@ -0,0 +1,172 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.columnar import (
+    ColumnarFormatError,
+    ColumnarSnapshotStore,
+    ColumnarSubscriptions,
+    write_columnar_snapshot,
+)
+from app.services.digest import RenewalDigestService
+from app.services.ingestion import (
+    StripeCredentialRepository,
+    StripeSubscriptionSnapshotRepository,
+)
+from app.services.records import SubscriptionRecord
+from app.services.renewals import SubscriptionRenewalAnalyzer
+from app.services.sqlite_storage import SQLiteDatabase, SQLiteSubscriptionSnapshotRepository
+
+AS_OF = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def epoch_in(days):
+    return int((AS_OF + timedelta(days=days)).timestamp())
+
+
+RECORDS = [
+    SubscriptionRecord("sub_soon", "active", epoch_in(2), 500.0),
+    SubscriptionRecord("sub_later", "active", epoch_in(10), 900.0),
+    SubscriptionRecord("sub_trial", "trialing", epoch_in(5), None),
+    SubscriptionRecord("sub_unscheduled", None, None, 100.0),
+]
+
+
+def test_columns_round_trip_through_memory_mapped_file(tmp_path):
+    path = str(tmp_path / "account.columns")
+    rows = write_columnar_snapshot(path, RECORDS, version=3, customer_count=2)
+
+    columns = ColumnarSubscriptions(path)
+    try:
+        assert rows == len(columns) == 4
+        assert columns.version == 3
+        assert columns.customer_count == 2
+        assert columns.statuses == ("active", "trialing")
+        # Rows are sorted by period end, unscheduled ones last, and remember their position.
+        assert [columns.positions[row] for row in range(4)] == [0, 2, 1, 3]
+        stored = [RECORDS[columns.positions[row]] for row in range(4)]
+        assert [columns.id_at(row) for row in range(4)] == [record.id for record in stored]
+        assert [columns.status_at(row) for row in range(4)] == [record.status for record in stored]
+        assert [columns.period_end_at(row) for row in range(4)] == [
+            record.current_period_end for record in stored
+        ]
+        assert columns.amount_at(1) is None
+        assert columns.rows_between(epoch_in(0), epoch_in(7)) == [0, 1]
+        assert columns.rows_between(epoch_in(0), epoch_in(30)) == [0, 2, 1]
+    finally:
+        columns.close()
+
+
+def test_analyzer_gives_same_result_on_columns_and_records(tmp_path):
+    path = str(tmp_path / "account.columns")
+    write_columnar_snapshot(path, RECORDS)
+    analyzer = SubscriptionRenewalAnalyzer(clock=lambda: AS_OF)
+
+    columns = ColumnarSubscriptions(path)
+    try:
+        from_columns = analyzer.find_upcoming(columns, window_days=7)
+    finally:
+        columns.close()
+
+    assert from_columns == analyzer.find_upcoming(RECORDS, window_days=7)
+    assert [item["id"] for item in from_columns["upcoming_subscriptions"]] == [
+        "sub_soon",
+        "sub_trial",
+    ]
+
+
+def test_rejects_files_that_are_not_columnar_snapshots(tmp_path):
+    path = tmp_path / "garbage.columns"
+    path.write_bytes(b"not a columnar snapshot" * 10)
+
+    with pytest.raises(ColumnarFormatError):
+        ColumnarSubscriptions(str(path))
+
+
+def test_repository_writes_columns_and_digest_reads_them(tmp_path):
+    store = ColumnarSnapshotStore(str(tmp_path / "columns"))
+    database = SQLiteDatabase(str(tmp_path / "autobot.sqlite3"))
+    repo = SQLiteSubscriptionSnapshotRepository(database, columnar_store=store)
+    repo.save_snapshot(
+        "sk_test_columns",
+        {
+            "customers": [{"id": "cus_1"}],
+            "subscriptions": [
+                {"id": "sub_soon", "current_period_end": epoch_in(2), "amount_due": 500},
+                {"id": "sub_later", "current_period_end": epoch_in(10), "amount_due": 900},
+            ],
+        },
+    )
+    fingerprint = StripeCredentialRepository._fingerprint("sk_test_columns")
+
+    # A restarted process answers from the columns without loading the snapshot.
+    restarted = SQLiteSubscriptionSnapshotRepository(database)
+    restarted.renewal_window = None
+    restarted._load = None
+    service = RenewalDigestService(
+        snapshot_repository=restarted,
+        analyzer=SubscriptionRenewalAnalyzer(clock=lambda: AS_OF),
+        columnar_store=store,
+    )
+    try:
+        first = store.open(fingerprint)
+        digest = service.build_digest("sk_test_columns")
+
+        assert digest["found_snapshot"] is True
+        assert digest["snapshot_version"] == 1
+        assert digest["subscription_count"] == 2
+        assert digest["customer_count"] == 1
+        assert digest["upcoming"]["total_amount_due"] == 500.0
+        assert store.open(fingerprint) is first
+
+        repo.save_snapshot("sk_test_columns", {"customers": [], "subscriptions": []})
+        reopened = store.open(fingerprint)
+        assert reopened is not first
+        assert reopened.version == 2
+        assert len(first) == 2
+    finally:
+        store.close()
+        database.close()
+
+
+def test_digest_ignores_columns_of_another_version(tmp_path):
+    store = ColumnarSnapshotStore(str(tmp_path))
+    repo = StripeSubscriptionSnapshotRepository()
+    repo.save_snapshot(
+        "sk_test_stale",
+        {
+            "customers": [],
+            "subscriptions": [
+                {"id": "sub_old", "current_period_end": epoch_in(2), "amount_due": 500}
+            ],
+        },
+    )
+    store.write(repo.get_snapshot("sk_test_stale"))
+    repo.save_snapshot(
+        "sk_test_stale",
+        {
+            "customers": [{"id": "cus_new"}],
+            "subscriptions": [
+                {
+                    "id": "sub_new",
+                    "customer": "cus_new",
+                    "current_period_end": epoch_in(3),
+                    "amount_due": 700,
+                }
+            ],
+        },
+    )
+    service = RenewalDigestService(
+        snapshot_repository=repo,
+        analyzer=SubscriptionRenewalAnalyzer(clock=lambda: AS_OF),
+        columnar_store=store,
+    )
+    try:
+        digest = service.build_digest("sk_test_stale")
+    finally:
+        store.close()
+
+    assert digest["snapshot_version"] == 2
+    [item] = digest["upcoming"]["upcoming_subscriptions"]
+    assert item["id"] == "sub_new"
+    assert item["customer"]["id"] == "cus_new"
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from app import main as main_module
+from app.services.digest import RenewalDigestService
+from app.services.etags import etag_matches, make_etag
+from app.services.ingestion import StripeSubscriptionSnapshotRepository
+from app.services.renewals import SubscriptionRenewalAnalyzer
+
+NOW = datetime(2024, 6, 1, 12, 0, 30, tzinfo=timezone.utc)
+
+
+class CountingSnapshotRepository(StripeSubscriptionSnapshotRepository):
+    def __init__(self) -> None:
+        super().__init__()
+        self.reads = 0
+
+    def get_snapshot(self, stripe_secret_key, version=None, as_of=None):
+        self.reads += 1
+        return super().get_snapshot(stripe_secret_key, version=version, as_of=as_of)
+
+
+def ingest(repository, subscription_ids):
+    repository.save_snapshot(
+        "sk_test_etag",
+        {
+            "customers": [],
+            "subscriptions": [
+                {
+                    "id": subscription_id,
+                    "current_period_end": int((NOW + timedelta(days=2)).timestamp()),
+                    "amount_due": 100,
+                }
+                for subscription_id in subscription_ids
+            ],
+        },
+    )
+
+
+def test_etag_matching_follows_if_none_match_rules():
+    etag = make_etag("snapshot", "fingerprint", 3)
+
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag == make_etag("snapshot", "fingerprint", 3)
+    assert etag != make_etag("snapshot", "fingerprint", 4)
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"other"', etag)
+
+
+def test_snapshot_endpoint_answers_304_without_reading_the_snapshot():
+    original_repository = main_module.snapshot_repository
+    repository = CountingSnapshotRepository()
+    main_module.snapshot_repository = repository
+    try:
+        ingest(repository, ["sub_1"])
+        client = TestClient(main_module.app)
+
+        first = client.get("/snapshots/sk_test_etag")
+        etag = first.headers["ETag"]
+        reads_after_first = repository.reads
+        not_modified = client.get("/snapshots/sk_test_etag", headers={"If-None-Match": etag})
+
+        assert not_modified.status_code == 304
+        assert not_modified.headers["ETag"] == etag
+        assert not_modified.content == b""
+        assert repository.reads == reads_after_first
+
+        ingest(repository, ["sub_1", "sub_2"])
+        changed = client.get("/snapshots/sk_test_etag", headers={"If-None-Match": etag})
+        pinned = client.get(
+            "/snapshots/sk_test_etag", params={"version": 1}, headers={"If-None-Match": etag}
+        )
+    finally:
+        main_module.snapshot_repository = original_repository
+
+    assert first.status_code == 200
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["version"] == 2
+    assert pinned.status_code == 304
+
+
+def test_digest_endpoint_revalidates_within_window_granularity():
+    repository = CountingSnapshotRepository()
+    ingest(repository, ["sub_1"])
+    clock_value = {"now": NOW}
+    service = RenewalDigestService(
+        snapshot_repository=repository,
+        analyzer=SubscriptionRenewalAnalyzer(clock=lambda: clock_value["now"]),
+        window_granularity_seconds=60,
+    )
+    main_module.app.dependency_overrides[main_module.get_digest_service] = lambda: service
+    try:
+        client = TestClient(main_module.app)
+        first = client.get("/digest/sk_test_etag")
+        etag = first.headers["ETag"]
+        reads_after_first = repository.reads
+
+        clock_value["now"] = NOW + timedelta(seconds=20)
+        same_minute = client.get("/digest/sk_test_etag", headers={"If-None-Match": etag})
+        reads_after_revalidation = repository.reads
+
+        other_window = client.get(
+            "/digest/sk_test_etag",
+            params={"window_days": 3},
+            headers={"If-None-Match": etag},
+        )
+        clock_value["now"] = NOW + timedelta(minutes=1)
+        next_minute = client.get("/digest/sk_test_etag", headers={"If-None-Match": etag})
+    finally:
+        main_module.app.dependency_overrides.pop(main_module.get_digest_service, None)
+
+    assert first.status_code == 200
+    assert first.json()["upcoming"]["as_of"] == "2024-06-01T12:00:00+00:00"
+    assert same_minute.status_code == 304
+    assert reads_after_revalidation == reads_after_first
+    assert other_window.status_code == 200
+    assert next_minute.status_code == 200
+    assert next_minute.headers["ETag"] != etag
@@ -0,0 +1,146 @@
+import sqlite3
+import struct
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main as main_module
+from app.services.columnar import MAGIC, ColumnarSnapshotStore
+from app.services.customer_index import CustomerIndex
+from app.services.digest import RenewalDigestService
+from app.services.ingestion import (
+    StripeCredentialRepository,
+    StripeSubscriptionSnapshotRepository,
+)
+from app.services.records import CustomerRecord, SubscriptionRecord
+from app.services.renewals import SubscriptionRenewalAnalyzer
+from app.services.sqlite_storage import SQLiteDatabase, SQLiteSubscriptionSnapshotRepository
+
+AS_OF = datetime(2024, 6, 1, tzinfo=timezone.utc)
+KEY = "sk_test_customers"
+
+
+def snapshot():
+    renews = int((AS_OF + timedelta(days=2)).timestamp())
+    return {
+        "customers": [
+            {"id": "cus_ada", "name": "Ada", "email": "ada@example.com", "metadata": {}},
+            {"id": "cus_bob", "name": "Bob", "email": None},
+            {"name": "No id"},
+        ],
+        "subscriptions": [
+            {"id": "sub_ada", "current_period_end": renews, "customer": "cus_ada"},
+            {"id": "sub_bob", "current_period_end": renews, "customer": {"id": "cus_bob"}},
+            {"id": "sub_gone", "current_period_end": renews, "customer": "cus_deleted"},
+            {"id": "sub_none", "current_period_end": renews},
+        ],
+    }
+
+
+def test_index_maps_ids_to_compact_records():
+    index = CustomerIndex.build(snapshot()["customers"])
+
+    assert len(index) == 2
+    assert index.get("cus_ada") == CustomerRecord("cus_ada", "Ada", "ada@example.com")
+    assert index.get("cus_missing") is None and index.get(None) is None
+    assert SubscriptionRecord.from_stripe(snapshot()["subscriptions"][1]).customer == "cus_bob"
+
+
+@pytest.mark.parametrize("storage", ["memory", "columnar", "sqlite"])
+def test_digest_attaches_customer_details(tmp_path, storage):
+    store = ColumnarSnapshotStore(str(tmp_path / "columns")) if storage == "columnar" else None
+    database = SQLiteDatabase(str(tmp_path / "db.sqlite3")) if storage == "sqlite" else None
+    repository = (
+        SQLiteSubscriptionSnapshotRepository(database)
+        if database is not None
+        else StripeSubscriptionSnapshotRepository(columnar_store=store)
+    )
+    repository.save_snapshot(KEY, snapshot())
+    if database is not None:
+        # A fresh repository reads every record back from the database.
+        repository = SQLiteSubscriptionSnapshotRepository(database)
+    service = RenewalDigestService(
+        snapshot_repository=repository,
+        analyzer=SubscriptionRenewalAnalyzer(clock=lambda: AS_OF),
+        columnar_store=store,
+    )
+    try:
+        items = {
+            item["id"]: item
+            for item in service.build_digest(KEY)["upcoming"]["upcoming_subscriptions"]
+        }
+    finally:
+        if store is not None:
+            store.close()
+        if database is not None:
+            database.close()
+
+    assert items["sub_ada"]["customer"] == {
+        "id": "cus_ada",
+        "name": "Ada",
+        "email": "ada@example.com",
+    }
+    assert items["sub_bob"]["customer"]["name"] == "Bob"
+    assert items["sub_gone"]["customer_id"] == "cus_deleted"
+    assert items["sub_gone"]["customer"] is None
+    assert "customer" not in items["sub_none"]
+
+
+def test_existing_database_gains_the_customer_column(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE snapshot_records (fingerprint TEXT NOT NULL, resource TEXT NOT NULL, "
+        "record_key TEXT NOT NULL, position INTEGER NOT NULL, digest BLOB NOT NULL, "
+        "kind TEXT NOT NULL, id TEXT, status TEXT, current_period_end REAL, "
+        "amount_due REAL, payload TEXT, PRIMARY KEY (fingerprint, resource, record_key)) "
+        "WITHOUT ROWID"
+    )
+    connection.close()
+
+    database = SQLiteDatabase(path)
+    try:
+        SQLiteSubscriptionSnapshotRepository(database).save_snapshot(KEY, snapshot())
+        columns = [
+            row[1]
+            for row in database.connection().execute("PRAGMA table_info(snapshot_records)")
+        ]
+    finally:
+        database.close()
+
+    assert "customer" in columns
+
+
+def test_columnar_files_from_an_older_format_are_ignored(tmp_path):
+    store = ColumnarSnapshotStore(str(tmp_path))
+    fingerprint = StripeCredentialRepository._fingerprint(KEY)
+    with open(store.path_for(fingerprint), "wb") as handle:
+        handle.write(struct.pack("<4sH", MAGIC, 1) + bytes(256))
+    try:
+        assert store.open(fingerprint) is None
+    finally:
+        store.close()
+
+
+def test_customer_endpoint():
+    original_repository = main_module.snapshot_repository
+    repository = StripeSubscriptionSnapshotRepository()
+    repository.save_snapshot(KEY, snapshot())
+    main_module.snapshot_repository = repository
+    try:
+        client = TestClient(main_module.app)
+        found = client.get(f"/customers/{KEY}/cus_ada")
+        missing = client.get(f"/customers/{KEY}/cus_deleted")
+        no_snapshot = client.get("/customers/sk_test_unknown/cus_ada")
+    finally:
+        main_module.snapshot_repository = original_repository
+
+    assert found.status_code == 200
+    assert found.json()["customer"] == {
+        "id": "cus_ada",
+        "name": "Ada",
+        "email": "ada@example.com",
+    }
+    assert missing.status_code == 404
+    assert no_snapshot.status_code == 404
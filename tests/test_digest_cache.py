@@ -0,0 +1,141 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from app import main as main_module
+from app.services.digest import RenewalDigestService
+from app.services.digest_cache import DigestCache
+from app.services.ingestion import (
+    IngestionService,
+    StripeCredentialRepository,
+    StripeSubscriptionSnapshotFetcher,
+    StripeSubscriptionSnapshotRepository,
+)
+from app.services.renewals import SubscriptionRenewalAnalyzer
+
+NOW = datetime(2024, 6, 1, 12, 0, 30, tzinfo=timezone.utc)
+KEY = "sk_test_digest_cache"
+
+
+class CountingAnalyzer(SubscriptionRenewalAnalyzer):
+    def __init__(self, clock):
+        super().__init__(clock=clock)
+        self.builds = 0
+
+    def find_upcoming_windows(self, subscriptions, windows_days, as_of=None, **paging):
+        self.builds += 1
+        return super().find_upcoming_windows(subscriptions, windows_days, as_of=as_of, **paging)
+
+
+class ListFetcher(StripeSubscriptionSnapshotFetcher):
+    def __init__(self, ids):
+        self.ids = ids
+
+    def fetch_subscription_snapshot(self, stripe_secret_key):
+        renews = int((NOW + timedelta(days=2)).timestamp())
+        return {
+            "customers": [],
+            "subscriptions": [{"id": sub_id, "current_period_end": renews} for sub_id in self.ids],
+        }
+
+
+def service(repository, cache, clock_value):
+    analyzer = CountingAnalyzer(clock=lambda: clock_value["now"])
+    digests = RenewalDigestService(
+        snapshot_repository=repository,
+        analyzer=analyzer,
+        window_granularity_seconds=60,
+        digest_cache=cache,
+    )
+    return digests, analyzer
+
+
+def test_hits_within_the_anchor_and_invalidates_on_ingest():
+    repository = StripeSubscriptionSnapshotRepository()
+    cache = DigestCache(max_entries=8)
+    fetcher = ListFetcher(["sub_1"])
+    ingestion = IngestionService(
+        credential_repository=StripeCredentialRepository(),
+        metadata_fetcher=fetcher,
+        snapshot_repository=repository,
+        digest_cache=cache,
+    )
+    clock_value = {"now": NOW}
+    digests, analyzer = service(repository, cache, clock_value)
+
+    ingestion.ingest(KEY)
+    first = digests.build_digest(KEY)
+    clock_value["now"] = NOW + timedelta(seconds=20)
+    again = digests.build_digest(KEY)
+    _, tagged = digests.build_digest_if_changed(KEY)
+
+    assert again is first and tagged is first
+    assert analyzer.builds == 1
+
+    fetcher.ids = ["sub_1", "sub_2"]
+    ingestion.ingest(KEY)
+    assert len(cache) == 0
+    refreshed = digests.build_digest(KEY)
+
+    assert refreshed["snapshot_version"] == 2
+    assert len(refreshed["upcoming"]["upcoming_subscriptions"]) == 2
+    clock_value["now"] = NOW + timedelta(minutes=1)
+    digests.build_digest(KEY)
+    assert analyzer.builds == 3
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"]) == (2, 3, 1)
+    assert stats["entries"] == 2
+
+
+def test_entries_are_bounded_and_unrounded_anchors_bypass_the_cache():
+    repository = StripeSubscriptionSnapshotRepository()
+    repository.save_snapshot(KEY, ListFetcher(["sub_1"]).fetch_subscription_snapshot(KEY))
+    cache = DigestCache(max_entries=2)
+    digests, _ = service(repository, cache, {"now": NOW})
+
+    for days in (1, 7, 30):
+        digests.build_digest(KEY, window_days=days)
+    RenewalDigestService(snapshot_repository=repository, digest_cache=cache).build_digest(KEY)
+
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["misses"] == 3
+
+
+def test_concurrent_misses_build_once():
+    cache = DigestCache()
+    started = threading.Event()
+    release = threading.Event()
+    builds = []
+
+    def build():
+        builds.append(1)
+        started.set()
+        release.wait(timeout=5)
+        return {"snapshot_version": 1}
+
+    key = ("fingerprint", 1, 7, NOW.isoformat())
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        leader = executor.submit(cache.get_or_build, key, build)
+        assert started.wait(timeout=5)
+        followers = [executor.submit(cache.get_or_build, key, build) for _ in range(2)]
+        deadline = time.monotonic() + 5
+        while cache._single_flight._flights[key].followers < 2:
+            assert time.monotonic() < deadline, "followers never joined the build"
+            time.sleep(0.001)
+        release.set()
+
+    assert builds == [1]
+    assert all(future.result() is leader.result() for future in followers)
+    assert cache.stats()["coalesced"] == 2
+    assert cache.stats()["hit_rate"] == 2 / 3
+
+
+def test_stats_endpoint():
+    response = TestClient(main_module.app).get("/memory/digests")
+
+    assert response.status_code == 200
+    assert response.json()["max_entries"] == main_module.DIGEST_CACHE_SIZE
@@ -0,0 +1,160 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main as main_module
+from app.services.digest import RenewalDigestService
+from app.services.ingestion import StripeSubscriptionSnapshotRepository
+from app.services.records import SubscriptionRecord
+from app.services.renewals import RenewalCursor, SubscriptionRenewalAnalyzer
+from app.services.snapshot_pages import InvalidCursorError
+from app.services.slack_digest import SlackDigestFormatter
+
+AS_OF = datetime(2024, 6, 1, tzinfo=timezone.utc)
+KEY = "sk_test_digest_pages"
+
+
+def subscriptions(count=500, seed=24):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"sub_{index:04d}",
+            "status": "active",
+            # Hour granularity produces plenty of ties on the period end.
+            "current_period_end": int(
+                (AS_OF + timedelta(hours=rng.randrange(-24, 24 * 40))).timestamp()
+            ),
+            "amount_due": rng.choice([None, 10, 25.5, 99, 250]),
+        }
+        for index in range(count)
+    ]
+
+
+def expected_order(result, order):
+    items = result["upcoming_subscriptions"]
+    if order == "amount_due":
+        return sorted(
+            items,
+            key=lambda item: (
+                item["amount_due"] is None,
+                -(item["amount_due"] or 0.0),
+                item["current_period_end"],
+                item["id"],
+            ),
+        )
+    return sorted(items, key=lambda item: (item["current_period_end"], item["id"]))
+
+
+@pytest.mark.parametrize("order", ["period_end", "amount_due"])
+def test_pages_walk_the_sorted_window_without_gaps_or_repeats(order):
+    analyzer = SubscriptionRenewalAnalyzer()
+    records = [SubscriptionRecord.from_stripe(item) for item in subscriptions()]
+    full = analyzer.find_upcoming_windows(records, (7, 30), as_of=AS_OF)
+
+    for days in (7, 30):
+        # Unpaged results carry the same keys as a page that happens to hold everything.
+        assert full[days]["upcoming_count"] == len(full[days]["upcoming_subscriptions"])
+        assert full[days]["next_cursor"] is None
+        seen, cursor = [], None
+        while True:
+            page = analyzer.find_upcoming_windows(
+                records, (7, 30), as_of=AS_OF, limit=37, order=order, cursor=cursor
+            )[days]
+            assert page["upcoming_count"] == len(full[days]["upcoming_subscriptions"])
+            assert page["total_amount_due"] == full[days]["total_amount_due"]
+            assert len(page["upcoming_subscriptions"]) <= 37
+            seen.extend(page["upcoming_subscriptions"])
+            if page["next_cursor"] is None:
+                break
+            cursor = RenewalCursor.decode(page["next_cursor"])
+        assert seen == expected_order(full[days], order)
+
+
+def test_cursor_validation():
+    analyzer = SubscriptionRenewalAnalyzer()
+    cursor = RenewalCursor("period_end", (AS_OF.timestamp(), "sub_0001"))
+
+    assert RenewalCursor.decode(cursor.encode()) == cursor
+    with pytest.raises(InvalidCursorError):
+        RenewalCursor.decode("not-a-cursor")
+    with pytest.raises(InvalidCursorError):
+        analyzer.find_upcoming_windows([], (7,), as_of=AS_OF, order="amount_due", cursor=cursor)
+    with pytest.raises(ValueError):
+        analyzer.find_upcoming_windows([], (7,), as_of=AS_OF, limit=5, order="status")
+
+
+def test_digest_endpoint_pages_with_whole_window_totals():
+    repository = StripeSubscriptionSnapshotRepository()
+    repository.save_snapshot(KEY, {"customers": [], "subscriptions": subscriptions()})
+    service = RenewalDigestService(
+        snapshot_repository=repository,
+        analyzer=SubscriptionRenewalAnalyzer(clock=lambda: AS_OF),
+        window_granularity_seconds=60,
+    )
+    main_module.app.dependency_overrides[main_module.get_digest_service] = lambda: service
+    try:
+        client = TestClient(main_module.app)
+        default = client.get(f"/digest/{KEY}", params={"window_days": 30}).json()["upcoming"]
+        full = client.get(
+            f"/digest/{KEY}",
+            params={"window_days": 30, "limit": main_module.MAX_DIGEST_PAGE_SIZE},
+        ).json()["upcoming"]
+        first = client.get(
+            f"/digest/{KEY}", params={"window_days": 30, "limit": 5, "order": "amount_due"}
+        )
+        second = client.get(
+            f"/digest/{KEY}",
+            params={
+                "window_days": 30,
+                "limit": 5,
+                "order": "amount_due",
+                "cursor": first.json()["upcoming"]["next_cursor"],
+            },
+        )
+        wrong_order = client.get(
+            f"/digest/{KEY}",
+            params={"window_days": 30, "cursor": first.json()["upcoming"]["next_cursor"]},
+        )
+        malformed = client.get(f"/digest/{KEY}", params={"cursor": "garbage"})
+    finally:
+        main_module.app.dependency_overrides.pop(main_module.get_digest_service, None)
+
+    assert full["next_cursor"] is None
+    assert default["upcoming_count"] == len(full["upcoming_subscriptions"])
+    assert default["total_amount_due"] == full["total_amount_due"]
+    assert (
+        default["upcoming_subscriptions"]
+        == full["upcoming_subscriptions"][: main_module.DEFAULT_DIGEST_PAGE_SIZE]
+    )
+    assert default["next_cursor"] is not None
+    page = first.json()["upcoming"]
+    assert page["upcoming_count"] == len(full["upcoming_subscriptions"])
+    assert page["total_amount_due"] == full["total_amount_due"]
+    assert (
+        page["upcoming_subscriptions"] + second.json()["upcoming"]["upcoming_subscriptions"]
+        == expected_order(full, "amount_due")[:10]
+    )
+    assert first.headers["ETag"] != second.headers["ETag"]
+    assert wrong_order.status_code == 400
+    assert malformed.status_code == 400
+
+
+def test_slack_summary_counts_the_whole_window():
+    digest = {
+        "stripe_credential_fingerprint": "fp",
+        "upcoming": {
+            "window_days": 7,
+            "total_amount_due": 120.0,
+            "upcoming_count": 12,
+            "upcoming_subscriptions": [
+                {"id": f"sub_{index}", "amount_due": 10.0} for index in range(5)
+            ],
+        },
+    }
+
+    payload = SlackDigestFormatter().format_digest(digest)
+
+    assert "*12* upcoming subscriptions" in payload["blocks"][0]["text"]["text"]
+    assert payload["blocks"][1]["text"]["text"].endswith("...and 7 more subscriptions")
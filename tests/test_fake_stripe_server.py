@@ -0,0 +1,55 @@
+import httpx
+
+from app.services.ingestion import StripeAPIClient
+from app.services.retry import RetryPolicy
+from benchmarks.fake_stripe_server import FakeStripeConfig, FakeStripeServer, build_subscription
+from benchmarks.ingest_throughput import run_ingest_benchmark
+
+
+def test_fake_server_serves_deterministic_paginated_listings():
+    config = FakeStripeConfig(customers=5, subscriptions=250)
+    with FakeStripeServer(config) as server, httpx.Client() as http_client:
+        client = StripeAPIClient(client=http_client, base_url=server.url, page_size=100)
+        pages = list(client.iter_pages("sk_test_fake", "subscriptions"))
+
+    assert [len(page) for page in pages] == [100, 100, 50]
+    assert pages[1][0] == build_subscription(100, config)
+    assert pages[2][-1]["id"] == "sub_00000249"
+    assert pages[2][-1]["customer"] == "cus_00000004"
+
+
+def test_fake_server_injects_throttling_that_the_client_retries():
+    config = FakeStripeConfig(customers=0, subscriptions=30, throttle_every=2)
+    with FakeStripeServer(config) as server, httpx.Client() as http_client:
+        client = StripeAPIClient(
+            client=http_client,
+            base_url=server.url,
+            page_size=10,
+            retry_policy=RetryPolicy(max_attempts=3),
+            sleep=lambda delay: None,
+        )
+        stream = client.iter_records("sk_test_fake", "subscriptions")
+        records = list(stream)
+
+    assert len(records) == 30
+    assert server.throttled_requests == 2
+    assert stream.fetch_stats.retries == 2
+
+
+def test_fake_server_rejects_requests_without_api_key():
+    with FakeStripeServer() as server:
+        response = httpx.get(f"{server.url}/v1/customers")
+
+    assert response.status_code == 401
+
+
+def test_ingest_benchmark_reports_throughput_metrics():
+    config = FakeStripeConfig(customers=120, subscriptions=300)
+    with FakeStripeServer(config) as server:
+        result = run_ingest_benchmark(server.url, client="sync", page_size=50)
+
+    assert result.records == 420
+    assert result.pages == 3 + 6
+    assert result.records_per_second > 0
+    assert result.peak_rss_mb > 0
+    assert 0 < result.page_latency_ms_p50 <= result.page_latency_ms_max
@@ -4,6 +4,7 @@ from datetime import datetime, timezone
 from fastapi.testclient import TestClient
 
 from app import main as main_module
+from app.services.ingest_jobs import IngestJobQueue
 from app.services.ingestion import (
     IngestionService,
     StripeCredentialRepository,
@@ -43,25 +44,60 @@ def test_ingest_endpoint_saves_credential_and_snapshot():
     main_module.app.dependency_overrides[main_module.get_ingestion_service] = (
         lambda: service
     )
+    original_job_queue = main_module.ingest_job_queue
+    main_module.ingest_job_queue = IngestJobQueue(clock=lambda: fixed_time)
 
     try:
         with TestClient(main_module.app) as client:
             ingest_response = client.post(
                 "/ingest", json={"stripe_secret_key": "sk_test_dummy"}
             )
-            assert ingest_response.status_code == 200
-            assert ingest_response.json() == {
+            assert ingest_response.status_code == 202
+            assert ingest_response.json()["coalesced"] is False
+            job_id = ingest_response.json()["job_id"]
+            main_module.ingest_job_queue.wait(job_id, timeout=5)
+
+            job_response = client.get(f"/ingest/jobs/{job_id}")
+            assert job_response.status_code == 200
+            job_body = job_response.json()
+            assert job_body["state"] == "succeeded"
+            assert job_body["error"] is None
+            assert job_body["progress"]["records_fetched"] == 2
+            assert job_body["timings"]["queued_at"] == "2024-01-01T00:00:00+00:00"
+            assert job_body["result"] == {
                 "ok": True,
-                "subscription_snapshot": {
-                    "customers": [{"id": "cus_123"}],
-                    "subscriptions": [{"id": "sub_123"}],
+                "stripe_credential_fingerprint": hashlib.sha256(
+                    "sk_test_dummy".encode("utf-8")
+                ).hexdigest(),
+                "changes": {
+                    "skipped": False,
+                    "content_hash": job_body["result"]["changes"]["content_hash"],
+                    "customers": {"added": 1, "updated": 0, "removed": 0, "unchanged": 0},
+                    "subscriptions": {"added": 1, "updated": 0, "removed": 0, "unchanged": 0},
                 },
+                "fetch": {
+                    "requests": 0,
+                    "retries": 0,
+                    "retry_wait_seconds": 0.0,
+                    "rate_limit_wait_seconds": 0.0,
+                },
+                "coalesced": False,
             }
 
+            repeat_job_id = client.post(
+                "/ingest", json={"stripe_secret_key": "sk_test_dummy"}
+            ).json()["job_id"]
+            repeat_job = main_module.ingest_job_queue.wait(repeat_job_id, timeout=5)
+            assert repeat_job.result["changes"]["skipped"] is True
+
+            assert client.get("/ingest/jobs/unknown").status_code == 404
+
             snapshot_response = client.get("/snapshots/sk_test_dummy")
             assert snapshot_response.status_code == 200
             assert snapshot_response.json() == {
                 "stripe_secret_key": "sk_test_dummy",
+                "version": 1,
+                "record_format": "compact",
                 "subscription_snapshot": {
                     "customers": [{"id": "cus_123"}],
                     "subscriptions": [{"id": "sub_123"}],
@@ -89,5 +125,7 @@ def test_ingest_endpoint_saves_credential_and_snapshot():
             main_module.app.dependency_overrides[
                 main_module.get_ingestion_service
             ] = original_override
+        main_module.ingest_job_queue.shutdown()
+        main_module.ingest_job_queue = original_job_queue
         main_module.credential_repository = original_credential_repo
         main_module.snapshot_repository = original_snapshot_repo
@@ -0,0 +1,167 @@
+import subprocess
+import sys
+import threading
+from datetime import datetime, timezone
+
+from app.services.ingest_jobs import IngestJob, IngestJobQueue
+from app.services.ingestion import (
+    IngestionService,
+    StripeCredentialRepository,
+    StripeSubscriptionSnapshotFetcher,
+    StripeSubscriptionSnapshotRepository,
+)
+from app.services.sqlite_storage import SQLiteDatabase, SQLiteIngestJobStore
+
+
+class PagedSnapshotFetcher(StripeSubscriptionSnapshotFetcher):
+    def __init__(self, release: threading.Event, first_page_seen: threading.Event):
+        self.release = release
+        self.first_page_seen = first_page_seen
+
+    def fetch_subscription_snapshot(self, stripe_secret_key: str):
+        return {"customers": [], "subscriptions": self._subscriptions()}
+
+    def _subscriptions(self):
+        yield {"id": "sub_1"}
+        yield {"id": "sub_2"}
+        self.first_page_seen.set()
+        self.release.wait(timeout=5)
+        yield {"id": "sub_3"}
+
+
+class FailingSnapshotFetcher(StripeSubscriptionSnapshotFetcher):
+    def __init__(self):
+        pass
+
+    def fetch_subscription_snapshot(self, stripe_secret_key: str):
+        raise RuntimeError("stripe unavailable")
+
+
+def build_service(fetcher):
+    return IngestionService(
+        credential_repository=StripeCredentialRepository(),
+        metadata_fetcher=fetcher,
+        snapshot_repository=StripeSubscriptionSnapshotRepository(),
+    )
+
+
+def test_job_reports_live_progress_and_result():
+    release = threading.Event()
+    first_page_seen = threading.Event()
+    queue = IngestJobQueue(max_workers=1)
+    try:
+        job, coalesced = queue.submit(
+            build_service(PagedSnapshotFetcher(release, first_page_seen)), "sk_test_job"
+        )
+        assert coalesced is False
+        assert first_page_seen.wait(timeout=5)
+
+        running = queue.get_job(job.id).as_dict()
+        assert running["state"] == "running"
+        assert running["progress"]["records_fetched"] == 2
+        assert running["result"] is None
+
+        release.set()
+        finished = queue.wait(job.id, timeout=5).as_dict()
+    finally:
+        release.set()
+        queue.shutdown()
+
+    assert finished["state"] == "succeeded"
+    assert finished["progress"]["records_fetched"] == 3
+    assert finished["progress"]["resources"]["subscriptions"]["pages_fetched"] == 1
+    assert finished["result"]["changes"]["subscriptions"]["added"] == 3
+    assert finished["timings"]["run_seconds"] >= 0
+    assert "sk_test_job" not in repr(finished)
+
+
+def test_failed_job_records_error():
+    queue = IngestJobQueue(max_workers=1)
+    try:
+        job, _ = queue.submit(build_service(FailingSnapshotFetcher()), "sk_test_fail")
+        finished = queue.wait(job.id, timeout=5)
+    finally:
+        queue.shutdown()
+
+    assert finished.state == "failed"
+    assert finished.error == "stripe unavailable"
+    assert finished.result is None
+
+
+def test_submit_joins_active_job_for_same_fingerprint():
+    release = threading.Event()
+    first_page_seen = threading.Event()
+    queue = IngestJobQueue(max_workers=2)
+    service = build_service(PagedSnapshotFetcher(release, first_page_seen))
+    try:
+        job, coalesced = queue.submit(service, "sk_test_shared")
+        joined, joined_coalesced = queue.submit(service, "sk_test_shared")
+        release.set()
+        queue.wait(job.id, timeout=5)
+        fresh, fresh_coalesced = queue.submit(service, "sk_test_shared")
+        queue.wait(fresh.id, timeout=5)
+    finally:
+        release.set()
+        queue.shutdown()
+
+    assert coalesced is False
+    assert joined is job
+    assert joined_coalesced is True
+    assert job.as_dict()["coalesced_requests"] == 1
+    assert fresh is not job
+    assert fresh_coalesced is False
+
+
+def test_jobs_in_a_shared_store_are_reported_and_joined_by_every_queue(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    running_db, other_db = SQLiteDatabase(path), SQLiteDatabase(path)
+    release = threading.Event()
+    first_page_seen = threading.Event()
+    running = IngestJobQueue(max_workers=1, store=SQLiteIngestJobStore(running_db))
+    other = IngestJobQueue(max_workers=1, store=SQLiteIngestJobStore(other_db))
+    service = build_service(PagedSnapshotFetcher(release, first_page_seen))
+    try:
+        batch = running.submit_batch(service, ["sk_test_shared"])
+        assert first_page_seen.wait(timeout=5)
+
+        seen = other.get_job(batch.jobs[0].id)
+        joined, joined_coalesced = other.submit(service, "sk_test_shared")
+        release.set()
+        finished = other.wait(joined.id, timeout=5)
+        other_batch = other.get_batch(batch.id)
+    finally:
+        release.set()
+        running.shutdown()
+        other.shutdown()
+        running_db.close()
+        other_db.close()
+
+    assert seen.state == "running"
+    assert joined.id == batch.jobs[0].id
+    assert joined_coalesced is True
+    assert finished.as_dict()["state"] == "succeeded"
+    assert finished.as_dict()["coalesced_requests"] == 1
+    assert finished.as_dict()["result"]["changes"]["subscriptions"]["added"] == 3
+    assert finished.as_dict()["progress"]["records_fetched"] == 3
+    assert other_batch.as_dict()["succeeded"] == 1
+
+
+def test_unfinished_job_of_an_exited_process_reports_failed(tmp_path):
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    database = SQLiteDatabase(str(tmp_path / "jobs.sqlite3"))
+    store = SQLiteIngestJobStore(database)
+    queue = IngestJobQueue(max_workers=1, store=store)
+    now = datetime.now(timezone.utc)
+    store.claim_job(IngestJob("job_orphan", "fp_orphan", now), owner="exited")
+    database.connection().execute("UPDATE ingest_jobs SET owner_pid = ?", (exited.pid,))
+    try:
+        reported = queue.get_job("job_orphan")
+        retried = store.claim_job(IngestJob("job_retry", "fp_orphan", now), owner="live")
+    finally:
+        queue.shutdown()
+        database.close()
+
+    assert reported.state == "failed"
+    assert reported.error == "worker process exited"
+    assert retried is None
@@ -0,0 +1,105 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main as main_module
+from app.services.columnar import ColumnarSnapshotStore
+from app.services.digest import RenewalDigestService
+from app.services.ingestion import StripeSubscriptionSnapshotRepository
+from app.services.records import SubscriptionRecord
+from app.services.renewals import SubscriptionRenewalAnalyzer
+
+AS_OF = datetime(2024, 6, 1, tzinfo=timezone.utc)
+WINDOWS = (1, 7, 30, 90)
+KEY = "sk_test_windows"
+
+
+class CountingIterable:
+    def __init__(self, items):
+        self.items = items
+        self.passes = 0
+
+    def __iter__(self):
+        self.passes += 1
+        return iter(self.items)
+
+
+def subscriptions(count=400, seed=20):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"sub_{index}",
+            "status": "active",
+            "current_period_end": int(
+                (AS_OF + timedelta(hours=rng.randrange(-48, 24 * 120))).timestamp()
+            ),
+            "amount_due": rng.choice([None, 10, 25.5, 99]),
+        }
+        for index in range(count)
+    ]
+
+
+def test_every_window_matches_its_own_scan_from_one_pass():
+    analyzer = SubscriptionRenewalAnalyzer()
+    raw = subscriptions()
+    compact = CountingIterable([SubscriptionRecord.from_stripe(item) for item in raw])
+    boundary = SubscriptionRecord(
+        "sub_boundary", "active", (AS_OF + timedelta(days=7)).timestamp(), 1.0
+    )
+    compact.items.append(boundary)
+
+    results = analyzer.find_upcoming_windows(compact, (30, 7, 90, 1, 7), as_of=AS_OF)
+    raw_results = analyzer.find_upcoming_windows(raw, WINDOWS, as_of=AS_OF)
+
+    assert compact.passes == 1
+    assert sorted(results) == list(WINDOWS)
+    for days in WINDOWS:
+        assert results[days] == analyzer.find_upcoming(compact.items, days, as_of=AS_OF)
+        assert raw_results[days] == analyzer.find_upcoming(raw, days, as_of=AS_OF)
+    assert "sub_boundary" in [item["id"] for item in results[7]["upcoming_subscriptions"]]
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_digest_service_builds_all_windows(tmp_path, columnar):
+    store = ColumnarSnapshotStore(str(tmp_path)) if columnar else None
+    repository = StripeSubscriptionSnapshotRepository(columnar_store=store)
+    repository.save_snapshot(KEY, {"customers": [], "subscriptions": subscriptions()})
+    service = RenewalDigestService(
+        snapshot_repository=repository,
+        analyzer=SubscriptionRenewalAnalyzer(clock=lambda: AS_OF),
+        columnar_store=store,
+    )
+    try:
+        digest = service.build_digest(KEY, window_days=[30, 1, 7])
+        singles = {days: service.build_digest(KEY, window_days=days) for days in (1, 7, 30)}
+    finally:
+        if store is not None:
+            store.close()
+
+    assert "upcoming" not in digest
+    assert [item["window_days"] for item in digest["upcoming_windows"]] == [1, 7, 30]
+    for result in digest["upcoming_windows"]:
+        assert result == singles[result["window_days"]]["upcoming"]
+
+
+def test_digest_endpoint_accepts_repeated_windows():
+    repository = StripeSubscriptionSnapshotRepository()
+    repository.save_snapshot(KEY, {"customers": [], "subscriptions": subscriptions()})
+    service = RenewalDigestService(
+        snapshot_repository=repository,
+        analyzer=SubscriptionRenewalAnalyzer(clock=lambda: AS_OF),
+        window_granularity_seconds=60,
+    )
+    main_module.app.dependency_overrides[main_module.get_digest_service] = lambda: service
+    try:
+        client = TestClient(main_module.app)
+        multi = client.get(f"/digest/{KEY}", params=[("window_days", 7), ("window_days", 1)])
+        single = client.get(f"/digest/{KEY}", params={"window_days": 7})
+    finally:
+        main_module.app.dependency_overrides.pop(main_module.get_digest_service, None)
+
+    assert [item["window_days"] for item in multi.json()["upcoming_windows"]] == [1, 7]
+    assert multi.json()["upcoming_windows"][1] == single.json()["upcoming"]
+    assert multi.headers["ETag"] != single.headers["ETag"]
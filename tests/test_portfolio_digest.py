@@ -0,0 +1,104 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main as main_module
+from app.services.digest import RenewalDigestService
+from app.services.ingestion import StripeSubscriptionSnapshotRepository
+from app.services.portfolio import PortfolioDigestService, PortfolioWorkerPool
+from app.services.renewals import SubscriptionRenewalAnalyzer
+
+NOW = datetime(2024, 6, 1, 12, tzinfo=timezone.utc)
+
+
+def portfolio(accounts=6, seed=22, memory_budget_bytes=None):
+    rng = random.Random(seed)
+    repository = StripeSubscriptionSnapshotRepository(memory_budget_bytes=memory_budget_bytes)
+    for account in range(accounts):
+        repository.save_snapshot(
+            f"sk_test_portfolio_{account}",
+            {
+                "customers": [],
+                "subscriptions": [
+                    {
+                        "id": f"sub_{account}_{index}",
+                        "current_period_end": int(
+                            (NOW + timedelta(hours=rng.randrange(-24, 24 * 60))).timestamp()
+                        ),
+                        "amount_due": rng.choice([None, 1.5, 20, 75.25]),
+                    }
+                    for index in range(rng.randrange(1, 200))
+                ],
+            },
+        )
+    return repository
+
+
+def analyzer():
+    return SubscriptionRenewalAnalyzer(clock=lambda: NOW)
+
+
+def test_portfolio_sums_per_account_digests():
+    repository = portfolio()
+    service = PortfolioDigestService(repository, analyzer=analyzer())
+    digests = RenewalDigestService(snapshot_repository=repository, analyzer=analyzer())
+
+    result = service.build_portfolio_digest(window_days=[30, 7])
+
+    assert result["account_count"] == 6
+    assert [window["window_days"] for window in result["windows"]] == [7, 30]
+    for account, key in zip(
+        result["accounts"], [f"sk_test_portfolio_{index}" for index in range(6)]
+    ):
+        digest = digests.build_digest(key, window_days=7)
+        assert account["windows"][0]["upcoming_count"] == len(
+            digest["upcoming"]["upcoming_subscriptions"]
+        )
+        assert account["subscription_count"] == digest["subscription_count"]
+    assert result["windows"][0]["upcoming_count"] == sum(
+        account["windows"][0]["upcoming_count"] for account in result["accounts"]
+    )
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_portfolio_reads_cold_accounts_without_rehydrating_them(workers):
+    expected = PortfolioDigestService(portfolio(), analyzer=analyzer()).build_portfolio_digest()
+    # A one-byte budget keeps every account but the last one compressed.
+    repository = portfolio(memory_budget_bytes=1)
+    before = repository.memory_stats()
+    pool = PortfolioWorkerPool(workers) if workers else None
+
+    try:
+        result = PortfolioDigestService(
+            repository, analyzer=analyzer(), worker_pool=pool
+        ).build_portfolio_digest()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    after = repository.memory_stats()
+    assert result == expected
+    assert after["resident_accounts"] == before["resident_accounts"] == 1
+    assert (after["misses"], after["evictions"]) == (before["misses"], before["evictions"])
+
+
+def test_portfolio_endpoint():
+    repository = portfolio(accounts=2)
+    service = PortfolioDigestService(repository, analyzer=analyzer())
+    main_module.app.dependency_overrides[main_module.get_portfolio_digest_service] = (
+        lambda: service
+    )
+    try:
+        response = TestClient(main_module.app).get(
+            "/portfolio/digest", params=[("window_days", 1), ("window_days", 7)]
+        )
+    finally:
+        main_module.app.dependency_overrides.pop(main_module.get_portfolio_digest_service, None)
+
+    body = response.json()
+    assert response.status_code == 200
+    assert body["as_of"] == NOW.isoformat()
+    assert len(body["accounts"]) == 2
+    assert [window["window_days"] for window in body["windows"]] == [1, 7]
@@ -0,0 +1,133 @@
+import gc
+import os
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.prefork import (
+    MAX_RESTART_BACKOFF_SECONDS,
+    restart_delay,
+    spawn_worker,
+    warm_master,
+)
+from app.services.records import serialize_snapshot
+from app.services.sqlite_storage import SQLiteDatabase, SQLiteSubscriptionSnapshotRepository
+
+AS_OF = datetime(2024, 6, 1, tzinfo=timezone.utc)
+KEY = "sk_test_prefork"
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    return str(tmp_path / "autobot.sqlite3")
+
+
+def worker(database_path):
+    database = SQLiteDatabase(database_path)
+    return database, SQLiteSubscriptionSnapshotRepository(database)
+
+
+def save(repository, *subscription_ids):
+    return repository.save_snapshot(
+        KEY,
+        {
+            "customers": [],
+            "subscriptions": [
+                {
+                    "id": subscription_id,
+                    "current_period_end": int((AS_OF + timedelta(days=2)).timestamp()),
+                    "amount_due": 100,
+                }
+                for subscription_id in subscription_ids
+            ],
+        },
+    )
+
+
+def ids(snapshot):
+    return [record.id for record in snapshot["subscriptions"]]
+
+
+def test_workers_adopt_versions_saved_by_siblings(database_path):
+    first_db, first = worker(database_path)
+    second_db, second = worker(database_path)
+    try:
+        save(first, "sub_a")
+        assert ids(second.get_snapshot(KEY)) == ["sub_a"]
+
+        save(first, "sub_a", "sub_b")
+        adopted = second.get_snapshot(KEY)
+
+        assert adopted.version == 2
+        assert ids(adopted) == ["sub_a", "sub_b"]
+        assert second.get_snapshot_version(KEY) == 2
+        assert ids(second.get_snapshot(KEY, version=1)) == ["sub_a"]
+    finally:
+        first_db.close()
+        second_db.close()
+
+
+def test_racing_save_is_rebased_onto_the_stored_version(database_path):
+    first_db, first = worker(database_path)
+    second_db, second = worker(database_path)
+    try:
+        save(first, "sub_a")
+        stale = second.get_snapshot(KEY)
+        save(first, "sub_a", "sub_b")
+        # `second` read version 1 before `first` wrote version 2; its save must not clobber it.
+        second._snapshots.put(stale.fingerprint, stale)
+        second_db.changed_since_last_check()
+        changes = save(second, "sub_c")
+        stored = second.get_snapshot(KEY)
+        rebased_onto = second.get_snapshot(KEY, version=2)
+    finally:
+        first_db.close()
+        second_db.close()
+
+    reopened_db, reopened = worker(database_path)
+    try:
+        reloaded = reopened.get_snapshot(KEY)
+    finally:
+        reopened_db.close()
+
+    assert stored.version == 3
+    assert reloaded.version == 3
+    assert serialize_snapshot(reloaded) == serialize_snapshot(stored)
+    assert ids(reloaded) == ["sub_c"]
+    # The change set and history describe the version actually replaced.
+    assert changes.for_resource("subscriptions").added == ("sub_c",)
+    assert changes.for_resource("subscriptions").removed == ("sub_a", "sub_b")
+    assert ids(rebased_onto) == ["sub_a", "sub_b"]
+
+
+def test_forked_worker_shares_warmed_state_and_writes_back(database_path):
+    database, repository = worker(database_path)
+    save(repository, "sub_a")
+    database.close()
+    database, repository = worker(database_path)
+    master = SimpleNamespace(database=database, snapshot_repository=repository)
+    try:
+        assert warm_master(master) == 1
+        assert gc.get_freeze_count() > 0
+
+        pid = spawn_worker(lambda: save(repository, "sub_a", "sub_b"))
+        _, status = os.waitpid(pid, 0)
+        gc.enable()
+
+        assert os.waitstatus_to_exitcode(status) == 0
+        assert ids(repository.get_snapshot(KEY)) == ["sub_a", "sub_b"]
+        assert repository.get_snapshot(KEY).version == 2
+    finally:
+        gc.unfreeze()
+        gc.enable()
+        database.close()
+
+
+def test_crashing_workers_are_restarted_with_growing_delays():
+    delays = [restart_delay(quick_exits) for quick_exits in range(10)]
+
+    assert delays[0] == 0.0
+    assert delays[1] > 0
+    assert delays == sorted(delays)
+    assert delays[-1] == MAX_RESTART_BACKOFF_SECONDS
@@ -0,0 +1,161 @@
+import math
+import random
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main as main_module
+from app.services.digest import RenewalDigestService
+from app.services.ingestion import StripeSubscriptionSnapshotRepository
+from app.services.portfolio import PortfolioDigestService
+from app.services.records import SubscriptionRecord
+from app.services.renewal_index import RenewalIndex, epoch_day
+from app.services.renewals import SubscriptionRenewalAnalyzer
+
+NOW = datetime(2024, 6, 1, 9, 30, tzinfo=timezone.utc)
+KEY = "sk_test_calendar"
+
+
+def subscriptions(count=300, seed=21, cents=True):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"sub_{index}",
+            "status": "active",
+            "current_period_end": int(
+                (NOW + timedelta(minutes=rng.randrange(-60 * 24 * 5, 60 * 24 * 40))).timestamp()
+            ),
+            "amount_due": rng.choice([None, 500, 1250, 9900])
+            if cents
+            else rng.choice([None, 4.99, 12.5, 0.1]),
+        }
+        for index in range(count)
+    ]
+
+
+def records(items):
+    return [SubscriptionRecord.from_stripe(item) for item in items]
+
+
+def scan(items, start, end):
+    matched = [
+        record
+        for record in items
+        if record.current_period_end is not None and start <= record.current_period_end <= end
+    ]
+    return len(matched), math.fsum(record.amount_due or 0.0 for record in matched)
+
+
+@pytest.mark.parametrize("cents", [True, False])
+def test_window_totals_match_a_scan(cents):
+    items = records(subscriptions(cents=cents))
+    index = RenewalIndex.build(items)
+    rng = random.Random(7)
+
+    for _ in range(50):
+        start = NOW.timestamp() + rng.randrange(-86_400 * 3, 86_400 * 30)
+        end = start + rng.randrange(0, 86_400 * 30)
+        count, total = index.totals_between(start, end)
+        expected_count, expected_total = scan(items, start, end)
+        assert (count, total) == (expected_count, expected_total)
+
+
+def test_daily_buckets_and_cumulative_sums():
+    items = records(subscriptions())
+    first = date(2024, 6, 1)
+    calendar = RenewalIndex.build(items).daily_totals(epoch_day(first), 10)
+
+    running = 0
+    for offset, bucket in enumerate(calendar):
+        day_start = datetime(2024, 6, 1, tzinfo=timezone.utc) + timedelta(days=offset)
+        count, total = scan(items, day_start.timestamp(), day_start.timestamp() + 86_399.999)
+        running += count
+        assert bucket.as_dict()["date"] == (first + timedelta(days=offset)).isoformat()
+        assert (bucket.count, bucket.total_amount_due) == (count, total)
+        assert bucket.cumulative_count == running
+    assert len(calendar) == 10
+
+
+def test_digest_calendar_and_portfolio_totals_are_exact_and_agree():
+    repository = StripeSubscriptionSnapshotRepository()
+    repository.save_snapshot(
+        KEY,
+        {
+            "customers": [],
+            "subscriptions": [
+                {
+                    "id": f"sub_{index}",
+                    "current_period_end": int((NOW + timedelta(hours=hours)).timestamp()),
+                    "amount_due": amount,
+                }
+                for index, (hours, amount) in enumerate(((20, 0.1), (21, 0.2), (22, 0.3)))
+            ],
+        },
+    )
+    analyzer = SubscriptionRenewalAnalyzer(clock=lambda: NOW)
+    service = RenewalDigestService(snapshot_repository=repository, analyzer=analyzer)
+
+    digest = service.build_digest(KEY, window_days=7)["upcoming"]
+    versioned = service.build_digest(KEY, window_days=7, version=1)["upcoming"]
+    calendar = service.build_calendar(KEY, days=7)
+    portfolio = PortfolioDigestService(repository, analyzer=analyzer).build_portfolio_digest(7)
+
+    assert 0.1 + 0.2 + 0.3 != 0.6
+    assert digest["total_amount_due"] == versioned["total_amount_due"] == 0.6
+    assert calendar["total_amount_due"] == 0.6
+    assert portfolio["windows"][0]["total_amount_due"] == 0.6
+
+
+@pytest.mark.parametrize("cents", [True, False])
+def test_digest_totals_match_an_exact_sum_of_the_listed_renewals(cents):
+    repository = StripeSubscriptionSnapshotRepository()
+    repository.save_snapshot(KEY, {"customers": [], "subscriptions": subscriptions(cents=cents)})
+    service = RenewalDigestService(
+        snapshot_repository=repository,
+        analyzer=SubscriptionRenewalAnalyzer(clock=lambda: NOW),
+    )
+
+    digest = service.build_digest(KEY, window_days=[1, 7, 30])
+
+    for result in digest["upcoming_windows"]:
+        listed = math.fsum(item["amount_due"] or 0.0 for item in result["upcoming_subscriptions"])
+        assert result["total_amount_due"] == listed
+
+
+def test_calendar_endpoint_buckets_and_revalidation():
+    repository = StripeSubscriptionSnapshotRepository()
+    repository.save_snapshot(KEY, {"customers": [], "subscriptions": subscriptions()})
+    service = RenewalDigestService(
+        snapshot_repository=repository,
+        analyzer=SubscriptionRenewalAnalyzer(clock=lambda: NOW),
+    )
+    main_module.app.dependency_overrides[main_module.get_digest_service] = lambda: service
+    try:
+        client = TestClient(main_module.app)
+        calendar = client.get(f"/calendar/{KEY}", params={"days": 14})
+        revalidated = client.get(
+            f"/calendar/{KEY}",
+            params={"days": 14},
+            headers={"If-None-Match": calendar.headers["ETag"]},
+        )
+        later = client.get(f"/calendar/{KEY}", params={"days": 14, "start": "2024-06-08"})
+        too_long = client.get(f"/calendar/{KEY}", params={"days": 5000})
+        missing = client.get("/calendar/sk_test_unknown")
+    finally:
+        main_module.app.dependency_overrides.pop(main_module.get_digest_service, None)
+
+    body = calendar.json()
+    assert body["start"] == "2024-06-01"
+    assert len(body["buckets"]) == 14
+    assert body["total_renewals"] == sum(bucket["count"] for bucket in body["buckets"])
+    assert body["buckets"][7] == {
+        **later.json()["buckets"][0],
+        "cumulative_count": body["buckets"][7]["cumulative_count"],
+        "cumulative_amount_due": body["buckets"][7]["cumulative_amount_due"],
+    }
+    assert revalidated.status_code == 304
+    assert later.headers["ETag"] != calendar.headers["ETag"]
+    assert too_long.status_code == 422
+    assert missing.json()["found_snapshot"] is False
+    assert missing.json()["buckets"] == []
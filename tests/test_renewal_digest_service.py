@@ -70,3 +70,32 @@ def test_build_digest_handles_missing_snapshot():
     assert upcoming["window_days"] == 7
     assert upcoming["total_amount_due"] == 0.0
     assert upcoming["upcoming_subscriptions"] == []
+
+
+def test_current_and_versioned_digests_agree_on_fractional_totals():
+    stripe_secret_key = "sk_test_fractional"
+    as_of = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+    snapshot_repository = StripeSubscriptionSnapshotRepository()
+    snapshot_repository.save_snapshot(
+        stripe_secret_key,
+        {
+            "customers": [],
+            "subscriptions": [
+                {
+                    "id": f"sub_{index}",
+                    "current_period_end": as_of + timedelta(days=day),
+                    "amount_due": amount,
+                }
+                for index, (day, amount) in enumerate(((-1, 0.1), (1, 0.2), (2, 0.3)))
+            ],
+        },
+    )
+    analyzer = SubscriptionRenewalAnalyzer(clock=lambda: as_of)
+    service = RenewalDigestService(snapshot_repository=snapshot_repository, analyzer=analyzer)
+
+    current = service.build_digest(stripe_secret_key, window_days=7)
+    versioned = service.build_digest(stripe_secret_key, window_days=7, version=1)
+
+    assert current["upcoming"]["total_amount_due"] == 0.5
+    assert current["upcoming"] == versioned["upcoming"]
@@ -0,0 +1,82 @@
+import random
+from array import array
+
+from app.services.ingestion import StripeSubscriptionSnapshotRepository
+from app.services.records import SubscriptionRecord
+from app.services.renewal_index import RenewalIndex
+
+START = 1_717_200_000
+
+
+class CountingRecords(tuple):
+    reads = 0
+
+    def __getitem__(self, index):
+        CountingRecords.reads += 1
+        return super().__getitem__(index)
+
+
+def linear(records, start, end):
+    return tuple(
+        record
+        for record in records
+        if isinstance(record, SubscriptionRecord)
+        and record.current_period_end is not None
+        and start <= record.current_period_end <= end
+    )
+
+
+def test_bisected_window_matches_a_full_scan_in_snapshot_order():
+    rng = random.Random(18)
+    records = [
+        SubscriptionRecord(f"sub_{index}", "active", START + rng.randrange(365) * 86_400, 10.0)
+        for index in range(500)
+    ]
+    records.insert(7, SubscriptionRecord("sub_no_period_end"))
+    index = RenewalIndex.build(records)
+
+    assert len(index) == 500
+    for days in (0, 1, 7, 30, 400):
+        start = START + 86_400 * rng.randrange(365)
+        end = start + days * 86_400
+        assert index.between(start, end) == linear(records, start, end)
+    boundary = records[0].current_period_end
+    assert records[0] in index.between(boundary, boundary)
+
+
+def test_window_query_only_touches_matching_records():
+    records = CountingRecords(
+        SubscriptionRecord(f"sub_{day}", "active", START + day * 86_400, 1.0)
+        for day in range(10_000)
+    )
+    period_ends = [record.current_period_end for record in records]
+    index = RenewalIndex(records, array("d", period_ends), array("q", range(len(records))))
+    CountingRecords.reads = 0
+
+    window = index.between(START + 100 * 86_400, START + 106 * 86_400)
+
+    assert [record.id for record in window] == [f"sub_{day}" for day in range(100, 107)]
+    assert CountingRecords.reads == 7
+
+
+def test_repository_builds_the_index_at_save_time():
+    repository = StripeSubscriptionSnapshotRepository()
+    repository.save_snapshot(
+        "sk_test_index",
+        {
+            "customers": [],
+            "subscriptions": [
+                {"id": "sub_late", "current_period_end": START + 20 * 86_400, "amount_due": 5},
+                {"id": "sub_soon", "current_period_end": START + 86_400, "amount_due": 7},
+            ],
+        },
+    )
+    snapshot = repository.get_snapshot("sk_test_index")
+
+    assert snapshot.has_renewal_index
+    assert [
+        record.id
+        for record in repository.subscriptions_renewing_between(
+            "sk_test_index", START, START + 7 * 86_400
+        )
+    ] == ["sub_soon"]
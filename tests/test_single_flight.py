@@ -0,0 +1,99 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.ingestion import (
+    IngestionService,
+    StripeCredentialRepository,
+    StripeSubscriptionSnapshotFetcher,
+    StripeSubscriptionSnapshotRepository,
+)
+from app.services.single_flight import SingleFlight
+
+
+def wait_for_followers(single_flight, key, count, timeout=5.0):
+    """Poll until `count` callers joined the flight for `key`; fail instead of hanging."""
+    deadline = time.monotonic() + timeout
+    while single_flight._flights[key].followers < count:
+        assert time.monotonic() < deadline, f"only {single_flight._flights[key].followers} joined"
+        time.sleep(0.001)
+
+
+def test_concurrent_callers_share_one_execution():
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(timeout=5)
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        leader = executor.submit(single_flight.do, "key", work)
+        assert started.wait(timeout=5)
+        followers = [executor.submit(single_flight.do, "key", work) for _ in range(2)]
+        wait_for_followers(single_flight, "key", 2)
+        release.set()
+
+    assert leader.result() == ("result", False)
+    assert [future.result() for future in followers] == [("result", True)] * 2
+    assert calls == [1]
+    assert single_flight.in_flight() == 0
+
+
+def test_errors_propagate_to_every_waiter_and_are_not_cached():
+    single_flight = SingleFlight()
+
+    def boom():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        single_flight.do("key", boom)
+
+    assert single_flight.do("key", lambda: 42) == (42, False)
+
+
+class BlockingSnapshotFetcher(StripeSubscriptionSnapshotFetcher):
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def fetch_subscription_snapshot(self, stripe_secret_key: str):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(timeout=5)
+        return {"customers": [], "subscriptions": [{"id": "sub_1"}]}
+
+
+def test_ingest_coalesces_concurrent_requests_for_same_key():
+    fetcher = BlockingSnapshotFetcher()
+    single_flight = SingleFlight()
+    services = [
+        IngestionService(
+            credential_repository=StripeCredentialRepository(),
+            metadata_fetcher=fetcher,
+            snapshot_repository=StripeSubscriptionSnapshotRepository(),
+            single_flight=single_flight,
+        )
+        for _ in range(2)
+    ]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(services[0].ingest, "sk_test_burst")
+        assert fetcher.started.wait(timeout=5)
+        second = executor.submit(services[1].ingest, "sk_test_burst")
+        wait_for_followers(
+            single_flight, StripeCredentialRepository._fingerprint("sk_test_burst"), 1
+        )
+        fetcher.release.set()
+
+    assert fetcher.calls == 1
+    assert first.result()["coalesced"] is False
+    assert second.result()["coalesced"] is True
+    assert second.result()["changes"] == first.result()["changes"]
@@ -10,7 +10,7 @@ class RecordingDigestService:
         self.digest = digest
         self.calls = []
 
-    def build_digest(self, stripe_secret_key: str, window_days: int):
+    def build_digest(self, stripe_secret_key: str, window_days: int, limit=None):
         self.calls.append((stripe_secret_key, window_days))
         return self.digest
 
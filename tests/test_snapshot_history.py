@@ -0,0 +1,175 @@
+from datetime import datetime, timedelta, timezone
+from itertools import count
+
+from fastapi.testclient import TestClient
+
+from app import main as main_module
+from app.services.digest import RenewalDigestService
+from app.services.ingestion import StripeSubscriptionSnapshotRepository
+from app.services.records import serialize_snapshot
+from app.services.renewals import SubscriptionRenewalAnalyzer
+from app.services.snapshot_diff import ResourceState, record_digest
+from app.services.snapshot_history import ResourceDelta
+
+START = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def daily_clock():
+    days = count()
+    return lambda: START + timedelta(days=next(days))
+
+
+def subscription(record_id, status="active", days=2, amount_due=100):
+    return {
+        "id": record_id,
+        "status": status,
+        "current_period_end": int((START + timedelta(days=days)).timestamp()),
+        "amount_due": amount_due,
+    }
+
+
+def save(repo, subscriptions, key="sk_test_history"):
+    repo.save_snapshot(key, {"customers": [], "subscriptions": subscriptions})
+
+
+def ids(snapshot):
+    return [record.id for record in snapshot["subscriptions"]]
+
+
+def test_past_versions_are_rebuilt_and_share_unchanged_records():
+    repo = StripeSubscriptionSnapshotRepository(clock=daily_clock())
+    save(repo, [subscription("sub_a"), subscription("sub_b"), subscription("sub_c")])
+    version_one = repo.get_snapshot("sk_test_history")
+    save(
+        repo,
+        [subscription("sub_a"), subscription("sub_b", status="past_due"), subscription("sub_d")],
+    )
+    save(repo, [subscription("sub_d"), subscription("sub_a")])
+
+    current = repo.get_snapshot("sk_test_history")
+    rebuilt_one = repo.get_snapshot("sk_test_history", version=1)
+    rebuilt_two = repo.get_snapshot("sk_test_history", version=2)
+
+    assert current.version == 3
+    assert serialize_snapshot(rebuilt_one) == serialize_snapshot(version_one)
+    assert rebuilt_one.states["subscriptions"] == version_one.states["subscriptions"]
+    assert ids(rebuilt_two) == ["sub_a", "sub_b", "sub_d"]
+    assert rebuilt_two["subscriptions"][1].status == "past_due"
+    # The record for sub_a never changed, so every version points at the same object.
+    assert rebuilt_one["subscriptions"][0] is current["subscriptions"][1]
+    assert repo.get_snapshot("sk_test_history", version=4) is None
+
+
+def digests(*records):
+    return b"".join(record_digest(record) for record in records)
+
+
+def test_reverse_delta_only_stores_churn():
+    older = ResourceState(
+        records=("a", "b", "c", "d"),
+        digests=digests("a", "b", "c", "d"),
+        positions={"a": 0, "b": 1, "c": 2, "d": 3},
+    )
+    newer = ResourceState(
+        records=("a", "b2", "d", "e"),
+        digests=digests("a", "b2", "d", "e"),
+        positions={"a": 0, "b": 1, "d": 2, "e": 3},
+    )
+
+    delta = ResourceDelta.between(older, newer)
+
+    assert delta.dropped == frozenset({"e"})
+    assert [key for _, key, _, _ in delta.restored] == ["b", "c"]
+    assert delta.order is None
+    assert delta.apply(newer) == older
+
+
+def test_reordered_survivors_keep_the_old_order():
+    older = ResourceState(
+        records=("a", "b"), digests=digests("a", "b"), positions={"a": 0, "b": 1}
+    )
+    newer = ResourceState(
+        records=("b", "a"), digests=digests("b", "a"), positions={"b": 0, "a": 1}
+    )
+
+    delta = ResourceDelta.between(older, newer)
+
+    assert delta.order == ("a", "b")
+    assert delta.apply(newer) == older
+
+
+def test_history_is_bounded_and_resolves_as_of():
+    repo = StripeSubscriptionSnapshotRepository(clock=daily_clock(), max_history_versions=3)
+    for index in range(5):
+        save(repo, [subscription(f"sub_{item}") for item in range(index + 1)])
+
+    versions = repo.list_snapshot_versions("sk_test_history")
+
+    assert [info.version for info in versions] == [5, 4, 3]
+    assert repo.get_snapshot("sk_test_history", version=2) is None
+    as_of = START + timedelta(days=3, hours=12)
+    assert repo.get_snapshot("sk_test_history", as_of=as_of).version == 4
+    assert repo.get_snapshot("sk_test_history", as_of=START) is None
+
+
+def test_time_travel_digest_uses_past_snapshot_and_window():
+    repo = StripeSubscriptionSnapshotRepository(clock=daily_clock())
+    save(repo, [subscription("sub_early", days=1, amount_due=300)])
+    save(repo, [subscription("sub_late", days=9, amount_due=700)])
+    service = RenewalDigestService(
+        snapshot_repository=repo,
+        analyzer=SubscriptionRenewalAnalyzer(clock=lambda: START + timedelta(days=5)),
+    )
+
+    past = service.build_digest("sk_test_history", as_of=START)
+    current = service.build_digest("sk_test_history")
+
+    assert past["snapshot_version"] == 1
+    assert past["upcoming"]["as_of"] == START.isoformat()
+    assert [item["id"] for item in past["upcoming"]["upcoming_subscriptions"]] == ["sub_early"]
+    assert current["snapshot_version"] == 2
+    assert [item["id"] for item in current["upcoming"]["upcoming_subscriptions"]] == [
+        "sub_late"
+    ]
+
+
+def test_version_endpoints_and_diff():
+    original_repository = main_module.snapshot_repository
+    main_module.snapshot_repository = StripeSubscriptionSnapshotRepository(clock=daily_clock())
+    try:
+        save(main_module.snapshot_repository, [subscription("sub_a"), subscription("sub_b")])
+        save(
+            main_module.snapshot_repository,
+            [subscription("sub_a", status="canceled"), subscription("sub_c")],
+        )
+        client = TestClient(main_module.app)
+
+        versions = client.get("/snapshots/sk_test_history/versions")
+        first = client.get("/snapshots/sk_test_history", params={"version": 1})
+        as_of = client.get(
+            "/snapshots/sk_test_history", params={"as_of": "2024-06-01T12:00:00"}
+        )
+        diff = client.get(
+            "/snapshots/sk_test_history/diff", params={"from_version": 1, "to_version": 2}
+        )
+        missing = client.get(
+            "/snapshots/sk_test_history/diff", params={"from_version": 1, "to_version": 9}
+        )
+    finally:
+        main_module.snapshot_repository = original_repository
+
+    assert [item["version"] for item in versions.json()["versions"]] == [2, 1]
+    assert versions.json()["versions"][1]["saved_at"] == START.isoformat()
+    assert first.json()["version"] == 1
+    assert [item["id"] for item in first.json()["subscription_snapshot"]["subscriptions"]] == [
+        "sub_a",
+        "sub_b",
+    ]
+    assert as_of.json()["version"] == 1
+    assert diff.json()["changes"]["subscriptions"] == {
+        "added": ["sub_c"],
+        "updated": ["sub_a"],
+        "removed": ["sub_b"],
+        "unchanged": 0,
+    }
+    assert missing.status_code == 404
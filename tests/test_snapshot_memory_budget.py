@@ -0,0 +1,157 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+from app import main as main_module
+from app.services.ingestion import (
+    StripeCredentialRepository,
+    StripeSubscriptionSnapshotRepository,
+)
+from app.services.records import serialize_snapshot
+from app.services.renewal_index import RenewalIndex
+from app.services import snapshot_cache
+from app.services.snapshot_cache import SnapshotCache, estimate_snapshot_size
+
+
+def account_payload(prefix, count=50):
+    return {
+        "customers": [{"id": f"cus_{prefix}_{index}"} for index in range(count)],
+        "subscriptions": [
+            {
+                "id": f"sub_{prefix}_{index}",
+                "status": "active",
+                "current_period_end": 1_700_000_000 + index,
+                "amount_due": 1000,
+            }
+            for index in range(count)
+        ],
+    }
+
+
+def fingerprint(key):
+    return StripeCredentialRepository._fingerprint(key)
+
+
+def test_cold_accounts_are_compressed_and_rehydrated_on_read():
+    probe = StripeSubscriptionSnapshotRepository()
+    probe.save_snapshot("sk_probe", account_payload("probe"))
+    account_size = estimate_snapshot_size(probe.get_snapshot("sk_probe"))
+
+    repo = StripeSubscriptionSnapshotRepository(memory_budget_bytes=int(account_size * 2.5))
+    for key in ("sk_first", "sk_second", "sk_third"):
+        repo.save_snapshot(key, account_payload(key))
+
+    stats = repo.memory_stats()
+    assert stats["resident_accounts"] == 2
+    assert stats["compressed_accounts"] == 1
+    assert stats["evictions"] == 1
+    cold = stats["accounts"][fingerprint("sk_first")]
+    assert cold["resident"] is False
+    assert 0 < cold["compressed_bytes"] < cold["resident_bytes"]
+
+    snapshot = repo.get_snapshot("sk_first")
+
+    assert serialize_snapshot(snapshot)["customers"] == account_payload("sk_first")["customers"]
+    assert [record.id for record in snapshot["subscriptions"]] == [
+        item["id"] for item in account_payload("sk_first")["subscriptions"]
+    ]
+    assert snapshot.version == 1
+    stats = repo.memory_stats()
+    assert stats["misses"] == 1
+    assert stats["accounts"][fingerprint("sk_first")]["resident"] is True
+    # Reading the first account pushed the least recently used one out instead.
+    assert stats["accounts"][fingerprint("sk_second")]["resident"] is False
+    assert repo.get_snapshot("sk_first") is snapshot
+    assert repo.memory_stats()["hits"] == 1
+
+
+def test_rehydrated_snapshot_still_diffs_against_new_ingest():
+    repo = StripeSubscriptionSnapshotRepository(memory_budget_bytes=1)
+    repo.save_snapshot("sk_first", account_payload("first", count=3))
+    repo.save_snapshot("sk_second", account_payload("second", count=3))
+    assert repo.memory_stats()["accounts"][fingerprint("sk_first")]["resident"] is False
+
+    changes = repo.save_snapshot("sk_first", account_payload("first", count=4))
+
+    assert changes.for_resource("subscriptions").added == ("sub_first_3",)
+    assert changes.for_resource("subscriptions").unchanged == 3
+    assert repo.get_snapshot_version("sk_first") == 2
+
+
+def test_rehydrated_snapshot_keeps_its_indexes(monkeypatch):
+    repo = StripeSubscriptionSnapshotRepository(memory_budget_bytes=1)
+    repo.save_snapshot("sk_first", account_payload("first", count=3))
+    expected = repo.get_snapshot("sk_first").renewal_index().between(0, 2_000_000_000)
+    repo.save_snapshot("sk_second", account_payload("second", count=3))
+    assert repo.memory_stats()["accounts"][fingerprint("sk_first")]["resident"] is False
+
+    def no_rebuild(subscriptions):
+        raise AssertionError("the renewal index was rebuilt")
+
+    monkeypatch.setattr(RenewalIndex, "build", staticmethod(no_rebuild))
+    snapshot = repo.get_snapshot("sk_first")
+
+    assert snapshot.has_renewal_index
+    assert snapshot.has_customer_index
+    assert snapshot.renewal_index().between(0, 2_000_000_000) == expected
+    assert snapshot.customer_index().get("cus_first_1").id == "cus_first_1"
+
+
+def test_compression_does_not_block_reads_of_other_accounts(monkeypatch):
+    repo = StripeSubscriptionSnapshotRepository()
+    for key in ("sk_cold", "sk_warm", "sk_hot"):
+        repo.save_snapshot(key, account_payload(key))
+    account_size = estimate_snapshot_size(repo.get_snapshot("sk_cold"))
+    cache = SnapshotCache(budget_bytes=int(account_size * 2.5))
+    for key in ("sk_cold", "sk_warm"):
+        cache.put(fingerprint(key), repo.get_snapshot(key))
+    compressing, release = threading.Event(), threading.Event()
+    compress = snapshot_cache._compress
+
+    def slow_compress(snapshot, level):
+        compressing.set()
+        assert release.wait(5)
+        return compress(snapshot, level)
+
+    monkeypatch.setattr(snapshot_cache, "_compress", slow_compress)
+    writer = threading.Thread(
+        target=cache.put, args=(fingerprint("sk_hot"), repo.get_snapshot("sk_hot"))
+    )
+    writer.start()
+    try:
+        assert compressing.wait(5)
+        assert cache.get(fingerprint("sk_warm")) is repo.get_snapshot("sk_warm")
+        assert cache.stats()["evictions"] == 1
+    finally:
+        release.set()
+        writer.join(5)
+    assert cache.stats()["accounts"][fingerprint("sk_cold")]["compressed_bytes"] > 0
+
+
+def test_single_snapshot_over_budget_stays_resident():
+    cache = SnapshotCache(budget_bytes=1)
+    repo = StripeSubscriptionSnapshotRepository()
+    repo.save_snapshot("sk_only", account_payload("only", count=2))
+    cache.put(fingerprint("sk_only"), repo.get_snapshot("sk_only"))
+
+    assert cache.stats()["resident_accounts"] == 1
+    assert cache.get(fingerprint("sk_only")) is repo.get_snapshot("sk_only")
+
+
+def test_memory_stats_endpoint_reports_per_account_sizes():
+    original_repository = main_module.snapshot_repository
+    main_module.snapshot_repository = StripeSubscriptionSnapshotRepository(memory_budget_bytes=1)
+    try:
+        main_module.snapshot_repository.save_snapshot("sk_a", account_payload("a", count=2))
+        main_module.snapshot_repository.save_snapshot("sk_b", account_payload("b", count=2))
+        response = TestClient(main_module.app).get("/memory/snapshots")
+    finally:
+        main_module.snapshot_repository = original_repository
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["budget_bytes"] == 1
+    assert body["accounts"][fingerprint("sk_a")]["resident"] is False
+    assert body["accounts"][fingerprint("sk_a")]["compressed_bytes"] > 0
+    assert body["accounts"][fingerprint("sk_b")]["resident"] is True
+
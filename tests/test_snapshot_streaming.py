@@ -0,0 +1,207 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main as main_module
+from app.services.ingestion import StripeSubscriptionSnapshotRepository
+from app.services.records import SubscriptionRecord, serialize_record
+from app.services.snapshot_pages import (
+    InvalidCursorError,
+    PagedVersionCache,
+    SnapshotCursor,
+    parse_fields,
+)
+
+KEY = "sk_test_stream"
+
+
+def save(repository, subscription_count, customer_count=2):
+    repository.save_snapshot(
+        KEY,
+        {
+            "customers": [{"id": f"cus_{index}"} for index in range(customer_count)],
+            "subscriptions": [
+                {
+                    "id": f"sub_{index}",
+                    "status": "active",
+                    "current_period_end": 1_700_000_000 + index,
+                    "amount_due": 100 + index,
+                }
+                for index in range(subscription_count)
+            ],
+        },
+    )
+
+
+@pytest.fixture
+def client():
+    original_repository = main_module.snapshot_repository
+    main_module.snapshot_repository = StripeSubscriptionSnapshotRepository()
+    try:
+        yield TestClient(main_module.app)
+    finally:
+        main_module.snapshot_repository = original_repository
+
+
+def test_cursor_round_trips_and_rejects_garbage():
+    cursor = SnapshotCursor(version=3, resource="subscriptions", offset=40)
+
+    assert SnapshotCursor.decode(cursor.encode()) == cursor
+    for token in ("not-a-cursor", "", SnapshotCursor(1, "subscriptions", 0).encode()[:-2]):
+        with pytest.raises(InvalidCursorError):
+            SnapshotCursor.decode(token)
+
+
+def test_field_projection_reads_compact_records():
+    record = SubscriptionRecord("sub_1", "active", 1_700_000_000, 12.0)
+
+    assert parse_fields(" id, current_period_end ,id") == ("id", "current_period_end")
+    assert parse_fields(",") is None
+    assert serialize_record(record, ("id", "current_period_end", "raw")) == {
+        "id": "sub_1",
+        "current_period_end": 1_700_000_000,
+    }
+    assert serialize_record({"id": "cus_1", "email": "a@b"}, ("id",)) == {"id": "cus_1"}
+
+
+def test_pages_walk_every_resource_and_stay_on_their_version(client):
+    save(main_module.snapshot_repository, subscription_count=5)
+
+    pages = []
+    params = {"limit": 3, "fields": "id"}
+    while True:
+        page = client.get(f"/snapshots/{KEY}", params=params).json()
+        pages.append(page)
+        if page["next_cursor"] is None:
+            break
+        params = {"limit": 3, "fields": "id", "cursor": page["next_cursor"]}
+        # Ingesting mid-walk must not shift the remaining pages.
+        save(main_module.snapshot_repository, subscription_count=1, customer_count=0)
+
+    seen = [
+        (resource, record["id"])
+        for page in pages
+        for resource, records in page["subscription_snapshot"].items()
+        for record in records
+    ]
+    assert [page["version"] for page in pages] == [1, 1, 1]
+    assert seen == [("customers", "cus_0"), ("customers", "cus_1")] + [
+        ("subscriptions", f"sub_{index}") for index in range(5)
+    ]
+    assert pages[0]["subscription_snapshot"]["subscriptions"] == [{"id": "sub_0"}]
+
+
+def test_paging_a_past_version_rebuilds_it_once(client):
+    repository = main_module.snapshot_repository
+    save(repository, subscription_count=5)
+    save(repository, subscription_count=1, customer_count=0)
+    rebuilds = []
+    get_snapshot = repository.get_snapshot
+    repository.get_snapshot = lambda key, **kwargs: rebuilds.append(kwargs) or get_snapshot(
+        key, **kwargs
+    )
+
+    params = {"limit": 2, "version": 1}
+    pages = 0
+    while params:
+        page = client.get(f"/snapshots/{KEY}", params=params).json()
+        pages += 1
+        params = page["next_cursor"] and {"limit": 2, "cursor": page["next_cursor"]}
+
+    assert pages == 4
+    assert rebuilds == [{"version": 1}]
+
+
+def test_paged_versions_are_dropped_once_idle():
+    now = [0.0]
+    cache = PagedVersionCache(max_entries=2, idle_seconds=60, clock=lambda: now[0])
+    builds = []
+
+    def build(name):
+        return lambda: builds.append(name) or name
+
+    cache.get_or_build(("fp", 1), build("v1"))
+    now[0] = 50
+    assert cache.get_or_build(("fp", 1), build("v1")) == "v1"
+    cache.get_or_build(("fp", 2), build("v2"))
+    now[0] = 100
+    assert len(cache) == 2
+    cache.get_or_build(("fp", 2), build("v2"))
+    now[0] = 111
+    cache.get_or_build(("fp", 3), build("v3"))
+
+    assert builds == ["v1", "v2", "v3"]
+    assert len(cache) == 2
+    cache.get_or_build(("fp", 1), build("v1"))
+    assert builds == ["v1", "v2", "v3", "v1"]
+
+
+def test_invalid_and_expired_cursors(client):
+    repository = StripeSubscriptionSnapshotRepository(max_history_versions=1)
+    main_module.snapshot_repository = repository
+    save(repository, subscription_count=3)
+    cursor = client.get(f"/snapshots/{KEY}", params={"limit": 1}).json()["next_cursor"]
+    foreign = SnapshotCursor(version=1, resource="invoices", offset=0).encode()
+
+    assert client.get(f"/snapshots/{KEY}", params={"cursor": "garbage"}).status_code == 400
+    assert client.get(f"/snapshots/{KEY}", params={"cursor": foreign}).status_code == 400
+    assert (
+        client.get(f"/snapshots/{KEY}", params={"cursor": cursor, "version": 2}).status_code
+        == 400
+    )
+    save(repository, subscription_count=4)
+    assert client.get(f"/snapshots/{KEY}", params={"cursor": cursor}).status_code == 410
+
+
+def test_ndjson_streams_projected_records_and_resume_cursor(client):
+    save(main_module.snapshot_repository, subscription_count=4)
+
+    streamed = client.get(
+        f"/snapshots/{KEY}", params={"format": "ndjson", "fields": "id,current_period_end"}
+    )
+    limited = client.get(f"/snapshots/{KEY}", params={"format": "ndjson", "limit": 3})
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    limited_lines = [json.loads(line) for line in limited.text.splitlines()]
+    resumed = client.get(
+        f"/snapshots/{KEY}",
+        params={"format": "ndjson", "cursor": limited_lines[-1]["next_cursor"]},
+    )
+
+    assert streamed.headers["content-type"].startswith("application/x-ndjson")
+    assert "ETag" in streamed.headers
+    assert len(lines) == 6
+    assert lines[2] == {
+        "resource": "subscriptions",
+        "record": {"id": "sub_0", "current_period_end": 1_700_000_000},
+    }
+    assert len(limited_lines) == 4
+    assert [json.loads(line)["record"]["id"] for line in resumed.text.splitlines()] == [
+        "sub_1",
+        "sub_2",
+        "sub_3",
+    ]
+
+
+def test_etag_covers_projection_and_paging(client):
+    save(main_module.snapshot_repository, subscription_count=2)
+
+    full = client.get(f"/snapshots/{KEY}")
+    projected = client.get(
+        f"/snapshots/{KEY}",
+        params={"fields": "id"},
+        headers={"If-None-Match": full.headers["ETag"]},
+    )
+    revalidated = client.get(
+        f"/snapshots/{KEY}",
+        params={"fields": "id"},
+        headers={"If-None-Match": projected.headers["ETag"]},
+    )
+
+    assert "next_cursor" not in full.json()
+    assert projected.status_code == 200
+    assert projected.json()["subscription_snapshot"]["subscriptions"] == [
+        {"id": "sub_0"},
+        {"id": "sub_1"},
+    ]
+    assert revalidated.status_code == 304
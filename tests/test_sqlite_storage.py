@@ -0,0 +1,238 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.digest import RenewalDigestService
+from app.services.records import SubscriptionRecord, serialize_snapshot
+from app.services.renewals import SubscriptionRenewalAnalyzer
+from app.services.sqlite_storage import (
+    SQLiteDatabase,
+    SQLiteSlackWebhookRepository,
+    SQLiteStripeCredentialRepository,
+    SQLiteSubscriptionSnapshotRepository,
+)
+
+AS_OF = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    return str(tmp_path / "autobot.sqlite3")
+
+
+def reopen(database_path):
+    database = SQLiteDatabase(database_path)
+    return database, SQLiteSubscriptionSnapshotRepository(database)
+
+
+def subscription(record_id, days, amount_due=100):
+    return {
+        "id": record_id,
+        "status": "active",
+        "current_period_end": int((AS_OF + timedelta(days=days)).timestamp()),
+        "amount_due": amount_due,
+    }
+
+
+def test_database_uses_write_ahead_logging(database_path):
+    database = SQLiteDatabase(database_path)
+    try:
+        mode = database.connection().execute("PRAGMA journal_mode").fetchone()[0]
+    finally:
+        database.close()
+
+    assert mode == "wal"
+
+
+def test_credentials_and_webhooks_survive_restart(database_path):
+    first_seen = AS_OF
+    database = SQLiteDatabase(database_path)
+    SQLiteStripeCredentialRepository(database, clock=lambda: first_seen).save_stripe_secret_key(
+        "sk_test_persist"
+    )
+    SQLiteSlackWebhookRepository(database, clock=lambda: first_seen).configure_webhook(
+        "sk_test_persist", "https://hooks.slack.com/services/initial"
+    )
+    database.close()
+
+    later = first_seen + timedelta(hours=1)
+    database = SQLiteDatabase(database_path)
+    try:
+        credentials = SQLiteStripeCredentialRepository(database, clock=lambda: later)
+        webhooks = SQLiteSlackWebhookRepository(database, clock=lambda: later)
+        credentials.save_stripe_secret_key("sk_test_persist")
+        webhooks.configure_webhook("sk_test_persist", "https://hooks.slack.com/services/updated")
+
+        [credential] = credentials.list_credentials()
+        webhook = webhooks.get_webhook("sk_test_persist")
+    finally:
+        database.close()
+
+    assert credential.created_at == first_seen
+    assert credential.last_ingested_at == later
+    assert webhook.webhook_url == "https://hooks.slack.com/services/updated"
+    assert webhook.created_at == first_seen
+    assert webhook.last_configured_at == later
+
+
+def test_snapshot_is_reloaded_after_restart(database_path):
+    payload = {
+        "customers": [{"id": "cus_1", "email": "a@example.com"}],
+        "subscriptions": [subscription("sub_1", 2), subscription("sub_2", 20)],
+    }
+    database, repo = reopen(database_path)
+    repo.save_snapshot("sk_test_reload", payload)
+    database.close()
+
+    database, repo = reopen(database_path)
+    try:
+        snapshot = repo.get_snapshot("sk_test_reload")
+        assert snapshot.version == 1
+        assert snapshot["subscriptions"] == tuple(
+            SubscriptionRecord.from_stripe(item) for item in payload["subscriptions"]
+        )
+        assert serialize_snapshot(snapshot)["customers"] == payload["customers"]
+        assert list(repo.list_snapshots()) == [snapshot.fingerprint]
+        assert [item.version for item in repo.iter_snapshots()] == [snapshot.version]
+
+        changes = repo.save_snapshot("sk_test_reload", payload)
+        assert changes.skipped is True
+    finally:
+        database.close()
+
+
+def test_save_writes_only_changed_rows(database_path):
+    database, repo = reopen(database_path)
+    try:
+        repo.save_snapshot(
+            "sk_test_delta",
+            {
+                "customers": [],
+                "subscriptions": [subscription("sub_1", 2), subscription("sub_2", 3)],
+            },
+        )
+        connection = database.connection()
+        before = connection.total_changes
+
+        repo.save_snapshot(
+            "sk_test_delta",
+            {
+                "customers": [],
+                "subscriptions": [subscription("sub_1", 2), subscription("sub_2", 4)],
+            },
+        )
+
+        # One record row replaced, the snapshot header row and the commit sequence.
+        assert connection.total_changes - before == 3
+    finally:
+        database.close()
+
+    database, repo = reopen(database_path)
+    try:
+        snapshot = repo.get_snapshot("sk_test_delta")
+        assert snapshot.version == 2
+        assert [record.id for record in snapshot["subscriptions"]] == ["sub_1", "sub_2"]
+    finally:
+        database.close()
+
+
+def test_only_other_processes_commits_count_as_external_changes(database_path):
+    database, repo = reopen(database_path)
+    sibling_database, sibling = reopen(database_path)
+    try:
+        database.changed_since_last_check()
+        writer = threading.Thread(
+            target=repo.save_snapshot,
+            args=("sk_test_threads", {"customers": [], "subscriptions": []}),
+        )
+        writer.start()
+        writer.join(5)
+
+        # Another thread's connection moved `data_version`, but the commit was ours.
+        assert not database.changed_since_last_check()
+
+        sibling.save_snapshot("sk_test_threads", {"customers": [{"id": "cus_1"}]})
+
+        assert database.changed_since_last_check()
+        assert not database.changed_since_last_check()
+    finally:
+        database.close()
+        sibling_database.close()
+
+
+def test_renewal_window_digest_after_restart(database_path):
+    database, repo = reopen(database_path)
+    try:
+        repo.save_snapshot(
+            "sk_test_window",
+            {
+                "customers": [],
+                "subscriptions": [
+                    subscription("sub_soon", 2, amount_due=500),
+                    subscription("sub_later", 10, amount_due=900),
+                ],
+            },
+        )
+    finally:
+        database.close()
+
+    database, repo = reopen(database_path)
+    try:
+        analyzer = SubscriptionRenewalAnalyzer(clock=lambda: AS_OF)
+        digest = RenewalDigestService(snapshot_repository=repo, analyzer=analyzer).build_digest(
+            "sk_test_window", window_days=7
+        )
+    finally:
+        database.close()
+
+    assert digest["subscription_count"] == 2
+    assert [item["id"] for item in digest["upcoming"]["upcoming_subscriptions"]] == ["sub_soon"]
+    assert digest["upcoming"]["total_amount_due"] == 500.0
+
+
+def test_digest_of_an_unloaded_account_range_scans_the_period_end_index(database_path):
+    database, repo = reopen(database_path)
+    try:
+        repo.save_snapshot(
+            "sk_test_scan",
+            {
+                "customers": [{"id": "cus_1", "email": "one@example.com"}],
+                "subscriptions": [
+                    dict(subscription("sub_soon", 2, amount_due=500), customer="cus_1"),
+                    subscription("sub_later", 10, amount_due=900),
+                ],
+            },
+        )
+    finally:
+        database.close()
+
+    database, repo = reopen(database_path)
+    try:
+        plan = " ".join(
+            str(row[-1])
+            for row in database.connection().execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM snapshot_records "
+                "WHERE fingerprint = ? AND resource = 'subscriptions' "
+                "AND current_period_end BETWEEN ? AND ?",
+                ("fp", 0, 1),
+            )
+        )
+        repo._load = None  # Any attempt to load the whole snapshot would fail.
+        analyzer = SubscriptionRenewalAnalyzer(clock=lambda: AS_OF)
+        digest = RenewalDigestService(snapshot_repository=repo, analyzer=analyzer).build_digest(
+            "sk_test_scan", window_days=7
+        )
+        renewing = repo.subscriptions_renewing_between(
+            "sk_test_scan", AS_OF.timestamp(), (AS_OF + timedelta(days=30)).timestamp()
+        )
+    finally:
+        database.close()
+
+    assert "snapshot_records_by_period_end" in plan
+    assert digest["snapshot_version"] == 1
+    assert (digest["subscription_count"], digest["customer_count"]) == (2, 1)
+    [item] = digest["upcoming"]["upcoming_subscriptions"]
+    assert item["id"] == "sub_soon"
+    assert item["customer"]["email"] == "one@example.com"
+    assert [record.id for record in renewing] == ["sub_soon", "sub_later"]
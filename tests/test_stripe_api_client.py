@@ -0,0 +1,101 @@
+import httpx
+import pytest
+
+from app.services.ingestion import (
+    IngestionService,
+    StripeAPIClient,
+    StripeAPIError,
+    StripeCredentialRepository,
+    StripeSubscriptionSnapshotFetcher,
+    StripeSubscriptionSnapshotRepository,
+)
+from app.services.records import serialize_snapshot
+
+
+def build_paginated_handler(records_by_resource, requests):
+    def handler(request: httpx.Request) -> httpx.Response:
+        resource = request.url.path.rsplit("/", 1)[-1]
+        requests.append((resource, dict(request.url.params), request.headers["Authorization"]))
+        records = records_by_resource[resource]
+        limit = int(request.url.params["limit"])
+        starting_after = request.url.params.get("starting_after")
+        start = 0
+        if starting_after is not None:
+            start = next(i for i, item in enumerate(records) if item["id"] == starting_after) + 1
+        page = records[start : start + limit]
+        return httpx.Response(
+            status_code=200,
+            json={"object": "list", "data": page, "has_more": start + limit < len(records)},
+        )
+
+    return handler
+
+
+def test_iter_pages_walks_starting_after_pagination():
+    subscriptions = [{"id": f"sub_{index}"} for index in range(5)]
+    requests = []
+    transport = httpx.MockTransport(
+        build_paginated_handler({"subscriptions": subscriptions}, requests)
+    )
+
+    with httpx.Client(transport=transport) as http_client:
+        client = StripeAPIClient(client=http_client, page_size=2)
+        pages = list(client.iter_pages("sk_test_pages", "subscriptions"))
+
+    assert pages == [subscriptions[0:2], subscriptions[2:4], subscriptions[4:5]]
+    assert [params.get("starting_after") for _, params, _ in requests] == [
+        None,
+        "sub_1",
+        "sub_3",
+    ]
+    assert all(auth == "Bearer sk_test_pages" for _, _, auth in requests)
+
+
+def test_record_streams_are_lazy_until_consumed():
+    requests = []
+    transport = httpx.MockTransport(
+        build_paginated_handler({"customers": [], "subscriptions": []}, requests)
+    )
+
+    with httpx.Client(transport=transport) as http_client:
+        client = StripeAPIClient(client=http_client)
+        streams = client.fetch_customer_and_subscription_data("sk_test_lazy")
+        assert requests == []
+        assert list(streams["customers"]) == []
+
+    assert [resource for resource, _, _ in requests] == ["customers"]
+
+
+def test_ingest_streams_every_page_into_snapshot_repository():
+    records = {
+        "customers": [{"id": f"cus_{index}"} for index in range(3)],
+        "subscriptions": [{"id": f"sub_{index}"} for index in range(7)],
+    }
+    requests = []
+    transport = httpx.MockTransport(build_paginated_handler(records, requests))
+    snapshot_repository = StripeSubscriptionSnapshotRepository()
+
+    with httpx.Client(transport=transport) as http_client:
+        service = IngestionService(
+            credential_repository=StripeCredentialRepository(),
+            metadata_fetcher=StripeSubscriptionSnapshotFetcher(
+                client=StripeAPIClient(client=http_client, page_size=3)
+            ),
+            snapshot_repository=snapshot_repository,
+        )
+        result = service.ingest("sk_test_stream")
+
+    assert result["changes"]["subscriptions"]["added"] == 7
+    assert serialize_snapshot(snapshot_repository.get_snapshot("sk_test_stream")) == records
+    assert len(requests) == 1 + 3
+
+
+def test_error_response_raises_stripe_api_error():
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(status_code=401, json={"error": "invalid key"})
+    )
+
+    with httpx.Client(transport=transport) as http_client:
+        client = StripeAPIClient(client=http_client)
+        with pytest.raises(StripeAPIError):
+            list(client.iter_records("sk_test_invalid", "customers"))
@@ -0,0 +1,43 @@
+from app.services.rate_limit import StripeRateLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_queues_reservations_once_burst_is_spent():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, capacity=2.0, clock=clock)
+
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.5
+    assert bucket.reserve() == 1.0
+
+    clock.now = 1.0
+    assert bucket.reserve() == 0.5
+
+
+def test_rate_limiter_applies_per_account_and_global_limits():
+    clock = FakeClock()
+    sleeps = []
+    limiter = StripeRateLimiter(
+        global_rate=4.0,
+        per_account_rate=1.0,
+        clock=clock,
+        sleep=sleeps.append,
+    )
+
+    assert limiter.acquire("sk_test_a") == 0.0
+    # Second call for the same account waits on its own bucket.
+    assert limiter.acquire("sk_test_a") == 1.0
+    # Other accounts only contend for the global bucket.
+    assert limiter.acquire("sk_test_b") == 0.0
+    assert limiter.acquire("sk_test_c") == 0.0
+    assert limiter.acquire("sk_test_d") == 0.25
+
+    assert sleeps == [1.0, 0.25]
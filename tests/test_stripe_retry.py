@@ -0,0 +1,152 @@
+import httpx
+import pytest
+
+from app.services.ingestion import (
+    IngestionService,
+    StripeAPIClient,
+    StripeAPIError,
+    StripeCredentialRepository,
+    StripeSubscriptionSnapshotFetcher,
+    StripeSubscriptionSnapshotRepository,
+)
+from app.services.retry import RetryPolicy, parse_retry_after
+from app.services.stripe_async import AsyncStripeAPIClient
+
+
+def build_flaky_handler(failures, requests):
+    """Serve two subscription pages; `failures` maps a cursor to responses to fail with first."""
+    subscriptions = [{"id": "sub_1"}, {"id": "sub_2"}]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        resource = request.url.path.rsplit("/", 1)[-1]
+        starting_after = request.url.params.get("starting_after")
+        requests.append((resource, starting_after))
+        pending = failures.get((resource, starting_after))
+        if pending:
+            return pending.pop(0)
+        if resource == "customers":
+            return httpx.Response(200, json={"data": [], "has_more": False})
+        if starting_after is None:
+            return httpx.Response(200, json={"data": subscriptions[:1], "has_more": True})
+        return httpx.Response(200, json={"data": subscriptions[1:], "has_more": False})
+
+    return handler
+
+
+def test_failed_page_is_retried_alone_and_reported_in_ingest_result():
+    requests = []
+    sleeps = []
+    failures = {
+        ("subscriptions", "sub_1"): [
+            httpx.Response(429, headers={"Retry-After": "2"}, json={}),
+            httpx.Response(503, json={}),
+        ]
+    }
+    transport = httpx.MockTransport(build_flaky_handler(failures, requests))
+    policy = RetryPolicy(base_delay=0.5, jitter=lambda low, high: high)
+
+    with httpx.Client(transport=transport) as http_client:
+        api_client = StripeAPIClient(
+            client=http_client, retry_policy=policy, sleep=sleeps.append
+        )
+        service = IngestionService(
+            credential_repository=StripeCredentialRepository(),
+            metadata_fetcher=StripeSubscriptionSnapshotFetcher(client=api_client),
+            snapshot_repository=StripeSubscriptionSnapshotRepository(),
+        )
+        result = service.ingest("sk_test_retry")
+
+    # Listings are drained concurrently, so only the order within one listing is fixed.
+    assert [request for request in requests if request[0] == "customers"] == [
+        ("customers", None)
+    ]
+    assert [request for request in requests if request[0] == "subscriptions"] == [
+        ("subscriptions", None),
+        ("subscriptions", "sub_1"),
+        ("subscriptions", "sub_1"),
+        ("subscriptions", "sub_1"),
+    ]
+    # Retry-After wins on the 429, then jittered backoff for the second attempt.
+    assert sleeps == [2.0, 1.0]
+    assert result["fetch"] == {
+        "requests": 5,
+        "retries": 2,
+        "retry_wait_seconds": 3.0,
+        "rate_limit_wait_seconds": 0.0,
+    }
+    assert result["changes"]["subscriptions"]["added"] == 2
+
+
+def test_non_retryable_errors_fail_immediately():
+    requests = []
+    failures = {
+        ("customers", None): [
+            httpx.Response(400, json={}),
+        ]
+    }
+    transport = httpx.MockTransport(build_flaky_handler(failures, requests))
+
+    with httpx.Client(transport=transport) as http_client:
+        api_client = StripeAPIClient(client=http_client, sleep=lambda delay: None)
+        with pytest.raises(StripeAPIError):
+            list(api_client.iter_records("sk_test_bad", "customers"))
+
+    assert requests == [("customers", None)]
+
+
+def test_retry_policy_respects_stripe_should_retry_and_attempt_cap():
+    policy = RetryPolicy(max_attempts=3, jitter=lambda low, high: high)
+
+    assert policy.delay_after_response(httpx.Response(500), attempt=0) == 0.5
+    assert policy.delay_after_response(httpx.Response(500), attempt=2) is None
+    assert (
+        policy.delay_after_response(
+            httpx.Response(503, headers={"Stripe-Should-Retry": "false"}), attempt=0
+        )
+        is None
+    )
+    assert (
+        policy.delay_after_response(
+            httpx.Response(400, headers={"Stripe-Should-Retry": "true"}), attempt=0
+        )
+        == 0.5
+    )
+    assert policy.backoff(10) == policy.max_delay
+
+
+def test_retry_after_is_honoured_beyond_the_backoff_cap():
+    policy = RetryPolicy(max_delay=30.0, max_retry_after=600.0)
+    throttled = httpx.Response(429, headers={"Retry-After": "120"})
+
+    assert policy.delay_after_response(throttled, attempt=0) == 120.0
+    assert RetryPolicy(max_retry_after=60.0).delay_after_response(throttled, attempt=0) == 60.0
+
+
+def test_parse_retry_after_accepts_seconds_and_http_dates():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_async_client_retries_throttled_page():
+    requests = []
+    failures = {
+        ("subscriptions", None): [httpx.Response(429, headers={"Retry-After": "0"}, json={})]
+    }
+    sync_handler = build_flaky_handler(failures, requests)
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return sync_handler(request)
+
+    client = AsyncStripeAPIClient(transport=httpx.MockTransport(handler))
+    try:
+        streams = client.fetch_customer_and_subscription_data("sk_test_async_retry")
+        subscriptions = list(streams["subscriptions"])
+        list(streams["customers"])
+    finally:
+        client.close()
+
+    assert [item["id"] for item in subscriptions] == ["sub_1", "sub_2"]
+    assert streams["subscriptions"].fetch_stats.retries == 1
+    assert streams["subscriptions"].fetch_stats.requests == 3
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from app import main as main_module
+from app.services.ingestion import StripeSubscriptionSnapshotRepository
+from app.services.records import SubscriptionRecord, serialize_snapshot
+from app.services.renewals import SubscriptionRenewalAnalyzer
+
+
+def test_from_stripe_normalizes_timestamps_and_amounts():
+    record = SubscriptionRecord.from_stripe(
+        {
+            "id": "sub_123",
+            "status": "active",
+            "current_period_end": "2024-06-05T12:00:00Z",
+            "amount_due": "1200.50",
+            "items": {"data": [{"id": "si_1"}]},
+        }
+    )
+
+    assert record.current_period_end == 1717588800
+    assert record.amount_due == 1200.5
+    assert record.raw is None
+    assert not hasattr(record, "__dict__")
+    assert record.as_dict() == {
+        "id": "sub_123",
+        "status": "active",
+        "current_period_end": 1717588800,
+        "amount_due": 1200.5,
+    }
+
+
+def test_repository_keeps_raw_payload_only_when_configured():
+    payload = {"id": "sub_raw", "status": "active", "metadata": {"plan": "pro"}}
+
+    compact_repo = StripeSubscriptionSnapshotRepository()
+    compact_repo.save_snapshot("sk_test_raw", {"subscriptions": [payload]})
+    raw_repo = StripeSubscriptionSnapshotRepository(keep_raw_payloads=True)
+    raw_repo.save_snapshot("sk_test_raw", {"subscriptions": [payload]})
+
+    compact = compact_repo.get_snapshot("sk_test_raw")["subscriptions"][0]
+    raw = raw_repo.get_snapshot("sk_test_raw")["subscriptions"][0]
+
+    assert isinstance(compact, SubscriptionRecord)
+    assert compact.raw is None
+    assert raw.raw == payload
+    assert serialize_snapshot(raw_repo.get_snapshot("sk_test_raw")) == {
+        "subscriptions": [payload]
+    }
+
+
+def test_analyzer_reads_compact_records_without_parsing(monkeypatch):
+    as_of = datetime(2024, 6, 1, tzinfo=timezone.utc)
+    analyzer = SubscriptionRenewalAnalyzer(clock=lambda: as_of)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("compact records should not be re-parsed")
+
+    monkeypatch.setattr(SubscriptionRenewalAnalyzer, "_parse_period_end", staticmethod(fail))
+    monkeypatch.setattr(SubscriptionRenewalAnalyzer, "_coerce_amount", staticmethod(fail))
+
+    records = [
+        SubscriptionRecord(
+            id="sub_due",
+            status="active",
+            current_period_end=int((as_of + timedelta(days=2)).timestamp()),
+            amount_due=99.0,
+        ),
+        SubscriptionRecord(
+            id="sub_later",
+            current_period_end=int((as_of + timedelta(days=30)).timestamp()),
+            amount_due=10.0,
+        ),
+        SubscriptionRecord(id="sub_without_period"),
+    ]
+
+    result = analyzer.find_upcoming(records, window_days=7)
+
+    assert result["total_amount_due"] == 99.0
+    assert result["upcoming_subscriptions"] == [
+        {
+            "id": "sub_due",
+            "current_period_end": "2024-06-03T00:00:00+00:00",
+            "status": "active",
+            "amount_due": 99.0,
+        }
+    ]
+
+
+def test_snapshot_endpoint_reports_the_record_format_it_returns():
+    payload = {"id": "sub_raw", "status": "active", "current_period_end": "2024-06-05T12:00:00Z"}
+    original_repository = main_module.snapshot_repository
+    client = TestClient(main_module.app)
+    try:
+        main_module.snapshot_repository = StripeSubscriptionSnapshotRepository(
+            keep_raw_payloads=main_module.keep_raw_payloads
+        )
+        main_module.snapshot_repository.save_snapshot("sk_test_shape", {"subscriptions": [payload]})
+        compact = client.get("/snapshots/sk_test_shape").json()
+        main_module.snapshot_repository = StripeSubscriptionSnapshotRepository(
+            keep_raw_payloads=True
+        )
+        main_module.snapshot_repository.save_snapshot("sk_test_shape", {"subscriptions": [payload]})
+        raw = client.get("/snapshots/sk_test_shape").json()
+    finally:
+        main_module.snapshot_repository = original_repository
+
+    assert raw["record_format"] == "raw"
+    assert raw["subscription_snapshot"] == {"subscriptions": [payload]}
+    assert compact["record_format"] == "compact"
+    assert compact["subscription_snapshot"]["subscriptions"][0]["current_period_end"] == 1717588800
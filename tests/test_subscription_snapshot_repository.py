@@ -1,9 +1,13 @@
 import hashlib
+import threading
+import time
 
-from app.services.ingestion import StripeSubscriptionSnapshotRepository
+import pytest
 
+from app.services.ingestion import PagedRecordStream, StripeSubscriptionSnapshotRepository
 
-def test_get_snapshot_returns_copy_of_saved_data():
+
+def test_get_snapshot_returns_immutable_snapshot_by_reference():
     repo = StripeSubscriptionSnapshotRepository()
     repo.save_snapshot(
         "sk_test_key",
@@ -13,15 +17,16 @@ def test_get_snapshot_returns_copy_of_saved_data():
     snapshot = repo.get_snapshot("sk_test_key")
 
     assert snapshot == {
-        "customers": ["cust_123"],
-        "subscriptions": ["sub_123"],
-    }
-    snapshot["customers"].append("cust_456")
-
-    assert repo.get_snapshot("sk_test_key") == {
-        "customers": ["cust_123"],
-        "subscriptions": ["sub_123"],
+        "customers": ("cust_123",),
+        "subscriptions": ("sub_123",),
     }
+    assert snapshot.version == 1
+    assert repo.get_snapshot("sk_test_key") is snapshot
+    assert repo.get_snapshot("sk_test_key")["subscriptions"] is snapshot["subscriptions"]
+    with pytest.raises(AttributeError):
+        snapshot["customers"].append("cust_456")
+    with pytest.raises(TypeError):
+        snapshot["customers"] = ("cust_456",)
 
 
 def test_get_snapshot_returns_none_for_unknown_key():
@@ -30,7 +35,7 @@ def test_get_snapshot_returns_none_for_unknown_key():
     assert repo.get_snapshot("sk_missing") is None
 
 
-def test_list_snapshots_returns_copies_per_key():
+def test_list_snapshots_returns_current_versions_per_key():
     repo = StripeSubscriptionSnapshotRepository()
     repo.save_snapshot(
         "sk_test_first",
@@ -48,28 +53,222 @@ def test_list_snapshots_returns_copies_per_key():
 
     assert snapshots == {
         first_fingerprint: {
-            "customers": ["cust_1"],
-            "subscriptions": ["sub_1"],
+            "customers": ("cust_1",),
+            "subscriptions": ("sub_1",),
         },
         second_fingerprint: {
-            "customers": ["cust_2"],
-            "subscriptions": ["sub_2"],
+            "customers": ("cust_2",),
+            "subscriptions": ("sub_2",),
         },
     }
+    assert snapshots[first_fingerprint] is repo.get_snapshot("sk_test_first")
+
 
-    snapshots[first_fingerprint]["customers"].append("cust_mutated")
+def test_changed_save_produces_new_version_and_keeps_old_one_intact():
+    repo = StripeSubscriptionSnapshotRepository()
+    repo.save_snapshot("sk_test_versions", {"customers": ["cust_1"], "subscriptions": []})
+    first = repo.get_snapshot("sk_test_versions")
+
+    repo.save_snapshot("sk_test_versions", {"customers": ["cust_1"], "subscriptions": []})
+    assert repo.get_snapshot("sk_test_versions") is first
+    assert repo.get_snapshot_version("sk_test_versions") == 1
 
-    assert repo.get_snapshot("sk_test_first") == {
-        "customers": ["cust_1"],
-        "subscriptions": ["sub_1"],
+    repo.save_snapshot(
+        "sk_test_versions", {"customers": ["cust_1", "cust_2"], "subscriptions": []}
+    )
+    second = repo.get_snapshot("sk_test_versions")
+
+    assert second is not first
+    assert second.version == 2
+    assert repo.get_snapshot_version("sk_test_versions") == 2
+    assert first["customers"] == ("cust_1",)
+    assert second["customers"] == ("cust_1", "cust_2")
+    assert repo.get_snapshot_version("sk_missing") is None
+
+
+def test_save_snapshot_reports_per_subscription_change_set():
+    repo = StripeSubscriptionSnapshotRepository()
+    repo.save_snapshot(
+        "sk_test_diff",
+        {
+            "customers": [{"id": "cus_1"}],
+            "subscriptions": [
+                {"id": "sub_kept", "status": "active"},
+                {"id": "sub_changed", "status": "trialing"},
+                {"id": "sub_dropped", "status": "active"},
+            ],
+        },
+    )
+    kept_record = repo.get_snapshot("sk_test_diff")["subscriptions"][0]
+
+    changes = repo.save_snapshot(
+        "sk_test_diff",
+        {
+            "customers": [{"id": "cus_1"}],
+            "subscriptions": iter(
+                [
+                    {"id": "sub_kept", "status": "active"},
+                    {"id": "sub_changed", "status": "active"},
+                    {"id": "sub_new", "status": "active"},
+                ]
+            ),
+        },
+    )
+
+    assert changes.skipped is False
+    subscription_changes = changes.for_resource("subscriptions")
+    assert subscription_changes.added == ("sub_new",)
+    assert subscription_changes.updated == ("sub_changed",)
+    assert subscription_changes.removed == ("sub_dropped",)
+    assert subscription_changes.unchanged == 1
+    assert changes.as_dict()["customers"] == {
+        "added": 0,
+        "updated": 0,
+        "removed": 0,
+        "unchanged": 1,
     }
-    assert repo.list_snapshots() == {
-        first_fingerprint: {
-            "customers": ["cust_1"],
-            "subscriptions": ["sub_1"],
+
+    snapshot = repo.get_snapshot("sk_test_diff")
+    assert [item.id for item in snapshot["subscriptions"]] == [
+        "sub_kept",
+        "sub_changed",
+        "sub_new",
+    ]
+    assert snapshot["subscriptions"][0] is kept_record
+
+
+def test_repeated_ids_count_once_with_their_last_record():
+    repo = StripeSubscriptionSnapshotRepository()
+    repo.save_snapshot(
+        "sk_test_repeats",
+        {"subscriptions": [{"id": "sub_kept", "status": "active"}, {"id": "sub_changed"}]},
+    )
+
+    changes = repo.save_snapshot(
+        "sk_test_repeats",
+        {
+            "subscriptions": [
+                {"id": "sub_kept", "status": "past_due"},
+                {"id": "sub_new"},
+                {"id": "sub_kept", "status": "active"},
+                {"id": "sub_changed", "status": "canceled"},
+                {"id": "sub_new"},
+                {"id": "sub_changed", "status": "canceled"},
+            ]
         },
-        second_fingerprint: {
-            "customers": ["cust_2"],
-            "subscriptions": ["sub_2"],
+    )
+
+    subscription_changes = changes.for_resource("subscriptions")
+    assert subscription_changes.added == ("sub_new",)
+    assert subscription_changes.updated == ("sub_changed",)
+    assert subscription_changes.unchanged == 1
+    snapshot = repo.get_snapshot("sk_test_repeats")
+    assert [(item.id, item.status) for item in snapshot["subscriptions"]] == [
+        ("sub_kept", "active"),
+        ("sub_new", None),
+        ("sub_changed", "canceled"),
+    ]
+
+
+def test_identical_reingest_is_skipped_by_content_hash():
+    repo = StripeSubscriptionSnapshotRepository()
+    payload = {"customers": ["cust_1"], "subscriptions": [{"id": "sub_1", "status": "active"}]}
+
+    first = repo.save_snapshot("sk_test_same", payload)
+    second = repo.save_snapshot("sk_test_same", payload)
+
+    assert first.skipped is False
+    assert second.skipped is True
+    assert second.content_hash == first.content_hash
+    assert second.for_resource("subscriptions").unchanged == 1
+
+
+def blocking_stream(records, started, other_started):
+    """Yields its first record, then waits for the other stream to have started as well."""
+    for index, record in enumerate(records):
+        if index == 1:
+            started.set()
+            assert other_started.wait(timeout=5), "streams were drained one after another"
+        yield record
+
+
+def test_lazy_streams_are_drained_concurrently_with_the_same_content_hash():
+    customers_started, subscriptions_started = threading.Event(), threading.Event()
+    concurrent_repo = StripeSubscriptionSnapshotRepository()
+    concurrent_changes = concurrent_repo.save_snapshot(
+        "sk_test_overlap",
+        {
+            "customers": blocking_stream(
+                [{"id": "cus_1"}, {"id": "cus_2"}], customers_started, subscriptions_started
+            ),
+            "subscriptions": blocking_stream(
+                [{"id": "sub_1"}, {"id": "sub_2"}], subscriptions_started, customers_started
+            ),
         },
+    )
+    sequential_repo = StripeSubscriptionSnapshotRepository()
+    sequential_changes = sequential_repo.save_snapshot(
+        "sk_test_overlap",
+        {
+            "customers": [{"id": "cus_1"}, {"id": "cus_2"}],
+            "subscriptions": [{"id": "sub_1"}, {"id": "sub_2"}],
+        },
+    )
+
+    assert concurrent_changes.content_hash == sequential_changes.content_hash
+    assert concurrent_repo.get_snapshot("sk_test_overlap") == sequential_repo.get_snapshot(
+        "sk_test_overlap"
+    )
+
+
+def test_failed_concurrent_drain_stops_its_sibling():
+    sibling_pulled = []
+    closed = threading.Event()
+
+    class SiblingStream(PagedRecordStream):
+        def close(self):
+            closed.set()
+            super().close()
+
+    def sibling_pages():
+        for index in range(1000):
+            if closed.is_set():
+                return
+            sibling_pulled.append(index)
+            time.sleep(0.001)
+            yield [{"id": f"sub_{index}"}]
+
+    def failing_records():
+        yield {"id": "cus_1"}
+        raise RuntimeError("customers listing failed")
+
+    snapshot = {
+        "customers": PagedRecordStream((failing_records(),)),
+        "subscriptions": SiblingStream(sibling_pages()),
     }
+
+    with pytest.raises(RuntimeError):
+        StripeSubscriptionSnapshotRepository().save_snapshot("sk_test_sibling", snapshot)
+
+    assert closed.is_set()
+    assert len(sibling_pulled) < 1000
+
+
+def test_save_based_on_a_stale_read_becomes_the_next_version():
+    repo = StripeSubscriptionSnapshotRepository()
+    repo.save_snapshot("sk_test_race", {"subscriptions": [{"id": "sub_a"}]})
+    stale = repo.get_snapshot("sk_test_race")
+    repo.save_snapshot("sk_test_race", {"subscriptions": [{"id": "sub_a"}, {"id": "sub_b"}]})
+    # A concurrent save read version 1 before version 2 was stored.
+    repo._current = lambda fingerprint: stale
+
+    changes = repo.save_snapshot("sk_test_race", {"subscriptions": [{"id": "sub_c"}]})
+    del repo._current
+
+    assert [info.version for info in repo.list_snapshot_versions("sk_test_race")] == [3, 2, 1]
+    assert [item.id for item in repo.get_snapshot("sk_test_race", version=2)["subscriptions"]] == [
+        "sub_a",
+        "sub_b",
+    ]
+    assert changes.for_resource("subscriptions").removed == ("sub_a", "sub_b")
+    assert changes.for_resource("subscriptions").added == ("sub_c",)